@@ -6,7 +6,8 @@
 import warnings
 warnings.filterwarnings("ignore", category=UserWarning, module="pkg_resources")
 
-import math, time, pygame, serial
+import argparse, math, os, sys, time, pygame, serial
+import numpy as np
 from serial.tools import list_ports
 
 # ---------------- CONFIG ----------------
@@ -18,6 +19,11 @@ MARGIN = 60
 DOT_RADIUS = 6
 FPS = 60
 ANGLE_MIN, ANGLE_MAX = 0, 270
+ANGLE_RES_DEG = 1.0          # bin width, e.g. 0.5 for half-degree scanners
+FADE_START_S = 1.0           # bins older than this start to fade...
+FADE_OUT_S = 3.0             # ...and are dropped after this
+MAX_LINE_BYTES = 4096        # discard runaway lines with no newline
+METRICS_INTERVAL_S = 5.0     # console stage summary period with --metrics
 
 # Rectangular safety zone (match Arduino)
 RECT_X_MIN = -200
@@ -42,10 +48,241 @@ def proximity_color(dist_mm):
     hue = (clamp(dist_mm, 0, MAX_RANGE_MM) / MAX_RANGE_MM) * 240.0   # blue->red
     return hsv_to_rgb(hue, 0.95, 1.0)
 
+# Color index -> RGB, 256 proximity levels (index 0 = nearest)
+PALETTE = [proximity_color(i * MAX_RANGE_MM / 255.0) for i in range(256)]
+
+# Same palette pre-dimmed for fading bins: FADED[level][color_idx]
+FADE_LEVELS = 16
+FADED = [[(r*k//(FADE_LEVELS-1), g*k//(FADE_LEVELS-1), b*k//(FADE_LEVELS-1)) for r, g, b in PALETTE]
+         for k in range(FADE_LEVELS)]
+
+class AngleBins:
+    """Latest reading per angle bin, kept in preallocated arrays"""
+    def __init__(self, res_deg=ANGLE_RES_DEG, angle_min=ANGLE_MIN, angle_max=ANGLE_MAX):
+        self.res = res_deg
+        self.angle_min = angle_min
+        self.n = int(round((angle_max - angle_min) / res_deg)) + 1
+        self.angles = angle_min + np.arange(self.n) * res_deg
+        rad = np.radians(self.angles)
+        self.cos, self.sin = np.cos(rad), np.sin(rad)
+        self.dist = np.full(self.n, np.nan)          # mm, NaN = empty
+        self.stamp = np.zeros(self.n)                # time.monotonic() of last write
+        self.color_idx = np.zeros(self.n, dtype=np.uint8)
+
+    def reset(self):
+        self.dist.fill(np.nan)
+
+    def index(self, angle_deg):
+        i = int(round((angle_deg - self.angle_min) / self.res))
+        return int(clamp(i, 0, self.n - 1))
+
+    def put(self, angle_deg, dist_mm, now):
+        i = self.index(angle_deg)
+        d = clamp(dist_mm, 0, MAX_RANGE_MM)
+        self.dist[i] = d
+        self.stamp[i] = now
+        self.color_idx[i] = int(d * 255 / MAX_RANGE_MM)
+
+    def live(self, now):
+        """Indices of bins still on screen and their brightness (1 = fresh)"""
+        age = now - self.stamp
+        self.dist[age > FADE_OUT_S] = np.nan
+        idx = np.flatnonzero(~np.isnan(self.dist))
+        fade = np.clip((FADE_OUT_S - age[idx]) / (FADE_OUT_S - FADE_START_S), 0.0, 1.0)
+        return idx, fade
+
+def drain_lines(ser, buf):
+    """Read everything waiting in one call; return the complete lines, keep the tail in buf"""
+    waiting = ser.in_waiting
+    if waiting:
+        buf += ser.read(waiting)
+    end = buf.rfind(b"\n")
+    if end < 0:
+        if len(buf) > MAX_LINE_BYTES: del buf[:]
+        return []
+    lines = bytes(buf[:end]).split(b"\n")
+    del buf[:end + 1]
+    return lines
+
+def parse_reading(line):
+    """b'angle,dist[,...]' -> (angle, dist) or None"""
+    parts = line.split(b",")
+    if len(parts) < 2: return None
+    try:
+        ang, dist = float(parts[0]), float(parts[1])
+    except ValueError:
+        return None
+    return (ang, dist) if dist >= 0 else None
+
 def polar_to_xy(r_px, theta_deg, cx, cy):
     rad = math.radians(theta_deg)
     return int(cx + r_px*math.cos(rad)), int(cy - r_px*math.sin(rad))
 
+class ScanRenderer:
+    """
+    Rings, spokes, labels and the safety box live in a cached background
+    surface (rebuilt only on resize). Each frame restores the background under
+    last frame's dots, draws the new ones and pushes just those rects.
+    """
+    def __init__(self, screen, font):
+        self.font = font
+        self.status = None
+        self.hud = None
+        self.hud_rect = None
+        self.resize(screen)
+
+    def resize(self, screen):
+        self.screen = screen
+        w, h = screen.get_size()
+        self.center = (w//2, h//2)
+        self.max_r_px = max(min(w, h)//2 - MARGIN, 1)
+        self.scale = self.max_r_px / MAX_RANGE_MM  # mm -> px scale
+        self.background = self.build_background(w, h)
+        self.dot_rects = []
+        self.hud_dirty = []
+        self.full_redraw = True
+
+    def build_background(self, w, h):
+        bg = pygame.Surface((w, h)).convert()
+        bg.fill((0, 0, 0))
+        center, max_r_px = self.center, self.max_r_px
+
+        # range rings
+        pygame.draw.circle(bg, (40,40,40), center, max_r_px, 1)
+        for frac in [0.25, 0.5, 0.75, 1.0]:
+            r = int(max_r_px * frac)
+            pygame.draw.circle(bg, (25,25,25), center, r, 1)
+            label = self.font.render(f"{int(MAX_RANGE_MM*frac)} mm", True, (120,120,120))
+            bg.blit(label, (center[0] + r + 6, center[1] - 10))
+
+        # angle spokes
+        for a in [0, 45, 90, 135, 180, 225, 270]:
+            x,y = polar_to_xy(max_r_px, a, *center)
+            pygame.draw.line(bg, (35,35,35), center, (x,y), 1)
+
+        # safety rectangle
+        def mm_to_px(x_mm, y_mm):
+            return int(center[0] + x_mm * self.scale), int(center[1] - y_mm * self.scale)
+        x1, y1 = mm_to_px(RECT_X_MIN, RECT_Y_MIN)
+        x2, y2 = mm_to_px(RECT_X_MAX, RECT_Y_MAX)
+        rect_w, rect_h = (x2 - x1), (y1 - y2)
+        pygame.draw.rect(bg, (80,80,80), (x1, y2, rect_w, rect_h), 1)
+
+        legend = self.font.render("Blue = far, Red = near | Gray box = safety zone", True, (160,160,160))
+        bg.blit(legend, (20, 45))
+        return bg
+
+    def set_status(self, status):
+        """Re-render the HUD line only when its text changes"""
+        if status == self.status: return
+        self.status = status
+        self.hud = self.font.render(status, True, (180,180,180))
+        if self.full_redraw: return
+        if self.hud_rect:
+            self.screen.blit(self.background, self.hud_rect, self.hud_rect)
+            self.hud_dirty.append(self.hud_rect)
+        self.hud_rect = self.screen.blit(self.hud, (20, 20))
+        self.hud_dirty.append(self.hud_rect)
+
+    def draw(self, bins, now):
+        screen = self.screen
+        if self.full_redraw:
+            screen.blit(self.background, (0, 0))
+            if self.hud: self.hud_rect = screen.blit(self.hud, (20, 20))
+        else:
+            for rect in self.dot_rects:
+                screen.blit(self.background, rect, rect)
+
+        # dots (dimmed by age)
+        idx, fade = bins.live(now)
+        r_px = bins.dist[idx] * (self.max_r_px / MAX_RANGE_MM)
+        xs = (self.center[0] + r_px * bins.cos[idx]).astype(int)
+        ys = (self.center[1] - r_px * bins.sin[idx]).astype(int)
+        levels = np.rint(fade * (FADE_LEVELS - 1)).astype(int)
+        rects = [pygame.draw.circle(screen, FADED[lv][ci], (x, y), DOT_RADIUS)
+                 for x, y, ci, lv in zip(xs.tolist(), ys.tolist(), bins.color_idx[idx].tolist(), levels.tolist())]
+
+        if self.full_redraw:
+            pygame.display.flip()
+            self.full_redraw = False
+        else:
+            pygame.display.update(self.dot_rects + rects + self.hud_dirty)
+        self.hud_dirty = []
+        self.dot_rects = rects
+
+def use_mapping_modules():
+    """Make VL53L7CX_mapping/ (instrumentation, frame_stream) importable"""
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "VL53L7CX_mapping")
+    if path not in sys.path: sys.path.insert(0, path)
+
+class ScanMetrics:
+    """Stage histograms + counters from VL53L7CX_mapping/instrumentation.py"""
+    STAGES = ("serial_read", "parse", "fade", "draw")
+
+    def __init__(self, port=None):
+        use_mapping_modules()
+        from instrumentation import MetricsRegistry, MetricsServer
+        self.registry = MetricsRegistry("tof_scan_")
+        self.stage = self.registry.stages("stage_seconds", self.STAGES)
+        self.lines = self.registry.counter("lines_total", "Serial lines received")
+        self.readings = self.registry.counter("readings_total", "Valid angle,dist readings")
+        self.server = None
+        if port:
+            try: self.server = MetricsServer(self.registry, port).start()
+            except OSError as e: print(f"✗ Metrics endpoint on port {port}: {e}")
+        self.last_report = time.monotonic()
+
+    def maybe_report(self, now):
+        if now - self.last_report < METRICS_INTERVAL_S: return
+        self.last_report = now
+        print("Stage timings:")
+        print(self.registry.summary())
+
+    def close(self):
+        if self.server: self.server.stop()
+        print("Stage timings:")
+        print(self.registry.summary())
+
+class ScanStream:
+    """Angle bins -> frame_stream.StreamServer as a 1 x n frame (NaN bins = invalid)"""
+    def __init__(self, bins, port, metrics=None, host="127.0.0.1"):
+        use_mapping_modules()
+        from frame_stream import StreamServer, SOURCE_ANGLE_BINS
+        self.server = StreamServer((1, bins.n), port, host, source=SOURCE_ANGLE_BINS, max_mm=MAX_RANGE_MM,
+                                   registry=metrics.registry if metrics else None).start()
+        self.count = 0
+
+    def publish(self, bins, now):
+        self.count += 1
+        self.server.publish(bins.dist, ~np.isnan(bins.dist), self.count, int(now * 1000))
+
+    def close(self):
+        print(f"Stream: {self.server.summary()}")
+        self.server.stop()
+
+def open_stream(bins, port, metrics, host="127.0.0.1"):
+    try: return ScanStream(bins, port, metrics, host)
+    except OSError as e: print(f"✗ Stream server on port {port}: {e}")
+
+def ingest(ser, rx_buf, bins, now, metrics=None):
+    """drain -> parse -> bin; returns (lines, readings). Timed when metrics is set."""
+    if metrics: t0 = time.perf_counter()
+    lines = drain_lines(ser, rx_buf)
+    if metrics:
+        t1 = time.perf_counter()
+        metrics.stage["serial_read"].observe(t1 - t0)
+    readings = 0
+    for line in lines:
+        reading = parse_reading(line)
+        if reading:
+            readings += 1
+            bins.put(reading[0], reading[1], now)
+    if metrics:
+        metrics.stage["parse"].observe(time.perf_counter() - t1)
+        metrics.lines.inc(len(lines))
+        metrics.readings.inc(readings)
+    return len(lines), readings
+
 def autodetect_port():
     cands = []
     for p in list_ports.comports():
@@ -64,30 +301,80 @@ def open_serial(port, baud):
         print(f"Could not open serial port {port}: {e}")
         return None
 
+def run_headless(ser, duration=None, metrics=None, stream_port=None, stream_host="127.0.0.1"):
+    """Same drain -> parse -> bin -> fade pipeline as the window, no pygame; prints stats"""
+    bins = AngleBins()
+    stream = open_stream(bins, stream_port, metrics, stream_host) if stream_port else None
+    rx_buf = bytearray()
+    start = last_report = time.monotonic()
+    lines = readings = 0
+    busy = 0.0
+    try:
+        while duration is None or time.monotonic() - start < duration:
+            frame_start = time.monotonic()
+            n_lines, n_readings = ingest(ser, rx_buf, bins, frame_start, metrics)
+            lines += n_lines
+            readings += n_readings
+            if metrics: t0 = time.perf_counter()
+            idx, _ = bins.live(frame_start)
+            if metrics:
+                metrics.stage["fade"].observe(time.perf_counter() - t0)
+                metrics.maybe_report(frame_start)
+            if stream and n_readings: stream.publish(bins, frame_start)
+            busy += time.monotonic() - frame_start
+
+            if frame_start - last_report >= 1.0:
+                dt = frame_start - last_report
+                print(f"Lines/s: {lines/dt:7.1f} | readings/s: {readings/dt:7.1f} | "
+                      f"live bins: {len(idx):3d}/{bins.n} | busy: {100*busy/dt:4.1f}%")
+                lines = readings = 0
+                busy = 0.0
+                last_report = frame_start
+            time.sleep(max(0.0, 1.0/FPS - (time.monotonic() - frame_start)))
+    finally:
+        if stream: stream.close()
+
 def main():
-    print("DEBUG: entering main()")
+    parser = argparse.ArgumentParser(description="ToF servo scanner visualizer")
+    parser.add_argument("--port", default=SERIAL_PORT, help='Serial port or "AUTO"')
+    parser.add_argument("--headless", action="store_true", help="No window: run the ingest pipeline and print stats")
+    parser.add_argument("--duration", type=float, help="Stop a --headless run after this many seconds")
+    parser.add_argument("--metrics", action="store_true", help="Time each stage; print a summary every few seconds")
+    parser.add_argument("--metrics-port", type=int, help="Serve stage metrics (Prometheus) on localhost:PORT; implies --metrics")
+    parser.add_argument("--stream", type=int, metavar="PORT", help="Stream the angle bins to remote viewers over WebSocket")
+    parser.add_argument("--stream-host", default="127.0.0.1", help="Address --stream binds to (0.0.0.0 = every interface)")
+    args = parser.parse_args()
+    metrics = ScanMetrics(args.metrics_port) if args.metrics or args.metrics_port else None
 
     # ----- serial setup -----
-    port = SERIAL_PORT
+    port = args.port
     if port == "AUTO":
         port = autodetect_port()
         print(f"🔎 Auto-detected serial port: {port}" if port else "Auto-detect failed. Set SERIAL_PORT manually.")
     ser = open_serial(port, BAUD) if port else None
     connected = ser is not None
 
+    if args.headless:
+        if not connected: return
+        try: run_headless(ser, args.duration, metrics, args.stream, args.stream_host)
+        except KeyboardInterrupt: pass
+        finally:
+            ser.close()
+            if metrics: metrics.close()
+        return
+
     # ----- pygame setup -----
     pygame.init()
-    screen = pygame.display.set_mode((WIDTH, HEIGHT))
+    screen = pygame.display.set_mode((WIDTH, HEIGHT), pygame.RESIZABLE)
     pygame.display.set_caption("ToF Servo Scanner (Per-Angle Overwrite + Safety Zone)")
-    print("DEBUG: window created")
     clock = pygame.time.Clock()
     font = pygame.font.SysFont(None, 22)
-    center = (WIDTH//2, HEIGHT//2)
-    max_r_px = min(WIDTH, HEIGHT)//2 - MARGIN
-    scale = max_r_px / MAX_RANGE_MM  # mm -> px scale
+    renderer = ScanRenderer(screen, font)
 
-    # bins: one reading per degree (overwrite each sweep)
-    bins = {deg: None for deg in range(ANGLE_MIN, ANGLE_MAX+1)}
+    # bins: one reading per ANGLE_RES_DEG (overwrite each sweep, fade when stale)
+    bins = AngleBins()
+    rx_buf = bytearray()
+    stream = open_stream(bins, args.stream, metrics, args.stream_host) if args.stream else None
 
     running = True
     while running:
@@ -95,80 +382,46 @@ def main():
         for ev in pygame.event.get():
             if ev.type == pygame.QUIT:
                 running = False
+            elif ev.type == pygame.VIDEORESIZE:
+                screen = pygame.display.set_mode(ev.size, pygame.RESIZABLE)
+                renderer.resize(screen)
             elif ev.type == pygame.KEYDOWN:
                 if ev.key == pygame.K_r:
-                    for k in bins: bins[k] = None
+                    bins.reset()
                 elif ev.key == pygame.K_c:
                     if ser:
                         try: ser.close()
                         except: pass
                     ser = open_serial(port, BAUD) if port else None
                     connected = ser is not None
+                    del rx_buf[:]
 
-        # serial read (non-blocking)
+        # serial read (non-blocking): drain every complete line, not one per frame
+        now = time.monotonic()
         if connected:
             try:
-                line = ser.readline().decode(errors="ignore").strip()
-                if line:
-                    parts = line.split(",")
-                    if len(parts) >= 2:
-                        ang = float(parts[0])
-                        dist = float(parts[1])
-                        if dist >= 0:
-                            deg_bin = int(round(ang))
-                            deg_bin = int(clamp(deg_bin, ANGLE_MIN, ANGLE_MAX))
-                            bins[deg_bin] = (clamp(dist, 0, MAX_RANGE_MM), proximity_color(dist))
+                if ingest(ser, rx_buf, bins, now, metrics)[1] and stream:
+                    stream.publish(bins, now)
             except Exception as e:
                 print(f"⚠️ serial hiccup: {e}")
                 connected = False
 
-        # draw frame
-        screen.fill((0, 0, 0))
-
-        # range rings
-        pygame.draw.circle(screen, (40,40,40), center, max_r_px, 1)
-        for frac in [0.25, 0.5, 0.75, 1.0]:
-            r = int(max_r_px * frac)
-            pygame.draw.circle(screen, (25,25,25), center, r, 1)
-            label = font.render(f"{int(MAX_RANGE_MM*frac)} mm", True, (120,120,120))
-            screen.blit(label, (center[0] + r + 6, center[1] - 10))
-
-        # angle spokes
-        for a in [0, 45, 90, 135, 180, 225, 270]:
-            x,y = polar_to_xy(max_r_px, a, *center)
-            pygame.draw.line(screen, (35,35,35), center, (x,y), 1)
-
-        # safety rectangle
-        def mm_to_px(x_mm, y_mm):
-            return int(center[0] + x_mm * scale), int(center[1] - y_mm * scale)
-        x1, y1 = mm_to_px(RECT_X_MIN, RECT_Y_MIN)
-        x2, y2 = mm_to_px(RECT_X_MAX, RECT_Y_MAX)
-        rect_w, rect_h = (x2 - x1), (y1 - y2)
-        pygame.draw.rect(screen, (80,80,80), (x1, y2, rect_w, rect_h), 1)
-
-        # dots
-        for deg, payload in bins.items():
-            if payload is None: continue
-            dist_mm, color = payload
-            r_px = int((dist_mm / MAX_RANGE_MM) * max_r_px)
-            x, y = polar_to_xy(r_px, deg, *center)
-            pygame.draw.circle(screen, color, (x, y), DOT_RADIUS)
-
-        # HUD
+        # draw frame: static layers come from the cached background
         status = f"Port: {port or '—'} | {'CONNECTED' if connected else 'NOT CONNECTED'}  |  Keys: [R]=reset  [C]=reconnect"
-        hud = font.render(status, True, (180,180,180))
-        screen.blit(hud, (20, 20))
-        legend = font.render("Blue = far, Red = near | Gray box = safety zone", True, (160,160,160))
-        screen.blit(legend, (20, 45))
-
-        pygame.display.flip()
+        renderer.set_status(status)
+        if metrics: t0 = time.perf_counter()
+        renderer.draw(bins, now)
+        if metrics:
+            metrics.stage["draw"].observe(time.perf_counter() - t0)
+            metrics.maybe_report(now)
         clock.tick(FPS)
 
     if ser:
         try: ser.close()
         except: pass
     pygame.quit()
-    print("DEBUG: exited cleanly")
+    if metrics: metrics.close()
+    if stream: stream.close()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,260 @@
+"""
+Benchmark suite for the mapper pipeline
+
+Every case runs on the same deterministic synthetic frames
+(virtual_serial.SyntheticFrameGenerator), offscreen and without a port, and
+reports frames/sec plus per-frame latency. The whole set of cases runs
+--repeat times and each figure is the median over those rounds, so one
+lucky or unlucky stretch of CPU time does not become the result. A fixed
+calibration loop (small-array NumPy plus interpreter work, like the
+pipeline itself) runs before every case of every round; the median of all
+those runs is the session's calibration, and each case's median is also
+stored relative to it, so a baseline recorded on one machine still means
+something on another. A case regresses only if its median got slower by
+more than --tolerance both in absolute time and relative to the
+calibration - one short calibration run can swing ~2x, and a machine that
+is just slower or faster overall moves only one of the two. matplotlib
+render cases get --render-tolerance, since they also move with the
+matplotlib version and backend.
+
+Usage:
+    python benchmark.py                      # run and compare to the baseline
+    python benchmark.py --save-baseline      # record a new baseline
+    python benchmark.py --only read --grid 4
+"""
+
+import argparse
+import json
+import os
+import struct
+import sys
+import time
+
+import numpy as np
+
+from frame_protocol import binary_frame_size
+from virtual_serial import BytesSerial, SyntheticFrameGenerator
+from zone_filter import FILTER_MODES, ZoneFilterBank
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_baseline.json')
+
+
+def _summary(samples):
+    samples = np.asarray(samples) * 1e6
+    return {
+        'fps': float(len(samples) / (samples.sum() / 1e6)),
+        'mean_us': float(samples.mean()),
+        'p50_us': float(np.percentile(samples, 50)),
+        'p95_us': float(np.percentile(samples, 95)),
+    }
+
+
+def calibrate(iterations=2000, grid_size=8):
+    """Median seconds of one run of a fixed reference workload"""
+    rng = np.random.default_rng(0)
+    dist = rng.integers(10, 1180, (grid_size, grid_size)).astype(np.float32)
+    packed = struct.pack(f'<{grid_size * grid_size}h', *dist.astype(np.int16).ravel())
+    out = np.empty_like(dist)
+
+    samples = []
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        values = struct.unpack(f'<{grid_size * grid_size}h', packed)
+        np.clip(dist, 10, 1180, out=out)
+        np.multiply(out, 0.3, out=out)
+        out += dist * 0.7
+        np.where(out > 500, out, 0).sum()
+        sum(values)
+        samples.append(time.perf_counter() - t0)
+    return float(np.median(samples))
+
+
+def bench_read(gen, frames, binary):
+    from vl53l7cx_mapper import LowLatencyMapper
+    mapper = LowLatencyMapper('synthetic', grid_size=gen.grid_size,
+                              protocol='binary' if binary else 'ascii')
+    chunk = binary_frame_size(gen.grid_size) if binary else None
+    mapper.serial_conn = BytesSerial(gen.stream(frames, binary), chunk=chunk)
+
+    samples = []
+    for _ in range(frames):
+        t0 = time.perf_counter()
+        mapper.read_frame_fast()
+        samples.append(time.perf_counter() - t0)
+    if mapper.frame_count != frames:
+        raise RuntimeError(f"decoded {mapper.frame_count}/{frames} frames")
+    return samples
+
+
+def bench_point_cloud(gen, frames):
+    from vl53l7cx_mapper import LowLatencyMapper
+    mapper = LowLatencyMapper('synthetic', grid_size=gen.grid_size)
+    data = [gen.frame(i) for i in range(frames)]
+
+    samples = []
+    for dist in data:
+        mapper.distance_map[:] = dist
+        np.greater(dist, 0, out=mapper.valid_mask)
+        t0 = time.perf_counter()
+        mapper.get_point_cloud_fast()
+        samples.append(time.perf_counter() - t0)
+    return samples
+
+
+def bench_filter(gen, frames, mode):
+    bank = ZoneFilterBank(gen.grid_size, mode)
+    data = [gen.frame(i) for i in range(frames)]
+
+    samples = []
+    for dist in data:
+        valid = dist > 0
+        t0 = time.perf_counter()
+        bank.apply(dist, valid)
+        samples.append(time.perf_counter() - t0)
+    return samples
+
+
+def bench_render(gen, frames, mode, renderer):
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    from vl53l7cx_mapper import FastVisualizer, LowLatencyMapper
+
+    mapper = LowLatencyMapper('offscreen', grid_size=gen.grid_size)
+    viz = FastVisualizer(mapper, mode, renderer=renderer)
+    viz.fig.canvas.draw()
+    viz.cache_background()
+
+    samples = []
+    for i in range(frames):
+        dist = gen.frame(i)
+        mapper.distance_map[:] = dist
+        np.greater(dist, 0, out=mapper.valid_mask)
+        t0 = time.perf_counter()
+        viz.render()
+        viz.present()
+        samples.append(time.perf_counter() - t0)
+    plt.close(viz.fig)
+    return samples
+
+
+def cases(gen, frames, render_frames, render=True):
+    """(name, callable) for every benchmark case"""
+    yield 'read_frame_fast[binary]', lambda: bench_read(gen, frames, True)
+    yield 'read_frame_fast[ascii]', lambda: bench_read(gen, frames, False)
+    yield 'get_point_cloud_fast', lambda: bench_point_cloud(gen, frames)
+    for mode in FILTER_MODES:
+        yield f'filter[{mode}]', lambda mode=mode: bench_filter(gen, frames, mode)
+    if render:
+        for mode in ('heatmap', '3d', 'both'):
+            for renderer in ('blit', 'legacy'):
+                yield (f'render[{mode},{renderer}]',
+                       lambda mode=mode, renderer=renderer: bench_render(gen, render_frames, mode, renderer))
+
+
+def compare(results, baseline, tolerance, render_tolerance):
+    """Names of cases whose median regressed beyond tolerance, absolute and calibrated"""
+    regressions = []
+    for name, result in results.items():
+        reference = baseline.get(name)
+        if reference is None or 'p50_rel' not in reference:
+            continue
+        limit = 1.0 + (render_tolerance if name.startswith('render[') else tolerance)
+        if (result['p50_us'] > reference['p50_us'] * limit
+                and result['p50_rel'] > reference['p50_rel'] * limit):
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Mapper pipeline benchmarks')
+    parser.add_argument('--grid', type=int, default=8, choices=[4, 8])
+    parser.add_argument('--frames', type=int, default=2000,
+                        help='Frames per parse/transform/filter case (default: 2000)')
+    parser.add_argument('--render-frames', type=int, default=60,
+                        help='Frames per render case (default: 60)')
+    parser.add_argument('--rate', type=float, default=60.0, help='Synthetic frame rate (Hz)')
+    parser.add_argument('--noise', type=float, default=10.0, help='Range noise sigma (mm)')
+    parser.add_argument('--invalid-ratio', type=float, default=0.1,
+                        help='Fraction of zones reported invalid')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='Rounds over all cases; figures are the median round (default: 3)')
+    parser.add_argument('--only', type=str, help='Run only cases whose name contains this')
+    parser.add_argument('--no-render', action='store_true', help='Skip the render cases')
+    parser.add_argument('--baseline', type=str, default=DEFAULT_BASELINE)
+    parser.add_argument('--save-baseline', action='store_true',
+                        help='Write the results as the new baseline instead of comparing')
+    parser.add_argument('--tolerance', type=float, default=0.3,
+                        help='Allowed median slowdown before failing (default: 0.3 = 30%%)')
+    parser.add_argument('--render-tolerance', type=float, default=1.0,
+                        help='Same, for the matplotlib render cases (default: 1.0 = 100%%)')
+    args = parser.parse_args()
+
+    gen = SyntheticFrameGenerator(args.grid, args.rate, args.noise, args.invalid_ratio, args.seed)
+
+    print("\n" + "="*60)
+    print("VL53L7CX PIPELINE BENCHMARK")
+    print("="*60)
+    print(f"Grid: {args.grid}x{args.grid} | noise: {args.noise}mm | invalid: {args.invalid_ratio:.0%} | "
+          f"seed: {args.seed}")
+    print("="*60)
+    print(f"{'case':<30} {'FPS':>10} {'mean':>9} {'p50':>9} {'p95':>9}")
+
+    selected = [(name, run) for name, run in cases(gen, args.frames, args.render_frames, not args.no_render)
+                if not args.only or args.only in name]
+    rounds = {name: [] for name, _ in selected}
+    calibrations = []
+    for i in range(args.repeat):
+        for name, run in selected:
+            # Interleaved with the cases, so it sees the same CPU state they do
+            calibrations.append(calibrate(grid_size=args.grid))
+            rounds[name].append(_summary(run()))
+        if args.repeat > 1:
+            print(f"  round {i + 1}/{args.repeat} done")
+    calibrations.append(calibrate(grid_size=args.grid))
+
+    results = {}
+    for name, summaries in rounds.items():
+        r = results[name] = {k: float(np.median([s[k] for s in summaries])) for k in summaries[0]}
+        print(f"{name:<30} {r['fps']:10.0f} {r['mean_us']:8.1f}u {r['p50_us']:8.1f}u {r['p95_us']:8.1f}u")
+
+    calibration_us = 1e6 * float(np.median(calibrations))
+    for r in results.values():
+        r['calibration_us'] = calibration_us
+        r['p50_rel'] = r['p50_us'] / calibration_us
+    print(f"Calibration: {calibration_us:.1f}us (median of {len(calibrations)} runs, "
+          f"{1e6 * min(calibrations):.1f}-{1e6 * max(calibrations):.1f}us)")
+
+    key = f"grid{args.grid}"
+    if args.save_baseline:
+        stored = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                stored = json.load(f)
+        stored.setdefault(key, {}).update(results)
+        with open(args.baseline, 'w') as f:
+            json.dump(stored, f, indent=2, sort_keys=True)
+        print(f"\n✓ Baseline saved to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"\n✗ No baseline at {args.baseline} (run with --save-baseline)")
+        return 1
+    with open(args.baseline) as f:
+        baseline = json.load(f).get(key, {})
+
+    regressions = compare(results, baseline, args.tolerance, args.render_tolerance)
+    if regressions:
+        print(f"\n✗ Regressions (median slower in absolute and calibrated terms by more than "
+              f"{args.tolerance:.0%}, render {args.render_tolerance:.0%}):")
+        for name in regressions:
+            print(f"  {name:<30} {baseline[name]['p50_rel']:8.2f}x -> {results[name]['p50_rel']:8.2f}x cal "
+                  f"({baseline[name]['p50_us']:.1f}us -> {results[name]['p50_us']:.1f}us)")
+        return 1
+    print(f"\n✓ No regressions against {os.path.basename(args.baseline)}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
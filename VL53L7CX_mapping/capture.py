@@ -0,0 +1,312 @@
+"""
+Record-and-replay for VL53L7CX sessions
+
+Capture file layout (little endian, append-only):
+    file header  : magic 'VLCAP\\0', version u16, grid u8, reserved u8,
+                   created (epoch seconds, f64)
+    record       : host receive time (epoch seconds, f64), length u32,
+                   followed by `length` raw frame bytes exactly as they
+                   came off the wire (ASCII line or binary frame)
+
+Playback memory-maps the file, so hours of logs can be scanned without
+loading them into RAM. Frames can be fed straight into LowLatencyMapper
+through ReplaySerial, or through a pty that looks like the real port.
+
+Usage:
+    python capture.py info session.vlcap
+    python capture.py replay session.vlcap --speed 4      # pty at 4x
+    python capture.py replay session.vlcap --speed 0      # as fast as possible
+"""
+
+import argparse
+import mmap
+import os
+import struct
+import threading
+import time
+
+FILE_MAGIC = b'VLCAP\x00'
+FILE_VERSION = 1
+FILE_HEADER = struct.Struct('<6sHBBd')
+RECORD_HEADER = struct.Struct('<dI')
+# A crash or Ctrl-C loses at most this much of a recording
+FLUSH_FRAMES = 60
+FLUSH_INTERVAL_S = 1.0
+
+
+class CaptureWriter:
+    """Appends raw frames with host receive timestamps"""
+
+    def __init__(self, path, grid_size, flush_frames=FLUSH_FRAMES, flush_interval_s=FLUSH_INTERVAL_S):
+        self.path = path
+        self.grid_size = grid_size
+        self.flush_frames = flush_frames
+        self.flush_interval_s = flush_interval_s
+        self.frames_written = 0
+        self._unflushed = 0
+        self._last_flush = time.time()
+
+        exists = os.path.exists(path) and os.path.getsize(path) >= FILE_HEADER.size
+        if exists:
+            with open(path, 'rb') as f:
+                magic, version, grid, _, _ = FILE_HEADER.unpack(f.read(FILE_HEADER.size))
+            if magic != FILE_MAGIC or version != FILE_VERSION:
+                raise ValueError(f"{path} is not a capture file")
+            if grid != grid_size:
+                raise ValueError(f"{path} was recorded at {grid}x{grid}, not {grid_size}x{grid_size}")
+
+        self._file = open(path, 'ab')
+        if not exists:
+            self._file.write(FILE_HEADER.pack(FILE_MAGIC, FILE_VERSION, grid_size, 0, time.time()))
+
+    def write(self, host_time, raw):
+        self._file.write(RECORD_HEADER.pack(host_time, len(raw)))
+        self._file.write(raw)
+        self.frames_written += 1
+        self._unflushed += 1
+        if (self._unflushed >= self.flush_frames
+                or host_time - self._last_flush >= self.flush_interval_s):
+            self.flush(host_time)
+
+    def flush(self, now=None):
+        """Hand buffered records to the OS so they survive the process dying"""
+        self._file.flush()
+        self._unflushed = 0
+        self._last_flush = time.time() if now is None else now
+
+    def close(self):
+        if not self._file.closed:
+            self.flush()
+            self._file.close()
+
+
+class CaptureReader:
+    """Memory-mapped, zero-copy view over a capture file"""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        size = os.fstat(self._file.fileno()).st_size
+        if size < FILE_HEADER.size:
+            self._file.close()
+            raise ValueError(f"{path} is not a capture file")
+
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, grid, _, created = FILE_HEADER.unpack_from(self._mm)
+        if magic != FILE_MAGIC or version != FILE_VERSION:
+            self.close()
+            raise ValueError(f"{path} is not a capture file")
+
+        self.grid_size = grid
+        self.created = created
+        self.size = size
+        self._offsets = None
+
+    def records(self, offset=FILE_HEADER.size):
+        """Yield (host_time, memoryview of raw bytes, next_offset); stops at a torn tail"""
+        mm = self._mm
+        view = memoryview(mm)
+        end = self.size
+        while offset + RECORD_HEADER.size <= end:
+            host_time, length = RECORD_HEADER.unpack_from(mm, offset)
+            start = offset + RECORD_HEADER.size
+            if start + length > end:
+                break
+            offset = start + length
+            yield host_time, view[start:offset], offset
+
+    def index(self):
+        """Offsets of every record (built once, on first use)"""
+        if self._offsets is None:
+            offsets = []
+            offset = FILE_HEADER.size
+            for _, _, next_offset in self.records():
+                offsets.append(offset)
+                offset = next_offset
+            self._offsets = offsets
+        return self._offsets
+
+    def __len__(self):
+        return len(self.index())
+
+    def __getitem__(self, i):
+        offset = self.index()[i]
+        host_time, length = RECORD_HEADER.unpack_from(self._mm, offset)
+        start = offset + RECORD_HEADER.size
+        return host_time, memoryview(self._mm)[start:start + length]
+
+    def time_span(self):
+        """(first, last) host timestamps, or None for an empty capture"""
+        first = last = None
+        for host_time, _, _ in self.records():
+            if first is None:
+                first = host_time
+            last = host_time
+        return None if first is None else (first, last)
+
+    def close(self):
+        try:
+            self._mm.close()
+        except (BufferError, ValueError):
+            # Views still alive; the map is released when they are
+            pass
+        self._file.close()
+
+
+class ReplayClock:
+    """Maps recorded host time to wall time at a given speed (0 = no waiting)"""
+
+    def __init__(self, first_time, speed=1.0):
+        self.first_time = first_time
+        self.speed = speed
+        self.start = time.monotonic()
+
+    def due_in(self, host_time):
+        """Seconds until a record stamped host_time should be released"""
+        if self.speed <= 0:
+            return 0.0
+        return (host_time - self.first_time) / self.speed - (time.monotonic() - self.start)
+
+
+class ReplaySerial:
+    """
+    Serial-like object that releases recorded bytes on the recorded
+    schedule. Assign to LowLatencyMapper.serial_conn to replay without
+    a port.
+    """
+
+    def __init__(self, reader, speed=1.0, timeout=0.05, max_pending=65536):
+        self.reader = reader
+        self.timeout = timeout
+        self.max_pending = max_pending
+        self.is_open = True
+        self.finished = False
+        self.port = reader.path
+
+        self._records = reader.records()
+        self._next = next(self._records, None)
+        self._clock = ReplayClock(self._next[0] if self._next else 0.0, speed)
+        self._pending = bytearray()
+
+    def _release(self):
+        while self._next is not None and len(self._pending) < self.max_pending:
+            host_time, raw, _ = self._next
+            if self._clock.due_in(host_time) > 0:
+                return
+            self._pending += raw
+            self._next = next(self._records, None)
+        if self._next is None:
+            self.finished = True
+
+    @property
+    def in_waiting(self):
+        self._release()
+        return len(self._pending)
+
+    def read(self, size=1):
+        self._release()
+        data = bytes(self._pending[:size])
+        del self._pending[:size]
+        return data
+
+    def readline(self):
+        deadline = time.monotonic() + self.timeout
+        while True:
+            self._release()
+            end = self._pending.find(b'\n')
+            if end >= 0:
+                return self.read(end + 1)
+            if self._next is None or time.monotonic() >= deadline:
+                return self.read(len(self._pending))
+            wait = min(self._clock.due_in(self._next[0]), deadline - time.monotonic())
+            if wait > 0:
+                time.sleep(wait)
+
+    def reset_input_buffer(self):
+        pass
+
+    def reset_output_buffer(self):
+        pass
+
+    def close(self):
+        self.is_open = False
+
+
+def replay_to_pty(reader, speed=1.0, loop=False, stop_event=None):
+    """
+    Play a capture into a pty stand-in from a background thread.
+    Returns (pty, thread); open pty.port with serial.Serial or the mapper.
+    """
+    from virtual_serial import PtySerialStandIn
+
+    # Replay must be lossless, so wait for the reader rather than drop
+    pty = PtySerialStandIn(blocking=True)
+    stop_event = stop_event or threading.Event()
+
+    def run():
+        while not stop_event.is_set():
+            clock = None
+            for host_time, raw, _ in reader.records():
+                if clock is None:
+                    clock = ReplayClock(host_time, speed)
+                wait = clock.due_in(host_time)
+                if wait > 0 and stop_event.wait(wait):
+                    return
+                pty.write(raw)
+            if not loop:
+                return
+
+    thread = threading.Thread(target=run, name='vlcap-replay', daemon=True)
+    thread.stop_event = stop_event
+    thread.start()
+    return pty, thread
+
+
+def main():
+    parser = argparse.ArgumentParser(description='VL53L7CX capture tools')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    info = sub.add_parser('info', help='Summarise a capture file')
+    info.add_argument('path')
+
+    replay = sub.add_parser('replay', help='Replay a capture on a pty')
+    replay.add_argument('path')
+    replay.add_argument('--speed', type=float, default=1.0,
+                        help='Playback speed (1 = real time, 0 = as fast as possible)')
+    replay.add_argument('--loop', action='store_true', help='Restart at end of file')
+
+    args = parser.parse_args()
+    reader = CaptureReader(args.path)
+
+    if args.command == 'info':
+        span = reader.time_span()
+        frames = len(reader)
+        duration = (span[1] - span[0]) if span else 0.0
+        print(f"File:      {args.path}")
+        print(f"Grid:      {reader.grid_size}x{reader.grid_size}")
+        print(f"Created:   {time.ctime(reader.created)}")
+        print(f"Frames:    {frames}")
+        print(f"Duration:  {duration:.1f} s")
+        if duration > 0:
+            print(f"Rate:      {(frames - 1) / duration:.1f} fps")
+        reader.close()
+        return
+
+    pty, thread = replay_to_pty(reader, args.speed, args.loop)
+    print(f"✓ Replaying {args.path} on {pty.port} (speed: {args.speed or 'max'})")
+    print(f"  Run: python vl53l7cx_mapper.py --port {pty.port} --grid {reader.grid_size}")
+    try:
+        while thread.is_alive():
+            thread.join(0.2)
+        print("✓ Replay finished")
+        # Give the reader a moment to drain the last frames
+        time.sleep(0.5)
+    except KeyboardInterrupt:
+        thread.stop_event.set()
+    finally:
+        pty.close()
+        reader.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,150 @@
+"""
+Host/device clock synchronization and latency statistics
+
+Frames carry the device's millis() at acquisition. Subtracting that from
+host epoch time is meaningless, so ClockSync estimates the mapping
+
+    host_ms = offset + slope * device_ms
+
+over a sliding window of (device, host) receive pairs. The slope (clock
+drift) comes from a least-squares fit; the offset is the lower envelope of
+the residuals, i.e. the frame that crossed the link fastest is taken to have
+needed only the wire time of one frame. Everything above that floor is real
+queueing and processing delay, which is what we need to measure.
+"""
+
+import math
+
+import numpy as np
+
+# Crystal drift beyond this is treated as a fit artefact (ESP32 is ~±50 ppm)
+MAX_DRIFT = 1e-3
+
+
+class ClockSync:
+    """Sliding-window device->host clock model"""
+
+    def __init__(self, window=256, min_samples=8, transport_ms=0.0):
+        self.window = window
+        self.min_samples = min_samples
+        self.transport_ms = transport_ms
+
+        self._device = np.zeros(window, dtype=np.float64)
+        self._host = np.zeros(window, dtype=np.float64)
+        self._next = 0
+        self.n = 0
+
+        self.slope = 1.0
+        self.offset_ms = None
+        # (offset, slope, device_ref) swapped in as one tuple so readers on
+        # another thread never see a half-updated model
+        self._model = None
+
+        # millis() is a uint32 on the device: track rollovers and reboots
+        self._wrap = 0
+        self._last_device = None
+        self.resets = 0
+
+    @property
+    def synced(self):
+        return self.offset_ms is not None
+
+    @property
+    def drift_ppm(self):
+        return (self.slope - 1.0) * 1e6
+
+    def reset(self):
+        self.n = 0
+        self._next = 0
+        self.slope = 1.0
+        self.offset_ms = None
+        self._model = None
+        self._wrap = 0
+        self._last_device = None
+        self.resets += 1
+
+    def _unwrap(self, device_ms):
+        value = device_ms + self._wrap
+        if self._last_device is not None and value > self._last_device + 2**31:
+            value -= 2**32  # a frame from before the last rollover
+        return value
+
+    def add(self, device_ms, host_time_s):
+        """Feed one frame: device millis() and host receive time (epoch seconds)"""
+        if self._last_device is not None:
+            value = device_ms + self._wrap
+            if value < self._last_device:
+                if self._last_device - value > 2**31:
+                    self._wrap += 2**32
+                else:
+                    # Device clock went backwards: module rebooted
+                    self.reset()
+        device = device_ms + self._wrap
+        self._last_device = device
+
+        self._device[self._next] = device
+        self._host[self._next] = host_time_s * 1000.0
+        self._next = (self._next + 1) % self.window
+        self.n = min(self.n + 1, self.window)
+
+        if self.n >= self.min_samples:
+            self._fit()
+
+    def _fit(self):
+        device = self._device[:self.n]
+        host = self._host[:self.n]
+
+        device_ref = device.mean()
+        centered = device - device_ref
+        var = np.dot(centered, centered)
+        if var > 0:
+            slope = np.dot(centered, host - host.mean()) / var
+            slope = min(max(slope, 1.0 - MAX_DRIFT), 1.0 + MAX_DRIFT)
+        else:
+            slope = 1.0
+
+        offset = float(np.min(host - slope * centered)) - self.transport_ms
+        self._model = (offset, slope, device_ref)
+        self.slope = slope
+        self.offset_ms = offset
+
+    def to_host_ms(self, device_ms):
+        """Device millis() -> host epoch milliseconds (NaN until synced)"""
+        model = self._model
+        if model is None:
+            return math.nan
+        offset, slope, device_ref = model
+        return offset + slope * (self._unwrap(device_ms) - device_ref)
+
+    def latency_ms(self, device_ms, host_time_s):
+        """Milliseconds from acquisition on the device to host_time_s"""
+        return host_time_s * 1000.0 - self.to_host_ms(device_ms)
+
+
+class LatencyTracker:
+    """Rolling latency window with percentile summary"""
+
+    def __init__(self, window=512):
+        self.window = window
+        self._values = np.zeros(window, dtype=np.float64)
+        self._next = 0
+        self.n = 0
+        self.last = math.nan
+
+    def record(self, latency_ms):
+        if math.isnan(latency_ms):
+            return
+        self.last = latency_ms
+        self._values[self._next] = latency_ms
+        self._next = (self._next + 1) % self.window
+        self.n = min(self.n + 1, self.window)
+
+    def percentiles(self, q=(50, 95, 99)):
+        """Rolling percentiles (NaN while empty)"""
+        if self.n == 0:
+            return tuple(math.nan for _ in q)
+        return tuple(np.percentile(self._values[:self.n], q))
+
+    def summary(self):
+        p50, p95, p99 = self.percentiles()
+        return f"p50 {p50:.1f}ms | p95 {p95:.1f}ms | p99 {p99:.1f}ms"
@@ -0,0 +1,359 @@
+"""
+Protocol decoder registry with auto-detection
+
+Every firmware in this repo has its own serial format:
+
+    vl53_frame      F:frame:ts:Z:row:col:dist:...E lines, or binary frames
+                    (frame_protocol.py)                  - VL53L7CX mapping
+    sweep           angle,zone,dist_mm,x,y,d_eff,status  - VL53L7CX_ScissorLift_Safety
+    servo_tof       angle,dist[,x,y]  (angle,-1 = clear) - ToFSensor_Speaker / tof_visualizer
+    ultrasonic      pos,d1,d2,tableEdge.  (cm, 999 = no echo, '.'-terminated)
+                                                         - dual_sensor_radar_integrated
+
+Decoders are registered by name, each can score how well a sample of bytes
+matches its format, and all of them decode whole byte buffers at once into
+the same compact SensorFrame. IngestCore sniffs the first bytes of a port,
+picks the best decoder and then drains the port in bulk.
+
+Usage:
+    python decoders.py --port /dev/ttyUSB0 --baudrate 115200
+"""
+
+import argparse
+import math
+import re
+import time
+
+import numpy as np
+
+from frame_protocol import FrameDecoder, HEADER, SUPPORTED_GRIDS, SYNC, VERSION
+
+DECODERS = {}
+
+# Bytes to look at before choosing a decoder
+SNIFF_BYTES = 512
+MAX_PENDING_BYTES = 4096
+
+
+def register(cls):
+    """Class decorator: make a decoder available to sniff() by its name"""
+    DECODERS[cls.name] = cls
+    return cls
+
+
+class SensorFrame:
+    """
+    One decoded reading from any sensor.
+    distance_mm/valid are arrays: (N, N) for a zone grid, (1,) for a single
+    ranged angle, (2,) for the two ultrasonic channels.
+    """
+
+    __slots__ = ('source', 'frame_num', 'device_ts', 'host_time',
+                 'angle_deg', 'distance_mm', 'valid', 'zone', 'aux')
+
+    def __init__(self, source, distance_mm, valid, host_time, angle_deg=math.nan,
+                 frame_num=-1, device_ts=-1, zone=-1, aux=None):
+        self.source = source
+        self.frame_num = frame_num
+        self.device_ts = device_ts
+        self.host_time = host_time
+        self.angle_deg = angle_deg
+        self.distance_mm = distance_mm
+        self.valid = valid
+        self.zone = zone
+        self.aux = aux
+
+    def __repr__(self):
+        angle = '' if math.isnan(self.angle_deg) else f" @{self.angle_deg:.1f}°"
+        return (f"SensorFrame({self.source}{angle}, {int(np.count_nonzero(self.valid))}/"
+                f"{self.valid.size} valid)")
+
+
+def _sample_records(sample, terminator):
+    """Complete, non-empty records of a sniff sample (the first may be cut short)"""
+    parts = sample.split(terminator)
+    parts = parts[1:-1] if len(parts) > 2 else parts[:-1]
+    return [p.strip() for p in parts if p.strip()]
+
+
+def _split_records(buf, terminator):
+    """Complete records out of buf (bytearray, consumed); the tail stays buffered"""
+    end = buf.rfind(terminator)
+    if end < 0:
+        if len(buf) > MAX_PENDING_BYTES:
+            del buf[:]
+        return []
+    records = bytes(buf[:end]).split(terminator)
+    del buf[:end + 1]
+    return records
+
+
+class LineDecoder:
+    """Base class: buffer bytes, hand complete records to decode_records()"""
+
+    name = None
+    terminator = b'\n'
+    pattern = None   # compiled regex matching one record (for sniffing)
+
+    def __init__(self, **options):
+        self._buf = bytearray()
+        self.frames = 0
+        self.parse_errors = 0
+
+    @classmethod
+    def sniff(cls, sample):
+        """Fraction of the sample's records that match this format"""
+        records = _sample_records(sample, cls.terminator)
+        if not records:
+            return 0.0
+        return sum(1 for r in records if cls.pattern.fullmatch(r)) / len(records)
+
+    def feed(self, data, host_time=None):
+        """Decode every complete record in data; returns a list of SensorFrames"""
+        self._buf += data
+        records = _split_records(self._buf, self.terminator)
+        if not records:
+            return []
+        frames = self.decode_records(records, time.time() if host_time is None else host_time)
+        self.frames += len(frames)
+        return frames
+
+    def decode_records(self, records, host_time):
+        raise NotImplementedError
+
+
+_NUM = rb'-?\d+(?:\.\d+)?'
+
+
+@register
+class ServoTofDecoder(LineDecoder):
+    """angle,dist[,x,y] lines; a negative distance means nothing in range"""
+
+    name = 'servo_tof'
+    pattern = re.compile(rb'%s,%s(?:,%s,%s)?' % (_NUM, _NUM, _NUM, _NUM))
+
+    def decode_records(self, records, host_time):
+        frames = []
+        for record in records:
+            fields = record.strip().split(b',')
+            if len(fields) not in (2, 4):
+                self.parse_errors += 1
+                continue
+            try:
+                angle, dist = float(fields[0]), float(fields[1])
+                aux = (float(fields[2]), float(fields[3])) if len(fields) == 4 else None
+            except ValueError:
+                self.parse_errors += 1
+                continue
+            frames.append(SensorFrame(self.name, np.array([max(dist, 0.0)]), np.array([dist >= 0]),
+                                      host_time, angle_deg=angle, aux=aux))
+        return frames
+
+
+@register
+class SweepDecoder(LineDecoder):
+    """angle,zone,dist_mm,x,y,d_eff,status lines; zone -1 = no threat at this angle"""
+
+    name = 'sweep'
+    pattern = re.compile(rb'%s,-?\d+,%s,%s,%s,%s,\d+' % (_NUM, _NUM, _NUM, _NUM, _NUM))
+
+    def decode_records(self, records, host_time):
+        rows = [r.strip() for r in records]
+        rows = [r for r in rows if r.count(b',') == 6]
+        self.parse_errors += len(records) - len(rows)
+        if not rows:
+            return []
+        try:
+            # One numeric conversion for the whole buffer
+            values = np.array(b','.join(rows).split(b','), dtype=np.float64).reshape(-1, 7)
+        except ValueError:
+            return self._decode_slow(rows, host_time)
+
+        frames = []
+        for angle, zone, dist, x, y, d_eff, status in values.tolist():
+            zone = int(zone)
+            frames.append(SensorFrame(self.name, np.array([dist]), np.array([zone >= 0]), host_time,
+                                      angle_deg=angle, zone=zone, aux=(x, y, d_eff, int(status))))
+        return frames
+
+    def _decode_slow(self, rows, host_time):
+        """A garbled line in the batch: keep only the rows that parse on their own"""
+        good = [r for r in rows if self.pattern.fullmatch(r)]
+        self.parse_errors += len(rows) - len(good)
+        return self.decode_records(good, host_time) if good else []
+
+
+@register
+class UltrasonicDecoder(LineDecoder):
+    """pos,d1,d2,tableEdge. records (cm); 999 means no echo"""
+
+    name = 'ultrasonic'
+    terminator = b'.'
+    pattern = re.compile(rb'\d+,\d+,\d+,\d+')
+    NO_ECHO_CM = 999
+
+    def decode_records(self, records, host_time):
+        rows = [r.strip() for r in records]
+        rows = [r for r in rows if r.count(b',') == 3 and self.pattern.fullmatch(r)]
+        self.parse_errors += len(records) - len(rows)
+        if not rows:
+            return []
+        values = np.array(b','.join(rows).split(b','), dtype=np.int32).reshape(-1, 4)
+
+        echoes = values[:, 1:3]
+        valid = echoes != self.NO_ECHO_CM
+        distance = np.where(valid, echoes * 10, 0)
+        return [SensorFrame(self.name, distance[i], valid[i], host_time,
+                            angle_deg=float(values[i, 0]), aux=int(values[i, 3]) * 10)
+                for i in range(len(values))]
+
+
+@register
+class Vl53FrameDecoder:
+    """F:...E lines and binary frames, via frame_protocol.FrameDecoder"""
+
+    name = 'vl53_frame'
+    ascii_pattern = re.compile(rb'F:\d+:\d+(?::Z:\d+:\d+:-?\d+)*:E')
+    # An 8x8 ASCII line is longer than the sniff sample: a header is enough
+    ascii_start = re.compile(rb'(?:^|\n)F:\d+:\d+:(?:Z:\d+:\d+:-?\d+:){2}')
+
+    def __init__(self, grid_size=8, protocol='auto', **options):
+        self.grid_size = grid_size
+        self.decoder = FrameDecoder(grid_size, protocol)
+        self._dist = np.zeros((grid_size, grid_size), dtype=np.int16)
+        self._valid = np.zeros((grid_size, grid_size), dtype=bool)
+        self.frames = 0
+
+    @property
+    def parse_errors(self):
+        return self.decoder.parse_errors + self.decoder.crc_errors + self.decoder.header_errors
+
+    @classmethod
+    def grid_from_sample(cls, sample):
+        """Grid size announced by the first binary header, if any"""
+        start = sample.find(SYNC)
+        while 0 <= start <= len(sample) - HEADER.size:
+            _, version, grid, _, _ = HEADER.unpack_from(sample, start)
+            if version == VERSION and grid in SUPPORTED_GRIDS:
+                return grid
+            start = sample.find(SYNC, start + 1)
+        rows = re.findall(rb'Z:(\d+):(\d+):', sample)
+        if rows:
+            largest = max(max(int(r), int(c)) for r, c in rows)
+            return 4 if largest < 4 else 8
+        return None
+
+    @classmethod
+    def sniff(cls, sample):
+        if cls.grid_from_sample(sample) and SYNC in sample:
+            return 1.0
+        lines = _sample_records(sample, b'\n')
+        if not lines:
+            return 1.0 if cls.ascii_start.search(sample) else 0.0
+        return sum(1 for l in lines if cls.ascii_pattern.fullmatch(l)) / len(lines)
+
+    def feed(self, data, host_time=None):
+        host_time = time.time() if host_time is None else host_time
+        self.decoder.feed(data)
+        frames = []
+        while True:
+            result = self.decoder.decode_next(self._dist, self._valid)
+            if result is None:
+                break
+            frame_num, timestamp, _ = result
+            frames.append(SensorFrame(self.name, self._dist.copy(), self._valid.copy(), host_time,
+                                      frame_num=frame_num, device_ts=timestamp))
+        self.frames += len(frames)
+        return frames
+
+
+def sniff(sample, min_score=0.5):
+    """Name of the decoder that best explains sample, or None"""
+    scores = {name: cls.sniff(sample) for name, cls in DECODERS.items()}
+    best = max(scores, key=scores.get)
+    return best if scores[best] >= min_score else None
+
+
+def create_decoder(name, **options):
+    return DECODERS[name](**options)
+
+
+class IngestCore:
+    """Sniffs the format on the first bytes, then decodes the port in bulk"""
+
+    def __init__(self, serial_conn, decoder=None, sniff_bytes=SNIFF_BYTES, **options):
+        self.serial_conn = serial_conn
+        self.sniff_bytes = sniff_bytes
+        self.options = options
+        self.decoder = create_decoder(decoder, **options) if isinstance(decoder, str) else decoder
+        self._sample = bytearray()
+
+    @property
+    def format(self):
+        return None if self.decoder is None else self.decoder.name
+
+    def _detect(self, data):
+        self._sample += data
+        name = sniff(bytes(self._sample))
+        if name is None and len(self._sample) < self.sniff_bytes:
+            return []
+        if name is None:
+            # Still undecided after a full sample: keep only the newest bytes
+            del self._sample[:-self.sniff_bytes // 2]
+            return []
+
+        options = dict(self.options)
+        if name == Vl53FrameDecoder.name and 'grid_size' not in options:
+            options['grid_size'] = Vl53FrameDecoder.grid_from_sample(bytes(self._sample)) or 8
+        self.decoder = create_decoder(name, **options)
+        sample = bytes(self._sample)
+        self._sample.clear()
+        return self.decoder.feed(sample)
+
+    def poll(self):
+        """Read everything waiting and return the decoded frames"""
+        waiting = self.serial_conn.in_waiting
+        if not waiting:
+            return []
+        data = self.serial_conn.read(waiting)
+        if self.decoder is None:
+            return self._detect(data)
+        return self.decoder.feed(data)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Detect a sensor stream format and decode it')
+    parser.add_argument('--port', type=str, required=True)
+    parser.add_argument('--baudrate', type=int, default=115200)
+    parser.add_argument('--format', type=str, choices=sorted(DECODERS),
+                        help='Skip auto-detection')
+    args = parser.parse_args()
+
+    import serial
+    ser = serial.Serial(args.port, args.baudrate, timeout=0.05)
+    core = IngestCore(ser, args.format)
+    print(f"✓ Connected: {args.port} @ {args.baudrate} baud")
+
+    frames = 0
+    last_report = time.time()
+    try:
+        while True:
+            batch = core.poll()
+            if not batch:
+                time.sleep(0.002)
+            frames += len(batch)
+            now = time.time()
+            if now - last_report >= 1.0:
+                last = batch[-1] if batch else None
+                print(f"Format: {core.format or 'detecting...'} | "
+                      f"{frames / (now - last_report):7.1f} frames/s | last: {last}")
+                frames = 0
+                last_report = now
+    except KeyboardInterrupt:
+        print("\n✓ Interrupted by user")
+    finally:
+        ser.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,497 @@
+"""
+Shared-memory frame bus - one process owns the port, any number read
+
+The publisher decodes frames and writes them into a ring of fixed slots in
+a multiprocessing.shared_memory block. Subscribers (viewer, recorder,
+safety monitor) attach by name and read the newest or the next frame
+straight out of shared memory: no pickling, no pipes, and nothing a
+subscriber does can block the publisher.
+
+Each slot carries a seqlock word: it is odd (2k-1) while frame k is being
+written and even (2k) once the frame is complete. A reader checks the word
+before and after copying; if it changed, the slot was overwritten under it
+and the read is retried or reported as torn.
+
+Usage:
+    python frame_bus.py publish --port /dev/ttyUSB0 --grid 8
+    python frame_bus.py view --mode heatmap          # in another terminal
+    python frame_bus.py safety --pose 1135,0,0,0
+    python frame_bus.py record session.vlcap
+    python frame_bus.py monitor
+"""
+
+import argparse
+import os
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+DEFAULT_BUS = 'vl53l7cx_bus'
+BUS_MAGIC = b'VLBUS\x00\x00\x01'
+
+HEADER_DTYPE = np.dtype([
+    ('magic', 'S8'),
+    ('grid_size', '<u4'),
+    ('capacity', '<u4'),
+    ('head', '<u8'),        # frames published; frame k lives in slot (k - 1) % capacity
+    ('closed', '<u4'),
+    ('publisher_pid', '<u4'),
+], align=True)
+
+
+def slot_dtype(grid_size):
+    return np.dtype([
+        ('lock', '<u8'),    # seqlock word: 2k-1 while writing frame k, 2k when done
+        ('frame_num', '<i8'),
+        ('device_ts', '<i8'),
+        ('host_ts', '<f8'),
+        ('distance', '<i2', (grid_size, grid_size)),
+        ('valid', '?', (grid_size, grid_size)),
+    ], align=True)
+
+
+def _layout(shm, grid_size, capacity):
+    header = np.ndarray((), dtype=HEADER_DTYPE, buffer=shm.buf)
+    slots = np.ndarray((capacity,), dtype=slot_dtype(grid_size), buffer=shm.buf,
+                       offset=HEADER_DTYPE.itemsize)
+    return header, slots
+
+
+def _attach(name):
+    """Open an existing block without letting this process's tracker unlink it"""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Python < 3.13: the resource tracker would destroy the block when a
+        # subscriber exits, so take it off the tracker's list
+        shm = shared_memory.SharedMemory(name=name)
+        try:
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(shm._name, 'shared_memory')
+        except Exception:
+            pass
+        return shm
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True     # exists, owned by another user
+    return True
+
+
+def _reclaim_stale(name):
+    """
+    Unlink a leftover block of this name, but only if its publisher is gone
+    or marked it closed; a live publisher's bus is never taken over.
+    """
+    stale = _attach(name)
+    try:
+        if stale.size >= HEADER_DTYPE.itemsize:
+            header = np.ndarray((), dtype=HEADER_DTYPE, buffer=stale.buf)
+            live = (header['magic'] == BUS_MAGIC and not header['closed']
+                    and _pid_alive(int(header['publisher_pid'])))
+            pid = int(header['publisher_pid'])
+            del header
+            if live:
+                raise RuntimeError(f"Frame bus {name!r} is in use by publisher pid {pid}; "
+                                   f"stop it or pick another --name")
+    finally:
+        stale.close()
+    stale.unlink()
+
+
+class FrameBusPublisher:
+    """Single writer; owns (creates and finally unlinks) the shared block"""
+
+    def __init__(self, grid_size, name=DEFAULT_BUS, capacity=64):
+        size = HEADER_DTYPE.itemsize + capacity * slot_dtype(grid_size).itemsize
+        try:
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            # Left over from a publisher that did not shut down cleanly
+            _reclaim_stale(name)
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+
+        self.name = name
+        self.grid_size = grid_size
+        self.capacity = capacity
+        self.header, self.slots = _layout(self.shm, grid_size, capacity)
+        self.slots['lock'] = 0
+        self.header['grid_size'] = grid_size
+        self.header['capacity'] = capacity
+        self.header['head'] = 0
+        self.header['closed'] = 0
+        self.header['publisher_pid'] = os.getpid()
+        self.header['magic'] = BUS_MAGIC
+        self.seq = 0
+
+    def publish(self, distance_map, valid_mask, frame_num, device_ts, host_ts):
+        seq = self.seq + 1
+        slot = self.slots[(seq - 1) % self.capacity]
+        slot['lock'] = 2 * seq - 1
+        slot['distance'] = distance_map
+        slot['valid'] = valid_mask
+        slot['frame_num'] = frame_num
+        slot['device_ts'] = device_ts
+        slot['host_ts'] = host_ts
+        slot['lock'] = 2 * seq
+        self.header['head'] = seq
+        self.seq = seq
+        return seq
+
+    def listener(self):
+        """IngestThread listener that publishes every decoded frame"""
+        def callback(mapper):
+            self.publish(mapper.distance_map, mapper.valid_mask, mapper.frame_num,
+                         mapper.device_timestamp, mapper.last_frame_time)
+        return callback
+
+    def close(self):
+        self.header['closed'] = 1
+        del self.header, self.slots
+        self.shm.close()
+        try:
+            self.shm.unlink()
+        except FileNotFoundError:
+            pass
+
+
+class FrameBusSubscriber:
+    """
+    Reader attached by name. take_latest() has the same contract as
+    ingest.FrameRing.take_latest(), so FastVisualizer can draw from the bus.
+    """
+
+    def __init__(self, name=DEFAULT_BUS, timeout=5.0, retries=3):
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                self.shm = _attach(name)
+                header = np.ndarray((), dtype=HEADER_DTYPE, buffer=self.shm.buf)
+                if header['magic'] == BUS_MAGIC:
+                    break
+                del header
+                self.shm.close()
+            except FileNotFoundError:
+                pass
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"No frame bus named {name!r}")
+            time.sleep(0.1)
+
+        self.name = name
+        self.grid_size = int(header['grid_size'])
+        self.capacity = int(header['capacity'])
+        del header
+        self.header, self.slots = _layout(self.shm, self.grid_size, self.capacity)
+        self.retries = retries
+
+        self.mapper = None
+        self.last_seq = int(self.header['head'])
+        self.frames_read = 0
+        self.frames_skipped = 0
+        self.torn_reads = 0
+
+    @property
+    def head(self):
+        return int(self.header['head'])
+
+    @property
+    def closed(self):
+        return bool(self.header['closed'])
+
+    def attach_mapper(self, mapper):
+        """Mirror frame count, FPS and clock sync into a mapper (for FastVisualizer)"""
+        self.mapper = mapper
+
+    def _read(self, seq, distance_out, valid_out):
+        slot = self.slots[(seq - 1) % self.capacity]
+        expected = 2 * seq
+        if slot['lock'] != expected:
+            return None
+        np.copyto(distance_out, slot['distance'])
+        np.copyto(valid_out, slot['valid'])
+        meta = (int(slot['frame_num']), int(slot['device_ts']), float(slot['host_ts']))
+        if slot['lock'] != expected:
+            self.torn_reads += 1
+            return None
+        return meta
+
+    def _taken(self, seq, meta):
+        self.frames_skipped += max(seq - self.last_seq - 1, 0)
+        self.frames_read += 1
+        self.last_seq = seq
+
+        mapper = self.mapper
+        if mapper is not None:
+            now = time.time()
+            if mapper.frame_count:
+                mapper.fps = (seq - mapper.frame_count) / max(now - mapper.last_frame_time, 1e-6)
+            mapper.frame_count = seq
+            mapper.last_frame_time = now
+            mapper.frame_num, mapper.device_timestamp = meta[0], meta[1]
+            mapper.clock.add(meta[1], meta[2])
+            mapper.receive_latency.record(mapper.clock.latency_ms(meta[1], meta[2]))
+        return meta
+
+    def take_latest(self, distance_out, valid_out):
+        """Copy the newest frame if it is new. Returns (frame_num, device_ts, host_ts) or None"""
+        for _ in range(self.retries):
+            seq = self.head
+            if seq == self.last_seq or seq == 0:
+                return None
+            meta = self._read(seq, distance_out, valid_out)
+            if meta is not None:
+                return self._taken(seq, meta)
+        return None
+
+    def take_next(self, distance_out, valid_out):
+        """Copy the next frame in order (jumping ahead if the ring lapped us)"""
+        head = self.head
+        seq = self.last_seq + 1
+        if seq > head:
+            return None
+        if head - seq >= self.capacity - 1:
+            seq = head - self.capacity + 2   # oldest slot not about to be rewritten
+        for _ in range(self.retries):
+            meta = self._read(seq, distance_out, valid_out)
+            if meta is not None:
+                return self._taken(seq, meta)
+            seq = max(seq, self.head - self.capacity + 2)
+        return None
+
+    def latest_view(self):
+        """
+        Zero-copy access: (seq, slot) where slot is a structured view into
+        shared memory. Check still_valid(seq) after using it.
+        """
+        seq = self.head
+        if seq == 0:
+            return 0, None
+        return seq, self.slots[(seq - 1) % self.capacity]
+
+    def still_valid(self, seq):
+        return self.slots[(seq - 1) % self.capacity]['lock'] == 2 * seq
+
+    def wait(self, timeout, poll=0.0005):
+        """Poll until a frame newer than the last one taken appears"""
+        deadline = time.monotonic() + timeout
+        while self.head == self.last_seq:
+            if self.closed or time.monotonic() > deadline:
+                return False
+            time.sleep(poll)
+        return True
+
+    def stats(self):
+        return {
+            'published': self.head,
+            'read': self.frames_read,
+            'skipped': self.frames_skipped,
+            'torn': self.torn_reads,
+        }
+
+    def close(self):
+        del self.header, self.slots
+        self.shm.close()
+
+
+# ----- processes -----
+
+def run_publisher(args):
+    from vl53l7cx_mapper import LowLatencyMapper
+
+    if args.replay:
+        from capture import CaptureReader
+        reader = CaptureReader(args.replay)
+        args.grid = reader.grid_size
+        reader.close()
+
+    try:
+        bus = FrameBusPublisher(args.grid, args.name, args.capacity)
+    except RuntimeError as e:
+        print(f"✗ {e}")
+        return
+
+    mapper = LowLatencyMapper(args.port or f"replay:{args.replay}", args.baudrate,
+                              args.grid, args.protocol)
+    if args.replay:
+        mapper.open_replay(args.replay, args.speed)
+    elif not mapper.connect():
+        bus.close()
+        return
+
+    print(f"✓ Publishing {args.grid}x{args.grid} frames on bus '{args.name}' "
+          f"({args.capacity} slots, {bus.shm.size} bytes)")
+    last_report = time.time()
+    last_seq = 0
+    try:
+        while True:
+            before = mapper.frame_count
+            mapper.read_frame_fast()
+            if mapper.frame_count == before:
+                if mapper.source_exhausted():
+                    break
+                mapper.wait_for_data(0.005)
+                continue
+            bus.publish(mapper.distance_map, mapper.valid_mask, mapper.frame_num,
+                        mapper.device_timestamp, mapper.last_frame_time)
+
+            now = time.time()
+            if now - last_report >= 1.0:
+                print(f"  Published: {bus.seq} | {(bus.seq - last_seq) / (now - last_report):.1f} FPS")
+                last_seq, last_report = bus.seq, now
+    except KeyboardInterrupt:
+        print("\n✓ Interrupted by user")
+    finally:
+        print(f"✓ Published {bus.seq} frames")
+        bus.close()
+        mapper.disconnect()
+
+
+def run_viewer(args):
+    from vl53l7cx_mapper import FastVisualizer, LowLatencyMapper
+
+    sub = FrameBusSubscriber(args.name, args.timeout)
+    mapper = LowLatencyMapper(f"bus:{args.name}", grid_size=sub.grid_size)
+    sub.attach_mapper(mapper)
+    try:
+        FastVisualizer(mapper, args.mode, sub, args.renderer).start(interval=10)
+    finally:
+        stats = sub.stats()
+        print(f"  Bus frames read: {stats['read']} | skipped: {stats['skipped']} | torn: {stats['torn']}")
+        sub.close()
+
+
+def _consume(args, on_frame):
+    """Read every frame in order and call on_frame(dist, valid, meta) until the publisher closes"""
+    sub = FrameBusSubscriber(args.name, args.timeout)
+    shape = (sub.grid_size, sub.grid_size)
+    distance_map = np.zeros(shape, dtype=np.int16)
+    valid_mask = np.zeros(shape, dtype=bool)
+    try:
+        while not sub.closed:
+            meta = sub.take_next(distance_map, valid_mask)
+            if meta is None:
+                sub.wait(0.1)
+                continue
+            on_frame(distance_map, valid_mask, meta)
+    except KeyboardInterrupt:
+        print("\n✓ Interrupted by user")
+    finally:
+        stats = sub.stats()
+        print(f"✓ Read {stats['read']} of {stats['published']} frames "
+              f"(skipped {stats['skipped']}, torn {stats['torn']})")
+        sub.close()
+    return sub
+
+
+def run_recorder(args):
+    from capture import CaptureWriter
+    from frame_protocol import encode_frame
+
+    sub = FrameBusSubscriber(args.name, args.timeout)
+    writer = CaptureWriter(args.file, sub.grid_size)
+    sub.close()
+
+    def on_frame(distance_map, valid_mask, meta):
+        frame_num, device_ts, host_ts = meta
+        writer.write(host_ts, encode_frame(frame_num, device_ts, np.where(valid_mask, distance_map, 0)))
+
+    print(f"✓ Recording bus '{args.name}' to {args.file}")
+    try:
+        _consume(args, on_frame)
+    finally:
+        writer.close()
+        print(f"✓ Recorded {writer.frames_written} frames")
+
+
+def run_safety(args):
+    from multi_sensor import ModulePose
+    from point_cloud import PointCloudEngine
+    from safety_zones import SafetyEngine, lift_zones
+
+    pose = ModulePose.parse(args.pose)
+    rotation, origin = pose.rotation().T, pose.origin()
+    engine = SafetyEngine(lift_zones())
+    cloud = {}
+    last_level = [0]
+
+    def on_frame(distance_map, valid_mask, meta):
+        if 'engine' not in cloud:
+            cloud['engine'] = PointCloudEngine(distance_map.shape[0])
+        points = cloud['engine'].compute_full(distance_map) @ rotation + origin
+        alert = engine.evaluate(points, valid_mask, meta[2])
+        if alert.level != last_level[0]:
+            print(f"⚠️ {alert}" if alert.level else f"✓ {alert}")
+            last_level[0] = alert.level
+
+    print(f"✓ Safety monitor on bus '{args.name}' ({pose})")
+    _consume(args, on_frame)
+
+
+def run_monitor(args):
+    from clock_sync import ClockSync, LatencyTracker
+
+    clock = ClockSync()
+    latency = LatencyTracker()
+    state = {'last_report': time.time(), 'frames': 0}
+
+    def on_frame(distance_map, valid_mask, meta):
+        now = time.time()
+        clock.add(meta[1], meta[2])
+        latency.record(clock.latency_ms(meta[1], now))
+        state['frames'] += 1
+        if now - state['last_report'] >= 1.0:
+            print(f"  {state['frames'] / (now - state['last_report']):6.1f} FPS | "
+                  f"valid {int(np.count_nonzero(valid_mask)):3d} | device->subscriber {latency.summary()}")
+            state['frames'] = 0
+            state['last_report'] = now
+
+    _consume(args, on_frame)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='VL53L7CX shared-memory frame bus')
+    parser.add_argument('--name', type=str, default=DEFAULT_BUS, help='Bus (shared memory) name')
+    parser.add_argument('--timeout', type=float, default=10.0,
+                        help='Seconds a subscriber waits for the publisher')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    pub = sub.add_parser('publish', help='Own the port and publish frames')
+    pub.add_argument('--port', type=str)
+    pub.add_argument('--replay', type=str, metavar='FILE')
+    pub.add_argument('--speed', type=float, default=1.0)
+    pub.add_argument('--baudrate', type=int, default=921600)
+    pub.add_argument('--grid', type=int, default=8, choices=[4, 8])
+    pub.add_argument('--protocol', type=str, default='auto', choices=('ascii', 'binary', 'auto'))
+    pub.add_argument('--capacity', type=int, default=64, help='Ring slots (default: 64)')
+
+    view = sub.add_parser('view', help='FastVisualizer reading from the bus')
+    view.add_argument('--mode', type=str, default='heatmap', choices=['3d', 'heatmap', 'both'])
+    view.add_argument('--renderer', type=str, default='blit', choices=['blit', 'legacy'])
+
+    rec = sub.add_parser('record', help='Write every bus frame to a capture file')
+    rec.add_argument('file', type=str)
+
+    safety = sub.add_parser('safety', help='Evaluate safety zones on every bus frame')
+    safety.add_argument('--pose', type=str, default='1135,0,0,0',
+                        help='Module pose x,y,z,yaw in the lift frame (mm, deg)')
+
+    sub.add_parser('monitor', help='Print bus rate and latency')
+
+    args = parser.parse_args()
+    {
+        'publish': run_publisher,
+        'view': run_viewer,
+        'record': run_recorder,
+        'safety': run_safety,
+        'monitor': run_monitor,
+    }[args.command](args)
+
+
+if __name__ == '__main__':
+    main()
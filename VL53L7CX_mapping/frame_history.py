@@ -0,0 +1,215 @@
+"""
+Fixed-memory rolling frame history with time-window queries
+
+FrameHistory keeps the last `seconds` of frames in one preallocated
+structured array (frame number, device/host timestamps, distances,
+validity). Every frame is written twice - at slot i and i + capacity - so
+any run of up to `capacity` consecutive frames is one contiguous slice:
+window queries (last N, time range) return views, never copies, and the
+memory used is fixed at startup however long the session runs.
+
+Views stay valid until the ring wraps over them (capacity frames later);
+copy() anything that has to outlive that. Per-zone reductions ignore
+invalid readings and return NaN for zones with none in the window.
+
+Usage:
+    history = FrameHistory(grid_size=8, seconds=10, rate=60)
+    ingest.add_listener(history.listener())
+    recent = history.window(2.0)                    # last 2 s, a view
+    history.zone_min(recent)                        # (8, 8) mm
+    t, d, v = history.zone_series(3, 5, seconds=2)  # one zone over time
+
+    python frame_history.py --seconds 10            # self-check on synthetic frames
+"""
+
+import argparse
+import math
+import time
+
+import numpy as np
+
+
+def history_dtype(grid_size):
+    return np.dtype([
+        ('frame_num', np.int64),
+        ('device_ts', np.int64),
+        ('host_ts', np.float64),
+        ('distance', np.int16, (grid_size, grid_size)),
+        ('valid', np.bool_, (grid_size, grid_size)),
+    ])
+
+
+class FrameHistory:
+    """Mirrored structured-array ring sized in seconds of frames"""
+
+    def __init__(self, grid_size, seconds=10.0, rate=60.0):
+        self.grid_size = grid_size
+        self.seconds = seconds
+        self.rate = rate
+        self.capacity = max(int(math.ceil(seconds * rate)), 1)
+        self._buf = np.zeros(2 * self.capacity, dtype=history_dtype(grid_size))
+        self.seq = 0   # frames appended so far
+
+    def __len__(self):
+        return min(self.seq, self.capacity)
+
+    @property
+    def nbytes(self):
+        return self._buf.nbytes
+
+    def append(self, distance_map, valid_mask, frame_num, device_ts, host_ts):
+        slot = self.seq % self.capacity
+        for i in (slot, slot + self.capacity):
+            rec = self._buf[i]
+            rec['frame_num'] = frame_num
+            rec['device_ts'] = device_ts
+            rec['host_ts'] = host_ts
+            rec['distance'] = distance_map
+            rec['valid'] = valid_mask
+        self.seq += 1
+
+    def listener(self):
+        """IngestThread listener that records every frame the mapper decodes"""
+        def callback(mapper):
+            self.append(mapper.distance_map, mapper.valid_mask, mapper.frame_num,
+                        mapper.device_timestamp, mapper.last_frame_time)
+        return callback
+
+    def clear(self):
+        self.seq = 0
+
+    # ----- window selection (views) -----
+
+    def frames(self):
+        """Everything retained, oldest first"""
+        n = len(self)
+        end = self.seq % self.capacity + self.capacity if self.seq > self.capacity else self.seq
+        return self._buf[end - n:end]
+
+    def last(self, n):
+        """The newest n frames, oldest first"""
+        frames = self.frames()
+        return frames[len(frames) - min(n, len(frames)):]
+
+    def between(self, start, end, clock='host'):
+        """Frames with start <= timestamp < end; clock 'host' (s) or 'device' (ms)"""
+        frames = self.frames()
+        stamps = frames['host_ts' if clock == 'host' else 'device_ts']
+        lo, hi = np.searchsorted(stamps, [start, end], side='left')
+        return frames[lo:hi]
+
+    def window(self, seconds, now=None):
+        """Frames received in the last `seconds` (host clock)"""
+        frames = self.frames()
+        if not len(frames):
+            return frames
+        now = frames['host_ts'][-1] if now is None else now
+        lo = np.searchsorted(frames['host_ts'], now - seconds, side='left')
+        return frames[lo:]
+
+    def zone_series(self, row, col, seconds=None, n=None):
+        """(host_ts, distance, valid) of one zone over a window, all views"""
+        frames = self.last(n) if n is not None else (
+            self.window(seconds) if seconds is not None else self.frames())
+        return frames['host_ts'], frames['distance'][:, row, col], frames['valid'][:, row, col]
+
+    # ----- per-zone reductions over a window -----
+
+    @staticmethod
+    def _masked(frames, fill):
+        return np.where(frames['valid'], frames['distance'], fill)
+
+    def zone_min(self, frames):
+        if not len(frames):
+            return np.full((self.grid_size, self.grid_size), np.nan)
+        out = self._masked(frames, np.iinfo(np.int16).max).min(axis=0).astype(np.float64)
+        out[~frames['valid'].any(axis=0)] = np.nan
+        return out
+
+    def zone_max(self, frames):
+        if not len(frames):
+            return np.full((self.grid_size, self.grid_size), np.nan)
+        out = self._masked(frames, np.iinfo(np.int16).min).max(axis=0).astype(np.float64)
+        out[~frames['valid'].any(axis=0)] = np.nan
+        return out
+
+    def zone_valid_ratio(self, frames):
+        if not len(frames):
+            return np.zeros((self.grid_size, self.grid_size))
+        return frames['valid'].mean(axis=0)
+
+    def zone_mean(self, frames):
+        counts = frames['valid'].sum(axis=0)
+        sums = self._masked(frames, 0).sum(axis=0, dtype=np.float64)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(counts > 0, sums / counts, np.nan)
+
+    def zone_percentile(self, frames, q):
+        """Per-zone q-th percentile (linear interpolation) of the valid readings"""
+        if not len(frames):
+            return np.full((self.grid_size, self.grid_size), np.nan)
+        # Invalid readings sort to the end as NaN; each zone then
+        # interpolates within its own count of valid samples
+        ordered = np.sort(self._masked(frames, np.nan), axis=0)
+        counts = frames['valid'].sum(axis=0)
+        pos = (q / 100.0) * np.maximum(counts - 1, 0)
+        lo = np.floor(pos).astype(np.intp)
+        hi = np.minimum(lo + 1, np.maximum(counts - 1, 0))
+        below = np.take_along_axis(ordered, lo[None], axis=0)[0]
+        above = np.take_along_axis(ordered, hi[None], axis=0)[0]
+        out = below + (above - below) * (pos - lo)
+        out[counts == 0] = np.nan
+        return out
+
+    def nearest(self, frames):
+        """(row, col, distance_mm, host_ts) of the closest valid reading, or None"""
+        masked = self._masked(frames, np.iinfo(np.int16).max)
+        if not len(frames) or not frames['valid'].any():
+            return None
+        i, r, c = np.unravel_index(int(np.argmin(masked)), masked.shape)
+        return int(r), int(c), int(masked[i, r, c]), float(frames['host_ts'][i])
+
+
+def main():
+    from virtual_serial import SyntheticFrameGenerator
+
+    parser = argparse.ArgumentParser(description='Frame history self-check on synthetic frames')
+    parser.add_argument('--grid', type=int, default=8, choices=[4, 8])
+    parser.add_argument('--seconds', type=float, default=10.0, help='History length (s)')
+    parser.add_argument('--rate', type=float, default=60.0, help='Frame rate (Hz)')
+    parser.add_argument('--frames', type=int, default=3000, help='Frames to push')
+    args = parser.parse_args()
+
+    gen = SyntheticFrameGenerator(args.grid, args.rate)
+    history = FrameHistory(args.grid, args.seconds, args.rate)
+    print(f"✓ History: {history.capacity} frames ({args.seconds:.0f}s @ {args.rate:.0f}Hz), "
+          f"{history.nbytes / 1024:.0f} KiB fixed")
+
+    start = time.perf_counter()
+    for i in range(args.frames):
+        dist = gen.frame(i)
+        history.append(dist, dist > 0, i, gen.timestamp_ms(i), i / args.rate)
+    append_us = 1e6 * (time.perf_counter() - start) / args.frames
+
+    queries = {
+        'window(2s)': lambda: history.window(2.0),
+        'last(120)': lambda: history.last(120),
+        'zone_min(2s)': lambda: history.zone_min(history.window(2.0)),
+        'zone_mean(2s)': lambda: history.zone_mean(history.window(2.0)),
+        'zone_p95(2s)': lambda: history.zone_percentile(history.window(2.0), 95),
+        'zone_series(3,5)': lambda: history.zone_series(3, 5, seconds=2.0),
+    }
+    print(f"  append: {append_us:.1f}us/frame")
+    for name, query in queries.items():
+        t0 = time.perf_counter()
+        for _ in range(100):
+            query()
+        print(f"  {name:<18} {1e4 * (time.perf_counter() - t0):8.1f}us")
+
+    recent = history.window(2.0)
+    print(f"\n✓ Last 2s: {len(recent)} frames (view: {recent.base is not None}), "
+          f"nearest {history.nearest(recent)}")
+
+
+if __name__ == '__main__':
+    main()
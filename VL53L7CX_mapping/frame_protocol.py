@@ -0,0 +1,323 @@
+"""
+VL53L7CX frame protocol - ASCII and compact binary framing
+
+ASCII (legacy, one line per frame):
+    F:frameNum:timestamp:Z:row:col:dist:Z:row:col:dist:...E
+
+Binary (little endian, one frame = 12 + 2*N*N + 4 bytes):
+    offset  size       field
+    0       2          sync word 0xA5 0x5A
+    2       1          protocol version (1)
+    3       1          grid size N (4 or 8)
+    4       4          frame number (uint32)
+    8       4          device timestamp, millis() (uint32)
+    12      2*N*N      zone distances in mm, row-major int16 (<=0 = no target)
+    12+2NN  4          CRC-32 (zlib polynomial) over bytes [2, 12+2NN)
+
+The binary payload is decoded with np.frombuffer straight into the caller's
+distance_map/valid_mask, so there is no per-zone Python work. The decoder
+resyncs on the next sync word after a CRC failure and, in 'auto' mode,
+accepts ASCII frames from the same stream.
+"""
+
+import struct
+import zlib
+
+import numpy as np
+
+SYNC = b'\xa5\x5a'
+VERSION = 1
+HEADER = struct.Struct('<2sBBII')
+CRC = struct.Struct('<I')
+SUPPORTED_GRIDS = (4, 8)
+
+# Same acceptance window the ASCII parser has always used
+MIN_VALID_MM = 10
+MAX_VALID_MM = 1180
+
+PROTOCOLS = ('ascii', 'binary', 'auto')
+
+# Longest ASCII line we will wait for before treating it as garbage
+MAX_LINE_BYTES = 4096
+
+
+def binary_frame_size(grid_size):
+    """Total size in bytes of one binary frame"""
+    return HEADER.size + 2 * grid_size * grid_size + CRC.size
+
+
+def encode_frame(frame_num, timestamp_ms, distance_map):
+    """
+    Pure-Python reference encoder for the binary format.
+    distance_map: (N, N) array-like of mm; values <= 0 mark invalid zones.
+    """
+    dist = np.ascontiguousarray(distance_map, dtype='<i2')
+    grid_size = dist.shape[0]
+    body = HEADER.pack(SYNC, VERSION, grid_size,
+                       frame_num & 0xFFFFFFFF,
+                       timestamp_ms & 0xFFFFFFFF)[2:] + dist.tobytes()
+    return SYNC + body + CRC.pack(zlib.crc32(body) & 0xFFFFFFFF)
+
+
+def encode_ascii_frame(frame_num, timestamp_ms, distance_map, valid_mask=None):
+    """Encode one frame in the legacy ASCII format (valid zones only)"""
+    dist = np.asarray(distance_map)
+    if valid_mask is None:
+        valid_mask = dist > 0
+    parts = [f'F:{frame_num}:{timestamp_ms}']
+    for row, col in zip(*np.nonzero(valid_mask)):
+        parts.append(f'Z:{row}:{col}:{dist[row, col]}')
+    parts.append('E\n')
+    return ':'.join(parts).encode('ascii')
+
+
+def parse_ascii_frame(line, distance_map, valid_mask):
+    """
+    Parse one ASCII frame line into distance_map/valid_mask.
+    Returns (frame_num, timestamp, zones_parsed) or None if the line
+    is not a frame.
+    """
+    grid_size = distance_map.shape[0]
+
+    # Must start with frame marker
+    if not line.startswith('F:'):
+        return None
+
+    # Parse frame header
+    try:
+        parts = line.split(':')
+        if len(parts) < 4:
+            return None
+
+        frame_num = int(parts[1])
+        timestamp = int(parts[2])
+
+    except (ValueError, IndexError):
+        return None
+
+    # Clear previous data
+    distance_map.fill(0)
+    valid_mask.fill(False)
+
+    # Parse zone data quickly
+    # Format after header: Z:row:col:dist:Z:row:col:dist:...E
+    i = 3
+    zones_parsed = 0
+
+    while i < len(parts) - 1:
+        if parts[i] == 'Z':
+            try:
+                if i + 3 < len(parts):
+                    row = int(parts[i + 1])
+                    col = int(parts[i + 2])
+                    dist = int(parts[i + 3])
+
+                    # Validate and store
+                    if (0 <= row < grid_size and
+                        0 <= col < grid_size and
+                        MIN_VALID_MM <= dist <= MAX_VALID_MM):
+
+                        distance_map[row, col] = dist
+                        valid_mask[row, col] = True
+                        zones_parsed += 1
+
+                    i += 4
+                else:
+                    break
+            except (ValueError, IndexError):
+                i += 1
+        elif parts[i] == 'E':
+            break
+        else:
+            i += 1
+
+    return frame_num, timestamp, zones_parsed
+
+
+class FrameDecoder:
+    """
+    Incremental decoder over a byte buffer.
+
+    feed() appends whatever the port had waiting; decode_next() pulls one
+    frame (binary or ASCII, depending on protocol) into the caller's arrays.
+    """
+
+    def __init__(self, grid_size, protocol='auto'):
+        if protocol not in PROTOCOLS:
+            raise ValueError(f"Unknown protocol: {protocol}")
+        self.grid_size = grid_size
+        self.protocol = protocol
+        self.accept_binary = protocol in ('binary', 'auto')
+        self.accept_ascii = protocol in ('ascii', 'auto')
+
+        self.n_zones = grid_size * grid_size
+        self.frame_size = binary_frame_size(grid_size)
+        self._payload_end = HEADER.size + 2 * self.n_zones
+        self._buf = bytearray()
+
+        # Last decoded frame header
+        self.frame_num = -1
+        self.timestamp = 0
+        self.kind = None
+
+        # Raw bytes of the last frame, kept only when recording
+        self.keep_raw = False
+        self.last_raw = None
+
+        # Counters
+        self.binary_frames = 0
+        self.ascii_frames = 0
+        self.crc_errors = 0
+        self.header_errors = 0   # SYNC followed by a wrong version / grid size
+        self.parse_errors = 0
+        self.bytes_discarded = 0
+
+    def feed(self, data):
+        self._buf += data
+
+    def reset(self):
+        self._buf.clear()
+
+    @property
+    def buffered(self):
+        return len(self._buf)
+
+    def _discard(self, n):
+        if n > 0:
+            del self._buf[:n]
+            self.bytes_discarded += n
+
+    def _find_start(self):
+        """Index and kind of the earliest frame start in the buffer"""
+        buf = self._buf
+        sync = buf.find(SYNC) if self.accept_binary else -1
+        text = buf.find(b'F:') if self.accept_ascii else -1
+        if sync < 0 and text < 0:
+            return -1, None
+        if text < 0 or (0 <= sync < text):
+            return sync, 'binary'
+        return text, 'ascii'
+
+    def decode_next(self, distance_map, valid_mask):
+        """
+        Decode the next complete frame into distance_map/valid_mask.
+        Returns (frame_num, timestamp, zones_valid) or None when no full
+        frame is buffered yet.
+        """
+        while True:
+            start, kind = self._find_start()
+            if start < 0:
+                # Keep one byte in case it is the first half of a marker
+                self._discard(len(self._buf) - 1)
+                return None
+            self._discard(start)
+
+            if kind == 'binary':
+                result = self._decode_binary(distance_map, valid_mask)
+            else:
+                result = self._decode_ascii(distance_map, valid_mask)
+
+            if result is None:
+                return None
+            if result is not False:
+                return result
+
+    def _decode_binary(self, distance_map, valid_mask):
+        buf = self._buf
+        if len(buf) < HEADER.size:
+            return None
+
+        _, version, grid, frame_num, timestamp = HEADER.unpack_from(buf)
+        if version != VERSION or grid != self.grid_size:
+            # Not a real header (or a module configured for another grid)
+            self.header_errors += 1
+            self._discard(2)
+            return False
+
+        if len(buf) < self.frame_size:
+            return None
+
+        end = self._payload_end
+        (crc,) = CRC.unpack_from(buf, end)
+        if zlib.crc32(memoryview(buf)[2:end]) & 0xFFFFFFFF != crc:
+            self.crc_errors += 1
+            self._discard(2)
+            return False
+
+        dist = np.frombuffer(buf, dtype='<i2', count=self.n_zones,
+                             offset=HEADER.size).reshape(distance_map.shape)
+        np.copyto(distance_map, dist)
+        np.greater_equal(dist, MIN_VALID_MM, out=valid_mask)
+        valid_mask &= dist <= MAX_VALID_MM
+        np.multiply(distance_map, valid_mask, out=distance_map)
+        del dist  # release the buffer export before resizing
+
+        if self.keep_raw:
+            self.last_raw = bytes(buf[:self.frame_size])
+        del buf[:self.frame_size]
+        self.frame_num = frame_num
+        self.timestamp = timestamp
+        self.kind = 'binary'
+        self.binary_frames += 1
+        return frame_num, timestamp, int(np.count_nonzero(valid_mask))
+
+    def _decode_ascii(self, distance_map, valid_mask):
+        buf = self._buf
+        end = buf.find(b'\n')
+        if self.accept_binary:
+            # A sync word before the newline means the line was cut short
+            sync = buf.find(SYNC, 2)
+            if sync > 0 and (end < 0 or sync < end):
+                self.parse_errors += 1
+                self._discard(sync)
+                return False
+        if end < 0:
+            if len(buf) > MAX_LINE_BYTES:
+                self.parse_errors += 1
+                self._discard(2)
+                return False
+            return None
+
+        line = buf[:end].decode('utf-8', errors='ignore').strip()
+        if self.keep_raw:
+            self.last_raw = bytes(buf[:end + 1])
+        del buf[:end + 1]
+
+        result = parse_ascii_frame(line, distance_map, valid_mask)
+        if result is None:
+            self.parse_errors += 1
+            return False
+
+        self.frame_num, self.timestamp, _ = result
+        self.kind = 'ascii'
+        self.ascii_frames += 1
+        return result
+
+
+def main():
+    """Stream synthetic frames on a pty so the mapper can be run without an ESP32"""
+    import argparse
+    import time
+    from virtual_serial import SimulatedSensor
+
+    parser = argparse.ArgumentParser(description='VL53L7CX binary frame simulator')
+    parser.add_argument('--grid', type=int, default=8, choices=list(SUPPORTED_GRIDS))
+    parser.add_argument('--rate', type=float, default=60.0, help='Frames per second')
+    parser.add_argument('--ascii', action='store_true', help='Emit ASCII frames instead')
+    args = parser.parse_args()
+
+    sensor = SimulatedSensor(args.grid, args.rate, binary=not args.ascii)
+    print(f"✓ Simulated sensor on {sensor.port}")
+    print(f"  Run: python vl53l7cx_mapper.py --port {sensor.port} --grid {args.grid}")
+    sensor.start()
+    try:
+        while sensor.is_alive():
+            time.sleep(0.2)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sensor.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,707 @@
+"""
+Delta-encoded frame streaming to remote viewers over WebSocket
+
+StreamServer pushes sensor frames from the ingest thread to any number of
+WebSocket clients (a supervisor tablet, a dashboard) on the local network.
+Frames are encoded once, on publish, in a compact binary format:
+
+    header  <2sBBHHBBIII  magic 'VS', version, kind (1 key / 2 delta),
+                          rows, cols, quant_mm, source (0 zones / 1 angle
+                          bins), seq, frame_num, device_ts
+    key     rows*cols uint8 codes: distance / quant_mm, 255 = invalid
+    delta   changed-zone bitmap (packbits) + the new codes of those zones
+
+Quantised codes only change when a zone moves by more than `deadband`
+steps, and keyframes carry the same reconstructed state the delta chain
+does, so every client sees identical frames whichever mix it received.
+
+Backpressure is per client: each client has a latest-only slot that
+publish() overwrites. Viewers that offer the 'vs-ack' subprotocol in the
+handshake acknowledge every frame they have applied (b'A' + uint32 seq);
+their sender only takes from the slot while fewer than `max_unacked`
+frames are unacknowledged. TCP acks are not enough for them - a reachable
+but slow viewer keeps acknowledging into its receive buffer and would fall
+seconds behind. Plain WebSocket clients (a browser page) do not ack; their
+sender waits until the socket's send queue has drained below `max_unacked`
+frames instead. A client that has not taken the previous frame (slow
+Wi-Fi, backgrounded tablet) simply loses it - ingest never waits - and
+because its delta chain is broken its sender answers with a keyframe next.
+Encode and fan-out time go into histograms (instrumentation.py);
+per-client bandwidth, drops and keyframe share are in stats().
+
+The server binds to 127.0.0.1 unless given another host; pass
+--stream-host 0.0.0.0 to the mapper to serve the local network.
+
+The same encoding carries tof_visualizer's angle bins as a 1 x n frame
+(source 1); see its --stream flag.
+
+Usage:
+    python vl53l7cx_mapper.py --port /dev/ttyUSB0 --headless --stream 8765
+    python vl53l7cx_mapper.py --port /dev/ttyUSB0 --headless --stream 8765 --stream-host 0.0.0.0
+    python tof_visualizer.py --port AUTO --stream 8766
+    python frame_stream.py --selftest                # server + loopback clients, synthetic frames
+    python frame_stream.py --connect 192.168.1.20:8765
+"""
+
+import argparse
+import base64
+import collections
+import hashlib
+import math
+import os
+import socket
+import struct
+import sys
+import threading
+import time
+
+import numpy as np
+
+try:
+    import fcntl
+    import termios
+except ImportError:     # Windows: no send-queue query, sendall() blocking is the only limit
+    fcntl = termios = None
+
+from instrumentation import MetricsRegistry
+from link_manager import EventRate
+
+HEADER = struct.Struct('<2sBBHHBBIII')
+MAGIC = b'VS'
+VERSION = 1
+KIND_KEY = 1
+KIND_DELTA = 2
+SOURCE_ZONES = 0
+SOURCE_ANGLE_BINS = 1
+INVALID_CODE = 255
+SEQ_MASK = 0xFFFFFFFF
+
+WS_GUID = b'258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+MAX_HANDSHAKE = 8192
+# A client's frames wait in the slot (and get replaced) while this many
+# sent frames are not yet acknowledged by the viewer, so a slow viewer
+# costs dropped frames rather than seconds of queued, stale ones
+MAX_UNACKED_FRAMES = 2
+# An acking viewer that stops acking still gets a frame this often
+ACK_TIMEOUT_S = 1.0
+ACK = struct.Struct('<cI')    # b'A', seq of the last applied frame
+# Subprotocol a viewer offers in the handshake to say it sends acks
+ACK_PROTOCOL = 'vs-ack'
+# How often a non-acking client's sender re-checks its socket send queue
+QUEUE_POLL_S = 0.005
+CLIENT_SNDBUF = 16 * 1024
+DEFAULT_HOST = '127.0.0.1'
+
+
+class DeltaEncoder:
+    """Quantised keyframe + changed-zone delta encoding of one frame stream"""
+
+    def __init__(self, shape, quant_mm=8, max_mm=2000, deadband=0,
+                 keyframe_interval=60, source=SOURCE_ZONES):
+        if max_mm / quant_mm >= INVALID_CODE:
+            raise ValueError(f"quant_mm={quant_mm} cannot cover {max_mm}mm in 254 steps")
+        self.rows, self.cols = shape
+        self.quant_mm = quant_mm
+        self.max_code = int(round(max_mm / quant_mm))
+        self.deadband = deadband
+        self.keyframe_interval = keyframe_interval
+        self.source = source
+        n = self.rows * self.cols
+        self.codes = np.full(n, INVALID_CODE, dtype=np.uint8)
+        self._new = np.zeros(n, dtype=np.uint8)
+        self.seq = 0
+
+    def _header(self, kind, frame_num, device_ts):
+        return HEADER.pack(MAGIC, VERSION, kind, self.rows, self.cols, self.quant_mm,
+                           self.source, self.seq, frame_num & SEQ_MASK, device_ts & SEQ_MASK)
+
+    def encode(self, distance, valid, frame_num=0, device_ts=0):
+        """
+        Advance the stream by one frame. Returns (seq, keyframe, delta);
+        delta is None on forced keyframes and when it would not be smaller.
+        """
+        scaled = np.rint(np.asarray(distance, dtype=np.float64).ravel() / self.quant_mm)
+        valid = np.asarray(valid, dtype=bool).ravel()
+        np.clip(scaled, 0, self.max_code, out=scaled, where=valid)
+        new = self._new
+        new[...] = np.where(valid, scaled, INVALID_CODE)
+
+        changed = new != self.codes
+        if self.deadband:
+            both_valid = (new != INVALID_CODE) & (self.codes != INVALID_CODE)
+            small = np.abs(new.astype(np.int16) - self.codes) <= self.deadband
+            changed &= ~(both_valid & small)
+        self.codes[changed] = new[changed]
+        self.seq = (self.seq + 1) & SEQ_MASK
+
+        key = self._header(KIND_KEY, frame_num, device_ts) + self.codes.tobytes()
+        delta = None
+        if self.seq % self.keyframe_interval:
+            payload = np.packbits(changed).tobytes() + self.codes[changed].tobytes()
+            if len(payload) < self.codes.size:
+                delta = self._header(KIND_DELTA, frame_num, device_ts) + payload
+        return self.seq, key, delta
+
+
+class DeltaDecoder:
+    """Client side: rebuilds the frame from keyframes and deltas"""
+
+    def __init__(self):
+        self.codes = None
+        self.seq = None
+        self.quant_mm = 1
+        self.shape = None
+        self.resyncs = 0       # deltas ignored while waiting for a keyframe
+
+    def apply(self, message):
+        """Apply one message; returns (kind, seq, frame_num, device_ts) or None if skipped"""
+        magic, version, kind, rows, cols, quant_mm, source, seq, frame_num, device_ts = \
+            HEADER.unpack_from(message)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"Not a frame stream message: {bytes(message[:4])!r}")
+        payload = memoryview(message)[HEADER.size:]
+        n = rows * cols
+
+        if kind == KIND_KEY:
+            self.codes = np.frombuffer(payload, dtype=np.uint8, count=n).copy()
+        elif self.codes is None or self.codes.size != n or seq != (self.seq + 1) & SEQ_MASK:
+            self.resyncs += 1
+            return None
+        else:
+            bitmap_bytes = (n + 7) // 8
+            changed = np.unpackbits(np.frombuffer(payload, dtype=np.uint8, count=bitmap_bytes),
+                                    count=n).astype(bool)
+            self.codes[changed] = np.frombuffer(payload, dtype=np.uint8, offset=bitmap_bytes,
+                                                count=int(changed.sum()))
+        self.seq = seq
+        self.quant_mm = quant_mm
+        self.shape = (rows, cols)
+        return kind, seq, frame_num, device_ts
+
+    @property
+    def valid(self):
+        return (self.codes != INVALID_CODE).reshape(self.shape)
+
+    def distances(self):
+        """Reconstructed distances in mm (NaN = invalid)"""
+        mm = np.where(self.codes == INVALID_CODE, np.nan, self.codes * float(self.quant_mm))
+        return mm.reshape(self.shape)
+
+
+# ----- WebSocket framing (RFC 6455, the subset needed here) -----
+
+def ws_accept_key(key):
+    return base64.b64encode(hashlib.sha1(key.strip().encode() + WS_GUID).digest()).decode()
+
+
+def ws_frame(payload, opcode=0x2, mask=False):
+    """One unfragmented frame; clients must mask what they send"""
+    n = len(payload)
+    head = bytes([0x80 | opcode])
+    mask_bit = 0x80 if mask else 0
+    if n < 126:
+        head += bytes([mask_bit | n])
+    elif n < 1 << 16:
+        head += bytes([mask_bit | 126]) + struct.pack('>H', n)
+    else:
+        head += bytes([mask_bit | 127]) + struct.pack('>Q', n)
+    if not mask:
+        return head + payload
+    key = os.urandom(4)
+    masked = (np.frombuffer(payload, dtype=np.uint8) ^
+              np.resize(np.frombuffer(key, dtype=np.uint8), n)).tobytes()
+    return head + key + masked
+
+
+def _recv_exact(sock, n):
+    buf = bytearray()
+    while len(buf) < n:
+        chunk = sock.recv(n - len(buf))
+        if not chunk:
+            raise ConnectionError("connection closed")
+        buf += chunk
+    return bytes(buf)
+
+
+def ws_read(sock):
+    """Read one frame -> (opcode, payload); unmasks client frames"""
+    b0, b1 = _recv_exact(sock, 2)
+    n = b1 & 0x7F
+    if n == 126:
+        n = struct.unpack('>H', _recv_exact(sock, 2))[0]
+    elif n == 127:
+        n = struct.unpack('>Q', _recv_exact(sock, 8))[0]
+    key = _recv_exact(sock, 4) if b1 & 0x80 else None
+    payload = _recv_exact(sock, n)
+    if key:
+        payload = (np.frombuffer(payload, dtype=np.uint8) ^
+                   np.resize(np.frombuffer(key, dtype=np.uint8), n)).tobytes()
+    return b0 & 0x0F, payload
+
+
+def _read_http_head(sock):
+    data = b''
+    while b'\r\n\r\n' not in data:
+        chunk = sock.recv(1024)
+        if not chunk or len(data) > MAX_HANDSHAKE:
+            raise ConnectionError("bad handshake")
+        data += chunk
+    lines = data.split(b'\r\n\r\n', 1)[0].decode('latin-1').split('\r\n')
+    headers = {}
+    for line in lines[1:]:
+        name, _, value = line.partition(':')
+        headers[name.strip().lower()] = value.strip()
+    return lines[0], headers
+
+
+# ----- server -----
+
+class ClientSession:
+    """One connected viewer: latest-only slot, sender + reader threads"""
+
+    def __init__(self, server, sock, address, acks=False):
+        self.server = server
+        self.sock = sock
+        self.address = f"{address[0]}:{address[1]}"
+        self.acks = acks
+        self.connected_at = time.time()
+
+        self._cond = threading.Condition()
+        self._slot = None
+        self._send_lock = threading.Lock()
+        self.closed = False
+        self.last_seq = None
+        self.force_key = False
+        self._unacked = collections.deque(maxlen=64)   # seqs sent, oldest first
+        self._last_send = 0.0
+        self._last_size = 0
+
+        self.frames_sent = 0
+        self.keyframes = 0
+        self.dropped = 0
+        self.bytes_sent = 0
+        self.bandwidth = EventRate()
+
+    def start(self):
+        threading.Thread(target=self._send_loop, name=f'stream-tx {self.address}', daemon=True).start()
+        threading.Thread(target=self._read_loop, name=f'stream-rx {self.address}', daemon=True).start()
+
+    def offer(self, message):
+        """Called by publish(): replace the slot, never block"""
+        with self._cond:
+            if self._slot is not None:
+                self.dropped += 1
+            self._slot = message
+            self._cond.notify()
+
+    def close(self):
+        with self._cond:
+            if self.closed:
+                return
+            self.closed = True
+            self._cond.notify()
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+        self.server._remove(self)
+
+    def _send(self, payload, opcode=0x2):
+        with self._send_lock:
+            self.sock.sendall(ws_frame(payload, opcode))
+
+    def _queued_bytes(self):
+        """Bytes in the socket send queue not yet acked by the peer (0 where unsupported)"""
+        if fcntl is None:
+            return 0
+        try:
+            return int.from_bytes(fcntl.ioctl(self.sock.fileno(), termios.TIOCOUTQ, b'\0' * 4),
+                                  sys.byteorder, signed=True)
+        except OSError:
+            return 0
+
+    def _ready(self):
+        """Under _cond: a frame is waiting and the viewer has room for it"""
+        if self._slot is None:
+            return False
+        if not self.acks:
+            # No app-level acks: keep at most max_unacked frames in flight on TCP
+            return self._queued_bytes() < self.server.max_unacked * max(self._last_size, 1)
+        return (len(self._unacked) < self.server.max_unacked
+                or time.monotonic() - self._last_send >= ACK_TIMEOUT_S)
+
+    def _acked(self, seq):
+        with self._cond:
+            if seq in self._unacked:
+                while self._unacked.popleft() != seq:
+                    pass
+                self._cond.notify()
+
+    def _send_loop(self):
+        try:
+            while True:
+                with self._cond:
+                    # publish() keeps replacing the slot while we wait for acks
+                    while not self.closed and not self._ready():
+                        if self._slot is None:
+                            timeout = None
+                        else:
+                            timeout = ACK_TIMEOUT_S if self.acks else QUEUE_POLL_S
+                        self._cond.wait(timeout)
+                    if self.closed:
+                        return
+                    seq, key, delta = self._slot
+                    self._slot = None
+                    if self.acks:
+                        self._unacked.append(seq)
+                    self._last_send = time.monotonic()
+                # A delta is only usable on top of exactly the previous frame
+                in_chain = self.last_seq is not None and seq == (self.last_seq + 1) & SEQ_MASK
+                message = delta if delta is not None and in_chain and not self.force_key else key
+                self._send(message)
+                self.force_key = False
+                self.last_seq = seq
+                self._last_size = len(message)
+                self.frames_sent += 1
+                self.keyframes += message is key
+                self.bytes_sent += len(message)
+                self.bandwidth.add(len(message))
+        except OSError:
+            pass
+        finally:
+            self.close()
+
+    def _read_loop(self):
+        """Acks, pings and closes; b'K' from the viewer requests a keyframe"""
+        try:
+            while not self.closed:
+                opcode, payload = ws_read(self.sock)
+                if opcode == 0x8:
+                    self._send(payload[:2], 0x8)
+                    break
+                if opcode == 0x9:
+                    self._send(payload, 0xA)
+                elif len(payload) == ACK.size and payload[:1] == b'A':
+                    self._acked(ACK.unpack(payload)[1])
+                elif payload == b'K':
+                    self.force_key = True
+        except (OSError, ConnectionError):
+            pass
+        finally:
+            self.close()
+
+    def stats(self, now=None):
+        age = max((time.time() if now is None else now) - self.connected_at, 1e-9)
+        return {
+            'address': self.address,
+            'frames_sent': self.frames_sent,
+            'keyframes': self.keyframes,
+            'dropped': self.dropped,
+            'bytes_sent': self.bytes_sent,
+            'bytes_per_s': self.bandwidth.per_second(now),
+            'avg_bytes_per_s': self.bytes_sent / age,
+        }
+
+
+class StreamServer:
+    """WebSocket fan-out of one encoded frame stream"""
+
+    def __init__(self, shape, port=8765, host=DEFAULT_HOST, registry=None,
+                 source=SOURCE_ZONES, max_unacked=MAX_UNACKED_FRAMES, **encoder_options):
+        self.encoder = DeltaEncoder(shape, source=source, **encoder_options)
+        self.max_unacked = max_unacked
+        self.clients = []
+        self._clients_lock = threading.Lock()
+        self.frames_published = 0
+        self.bytes_encoded = 0
+
+        registry = registry or MetricsRegistry('vl53_')
+        self.timing = registry.stages('stream_seconds', ('encode', 'fanout'),
+                                      'Frame stream publish cost (s)')
+        registry.gauge('stream_clients', lambda: len(self.clients), 'Connected stream viewers')
+
+        self._listen = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._listen.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._listen.bind((host, port))
+        self._listen.listen(16)
+        self.address = self._listen.getsockname()
+        self._running = False
+
+    def start(self):
+        self._running = True
+        threading.Thread(target=self._accept_loop, name='stream-accept', daemon=True).start()
+        print(f"✓ Streaming on ws://{self.address[0]}:{self.address[1]}/")
+        return self
+
+    def stop(self):
+        self._running = False
+        try:
+            self._listen.close()
+        except OSError:
+            pass
+        for client in list(self.clients):
+            client.close()
+
+    # ----- publishing -----
+
+    def publish(self, distance, valid, frame_num=0, device_ts=0):
+        """Encode once and offer to every client; O(clients) slot swaps, never blocks"""
+        t0 = time.perf_counter()
+        message = self.encoder.encode(distance, valid, frame_num, device_ts)
+        t1 = time.perf_counter()
+        for client in self.clients:
+            client.offer(message)
+        self.timing['fanout'].observe(time.perf_counter() - t1)
+        self.timing['encode'].observe(t1 - t0)
+        self.frames_published += 1
+        self.bytes_encoded += len(message[1]) + len(message[2] or b'')
+        return message[0]
+
+    def listener(self):
+        """IngestThread listener publishing every mapper frame"""
+        def callback(mapper):
+            self.publish(mapper.distance_map, mapper.valid_mask,
+                         mapper.frame_num, mapper.device_timestamp)
+        return callback
+
+    # ----- connections -----
+
+    def _accept_loop(self):
+        while self._running:
+            try:
+                sock, address = self._listen.accept()
+            except OSError:
+                break
+            threading.Thread(target=self._handshake, args=(sock, address),
+                             name='stream-handshake', daemon=True).start()
+
+    def _handshake(self, sock, address):
+        try:
+            sock.settimeout(2.0)
+            request, headers = _read_http_head(sock)
+            key = headers.get('sec-websocket-key')
+            if not request.startswith('GET ') or 'websocket' not in headers.get('upgrade', '').lower() or not key:
+                sock.sendall(b'HTTP/1.1 426 Upgrade Required\r\nContent-Length: 0\r\n\r\n')
+                sock.close()
+                return
+            offered = [p.strip() for p in headers.get('sec-websocket-protocol', '').split(',')]
+            acks = ACK_PROTOCOL in offered
+            sock.sendall(('HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\n'
+                          'Connection: Upgrade\r\n'
+                          + (f'Sec-WebSocket-Protocol: {ACK_PROTOCOL}\r\n' if acks else '')
+                          + f'Sec-WebSocket-Accept: {ws_accept_key(key)}\r\n\r\n').encode())
+            sock.settimeout(None)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, CLIENT_SNDBUF)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        except (OSError, ConnectionError):
+            sock.close()
+            return
+        client = ClientSession(self, sock, address, acks)
+        with self._clients_lock:
+            # Copy-on-write: publish() iterates without taking the lock
+            self.clients = self.clients + [client]
+        client.start()
+        print(f"✓ Stream client connected: {client.address} ({len(self.clients)} total)")
+
+    def _remove(self, client):
+        with self._clients_lock:
+            if client in self.clients:
+                self.clients = [c for c in self.clients if c is not client]
+                print(f"✓ Stream client left: {client.address} "
+                      f"({client.frames_sent} sent, {client.dropped} dropped)")
+
+    # ----- reporting -----
+
+    def stats(self, now=None):
+        encode, fanout = self.timing['encode'], self.timing['fanout']
+        return {
+            'frames_published': self.frames_published,
+            'clients': [client.stats(now) for client in self.clients],
+            'encode_us': 1e6 * encode.mean,
+            'fanout_us': 1e6 * fanout.mean,
+            'bytes_per_frame': self.bytes_encoded / max(self.frames_published, 1),
+        }
+
+    def summary(self, now=None):
+        s = self.stats(now)
+        lines = [f"{s['frames_published']} frames | encode {s['encode_us']:.0f}us | "
+                 f"fan-out {s['fanout_us']:.1f}us to {len(s['clients'])} clients"]
+        for c in s['clients']:
+            lines.append(f"    {c['address']:<21} {c['bytes_per_s'] / 1024:6.1f} KiB/s | "
+                         f"sent {c['frames_sent']} (key {c['keyframes']}) | dropped {c['dropped']}")
+        return '\n'.join(lines)
+
+
+# ----- loopback / remote test client -----
+
+class StreamClient:
+    """Minimal WebSocket viewer: decodes, acks each applied frame (acks=True), counts what it got"""
+
+    def __init__(self, host, port, delay_s=0.0, rcvbuf=None, acks=True):
+        self.sock = socket.create_connection((host, port), timeout=5.0)
+        if rcvbuf:
+            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, rcvbuf)
+        key = base64.b64encode(os.urandom(16)).decode()
+        self.sock.sendall((f'GET / HTTP/1.1\r\nHost: {host}:{port}\r\nUpgrade: websocket\r\n'
+                           'Connection: Upgrade\r\n'
+                           + (f'Sec-WebSocket-Protocol: {ACK_PROTOCOL}\r\n' if acks else '')
+                           + f'Sec-WebSocket-Key: {key}\r\nSec-WebSocket-Version: 13\r\n\r\n').encode())
+        status, headers = _read_http_head(self.sock)
+        if ' 101 ' not in status or headers.get('sec-websocket-accept') != ws_accept_key(key):
+            raise ConnectionError(f"handshake refused: {status}")
+        self.sock.settimeout(None)
+        self.acks = headers.get('sec-websocket-protocol') == ACK_PROTOCOL
+
+        self.delay_s = delay_s
+        self.decoder = DeltaDecoder()
+        self.frames = 0
+        self.keyframes = 0
+        self.bytes = 0
+        self.seq_gaps = 0
+        self.last_frame = None
+        self._stop = False
+        self._thread = threading.Thread(target=self._run, name='stream-client', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _run(self):
+        try:
+            while not self._stop:
+                opcode, payload = ws_read(self.sock)
+                if opcode == 0x8:
+                    break
+                if opcode != 0x2:
+                    continue
+                previous = self.decoder.seq
+                result = self.decoder.apply(payload)
+                if result is None:
+                    # Out-of-chain delta: ask for a keyframe
+                    self.sock.sendall(ws_frame(b'K', mask=True))
+                    self._ack(HEADER.unpack_from(payload)[7])
+                    continue
+                kind, seq = result[0], result[1]
+                self.frames += 1
+                self.keyframes += kind == KIND_KEY
+                self.bytes += len(payload)
+                if previous is not None and seq != (previous + 1) & SEQ_MASK:
+                    self.seq_gaps += 1
+                self.last_frame = result
+                if self.delay_s:
+                    time.sleep(self.delay_s)
+                self._ack(seq)
+        except (OSError, ConnectionError):
+            pass
+
+    def _ack(self, seq):
+        if self.acks:
+            self.sock.sendall(ws_frame(ACK.pack(b'A', seq), mask=True))
+
+    def close(self):
+        self._stop = True
+        try:
+            self.sock.sendall(ws_frame(b'\x03\xe8', 0x8, mask=True))
+            self.sock.close()
+        except OSError:
+            pass
+
+
+def selftest(grid_size=8, rate=60.0, duration=3.0, clients=4, quant_mm=8, slow_ms=100.0):
+    """
+    Synthetic frames -> server -> loopback clients, one of them a plain
+    viewer that never acks and the last one taking slow_ms per frame.
+    Passes when fast viewers decode every frame exactly, the plain one
+    keeps up, and the slow one drops frames yet stays within a bounded lag.
+    """
+    from virtual_serial import SyntheticFrameGenerator
+
+    gen = SyntheticFrameGenerator(grid_size, rate)
+    server = StreamServer((grid_size, grid_size), port=0, host='127.0.0.1',
+                          quant_mm=quant_mm).start()
+    host, port = server.address
+    viewers = [StreamClient(host, port).start() for _ in range(clients - 2)]
+    # A browser-style viewer without the ack subprotocol
+    plain = StreamClient(host, port, acks=False).start()
+    viewers.append(plain)
+    # A viewer that needs longer per frame than the frame period
+    slow = StreamClient(host, port, delay_s=slow_ms / 1000.0).start()
+    viewers.append(slow)
+    time.sleep(0.2)
+    # At most max_unacked frames in flight, each taking slow_ms to apply
+    max_lag = (server.max_unacked + 1) * math.ceil(slow_ms * rate / 1000.0) + 2
+    worst_lag = 0
+
+    mismatches = 0
+    start = time.perf_counter()
+    for i in range(int(duration * rate)):
+        dist = gen.frame(i)
+        valid = dist > 0
+        server.publish(dist, valid, i, gen.timestamp_ms(i))
+        # Every in-sync fast viewer must hold exactly the quantised frame
+        time.sleep(max(0.0, start + (i + 1) / rate - time.perf_counter()))
+        decoder = viewers[0].decoder
+        if decoder.codes is not None and decoder.seq == server.encoder.seq:
+            expected = np.where(valid, np.clip(np.rint(dist / quant_mm), 0, server.encoder.max_code) * quant_mm, np.nan)
+            if not np.array_equal(decoder.distances(), expected, equal_nan=True):
+                mismatches += 1
+        if slow.decoder.seq is not None and i > rate:
+            worst_lag = max(worst_lag, (server.encoder.seq - slow.decoder.seq) & SEQ_MASK)
+
+    time.sleep(0.2)
+    print(f"\nStream selftest ({grid_size}x{grid_size} @ {rate:.0f}Hz, {duration:.0f}s, {clients} clients)")
+    print("  Server: " + server.summary())
+    for n, viewer in enumerate(viewers):
+        label = 'slow' if viewer.delay_s else 'fast' if viewer.acks else 'plain'
+        print(f"  Client {n} ({label}): {viewer.frames} frames, {viewer.keyframes} keyframes, "
+              f"{viewer.bytes / max(viewer.frames, 1):.0f} B/frame, gaps {viewer.seq_gaps}, "
+              f"resyncs {viewer.decoder.resyncs}")
+    key_bytes = HEADER.size + grid_size * grid_size
+    print(f"  Keyframe {key_bytes} B vs raw binary frame {12 + 2 * grid_size ** 2 + 4} B")
+    print(f"{'✓' if mismatches == 0 else '✗'} Decoded frames matching source: "
+          f"{'all' if mismatches == 0 else f'{mismatches} mismatches'}")
+    slow_address = '%s:%d' % slow.sock.getsockname()[:2]
+    slow_dropped = sum(c['dropped'] for c in server.stats()['clients'] if c['address'] == slow_address)
+    lag_ok = slow_dropped > 0 and worst_lag <= max_lag
+    print(f"{'✓' if lag_ok else '✗'} Slow client ({slow_ms:.0f}ms/frame): dropped {slow_dropped}, "
+          f"worst lag {worst_lag} frames (limit {max_lag})")
+    plain_ok = plain.frames >= 0.9 * server.frames_published
+    print(f"{'✓' if plain_ok else '✗'} Non-acking client: {plain.frames}/{server.frames_published} frames")
+
+    for viewer in viewers:
+        viewer.close()
+    server.stop()
+    return mismatches == 0 and lag_ok and plain_ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Frame stream selftest / remote viewer')
+    parser.add_argument('--selftest', action='store_true', help='Loopback server + clients on synthetic frames')
+    parser.add_argument('--connect', type=str, help='host:port of a running stream to watch')
+    parser.add_argument('--grid', type=int, default=8, choices=[4, 8])
+    parser.add_argument('--clients', type=int, default=4, help='Selftest viewers (at least 3)')
+    parser.add_argument('--duration', type=float, default=3.0)
+    parser.add_argument('--slow-ms', type=float, default=100.0,
+                        help='Per-frame processing time of the selftest slow client')
+    args = parser.parse_args()
+
+    if args.connect:
+        host, _, port = args.connect.rpartition(':')
+        client = StreamClient(host, int(port)).start()
+        print(f"✓ Connected to ws://{host}:{port}/")
+        try:
+            while True:
+                time.sleep(1.0)
+                print(f"Frames: {client.frames:6d} | keyframes: {client.keyframes} | "
+                      f"{client.bytes / 1024:.1f} KiB | gaps {client.seq_gaps}")
+        except KeyboardInterrupt:
+            client.close()
+        return
+
+    if not selftest(args.grid, duration=args.duration, clients=args.clients, slow_ms=args.slow_ms):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+"""
+Background serial ingest for the VL53L7CX mapper
+
+IngestThread drains the port continuously and copies every decoded frame
+into a FrameRing. The renderer only ever takes the newest complete frame,
+so a slow redraw costs skipped renders instead of stale distance data.
+Per-frame listeners (safety logic, recorders) run on the ingest thread
+and therefore never wait on the UI.
+"""
+
+import threading
+
+import numpy as np
+
+
+class FrameRing:
+    """Fixed-size ring of preallocated frames with latest-frame pickup"""
+
+    def __init__(self, grid_size, capacity=16):
+        self.grid_size = grid_size
+        self.capacity = capacity
+
+        self.distance = np.zeros((capacity, grid_size, grid_size), dtype=np.int16)
+        self.valid = np.zeros((capacity, grid_size, grid_size), dtype=bool)
+        self.frame_num = np.zeros(capacity, dtype=np.int64)
+        self.device_ts = np.zeros(capacity, dtype=np.int64)
+        self.host_ts = np.zeros(capacity, dtype=np.float64)
+
+        # seq = total frames written; slot of frame k is k % capacity
+        self.seq = 0
+        self._lock = threading.Lock()
+
+        # Consumer counters
+        self._last_taken = 0
+        self.frames_rendered = 0
+        self.frames_skipped = 0
+
+    @property
+    def frames_ingested(self):
+        return self.seq
+
+    def push(self, distance_map, valid_mask, frame_num, device_ts, host_ts):
+        """Copy one frame into the next slot (overwrites the oldest)"""
+        slot = self.seq % self.capacity
+        with self._lock:
+            self.distance[slot] = distance_map
+            self.valid[slot] = valid_mask
+            self.frame_num[slot] = frame_num
+            self.device_ts[slot] = device_ts
+            self.host_ts[slot] = host_ts
+            self.seq += 1
+        return self.seq
+
+    def take_latest(self, distance_out, valid_out):
+        """
+        Copy the newest frame into the given arrays if it has not been
+        taken yet. Returns (frame_num, device_ts, host_ts) or None.
+        """
+        with self._lock:
+            seq = self.seq
+            if seq == self._last_taken:
+                return None
+            slot = (seq - 1) % self.capacity
+            np.copyto(distance_out, self.distance[slot])
+            np.copyto(valid_out, self.valid[slot])
+            meta = (int(self.frame_num[slot]), int(self.device_ts[slot]),
+                    float(self.host_ts[slot]))
+
+        self.frames_skipped += seq - self._last_taken - 1
+        self.frames_rendered += 1
+        self._last_taken = seq
+        return meta
+
+    def stats(self):
+        return {
+            'ingested': self.frames_ingested,
+            'rendered': self.frames_rendered,
+            'skipped': self.frames_skipped,
+        }
+
+
+class IngestThread(threading.Thread):
+    """Reads frames from a LowLatencyMapper as fast as the port delivers them"""
+
+    def __init__(self, mapper, ring, poll_timeout=0.005):
+        super().__init__(name='vl53l7cx-ingest', daemon=True)
+        self.mapper = mapper
+        self.ring = ring
+        self.poll_timeout = poll_timeout
+        self.listeners = []
+        self._stop_event = threading.Event()
+
+    def add_listener(self, callback):
+        """callback(mapper) runs on the ingest thread after every frame"""
+        self.listeners.append(callback)
+
+    def stop(self, timeout=1.0):
+        self._stop_event.set()
+        if self.is_alive():
+            self.join(timeout)
+
+    def run(self):
+        mapper = self.mapper
+        while not self._stop_event.is_set():
+            before = mapper.frame_count
+            mapper.read_frame_fast()
+
+            if mapper.frame_count == before:
+                # Nothing complete buffered - sleep until the port has bytes
+                mapper.wait_for_data(self.poll_timeout)
+                continue
+
+            self.ring.push(mapper.distance_map, mapper.valid_mask,
+                           mapper.frame_num, mapper.device_timestamp,
+                           mapper.last_frame_time)
+            for callback in self.listeners:
+                try:
+                    callback(mapper)
+                except Exception as e:
+                    print(f"Ingest listener error: {e}")
@@ -0,0 +1,273 @@
+"""
+Hot-path instrumentation: counters, fixed-bucket histograms, /metrics
+
+Stage timers are plain perf_counter() deltas fed into histograms with
+fixed bucket bounds, so recording is one bisect and two adds - no
+allocation, no locks. Pipelines hold the registry in an optional
+attribute (mapper.metrics, like mapper.link) and skip timing entirely
+while it is None, which keeps the cost of disabled instrumentation to one
+attribute check per stage.
+
+MetricsServer exposes the registry in Prometheus text format on a local
+port; ConsoleReporter prints a per-stage summary every few seconds.
+Readers on those threads may see a histogram mid-update (count one ahead
+of a bucket) - fine for monitoring, not for accounting.
+
+Usage:
+    python vl53l7cx_mapper.py --port /dev/ttyUSB0 --headless --metrics
+    python vl53l7cx_mapper.py --port /dev/ttyUSB0 --metrics-port 9108
+    curl -s localhost:9108/metrics
+
+    python instrumentation.py        # overhead check, enabled vs disabled
+"""
+
+import argparse
+import bisect
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Stage latencies span ~10us (decode) to ~100ms (a matplotlib redraw)
+STAGE_BUCKETS_S = (1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4,
+                   1e-3, 2.5e-3, 5e-3, 1e-2, 2.5e-2, 5e-2, 0.1, 0.25, 1.0)
+
+
+def _label_text(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{k}="{v}"' for k, v in labels.items()) + '}'
+
+
+class Counter:
+    """Monotonic count"""
+    kind = 'counter'
+
+    __slots__ = ('name', 'labels', 'value')
+
+    def __init__(self, name, labels=None):
+        self.name = name
+        self.labels = labels or {}
+        self.value = 0
+
+    def inc(self, n=1):
+        self.value += n
+
+    def samples(self):
+        yield self.name, self.labels, self.value
+
+
+class Gauge:
+    """Value read from a callable when the registry is scraped"""
+    kind = 'gauge'
+
+    __slots__ = ('name', 'labels', 'fn')
+
+    def __init__(self, name, fn, labels=None):
+        self.name = name
+        self.labels = labels or {}
+        self.fn = fn
+
+    def samples(self):
+        yield self.name, self.labels, float(self.fn())
+
+
+class Histogram:
+    """Fixed upper-bound buckets (the last one is +Inf), plus sum and count"""
+    kind = 'histogram'
+
+    __slots__ = ('name', 'labels', 'bounds', 'counts', 'sum', 'count')
+
+    def __init__(self, name, bounds=STAGE_BUCKETS_S, labels=None):
+        self.name = name
+        self.labels = labels or {}
+        self.bounds = list(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-quantile (inf past the last)"""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        running = 0
+        for bound, n in zip(self.bounds, self.counts):
+            running += n
+            if running >= target:
+                return bound
+        return float('inf')
+
+    @property
+    def mean(self):
+        return self.sum / self.count if self.count else 0.0
+
+    def samples(self):
+        running = 0
+        for bound, n in zip(self.bounds, self.counts):
+            running += n
+            yield f'{self.name}_bucket', dict(self.labels, le=f'{bound:g}'), running
+        yield f'{self.name}_bucket', dict(self.labels, le='+Inf'), running + self.counts[-1]
+        yield f'{self.name}_sum', self.labels, self.sum
+        yield f'{self.name}_count', self.labels, self.count
+
+
+class MetricsRegistry:
+    """Named metrics, created once up front and updated in place"""
+
+    def __init__(self, prefix=''):
+        self.prefix = prefix
+        self._metrics = []
+        self._help = {}
+        self.started = time.time()
+
+    def _add(self, metric, help_text):
+        self._metrics.append(metric)
+        self._help.setdefault(metric.name, (metric.kind, help_text))
+        return metric
+
+    def counter(self, name, help_text='', **labels):
+        return self._add(Counter(self.prefix + name, labels), help_text)
+
+    def gauge(self, name, fn, help_text='', **labels):
+        return self._add(Gauge(self.prefix + name, fn, labels), help_text)
+
+    def histogram(self, name, help_text='', bounds=STAGE_BUCKETS_S, **labels):
+        return self._add(Histogram(self.prefix + name, bounds, labels), help_text)
+
+    def stages(self, name, stage_names, help_text='Pipeline stage duration (s)'):
+        """One histogram per stage under a shared name, returned as a dict"""
+        return {stage: self.histogram(name, help_text, stage=stage) for stage in stage_names}
+
+    def render_prometheus(self):
+        lines = []
+        emitted = set()
+        for metric in self._metrics:
+            if metric.name not in emitted:
+                emitted.add(metric.name)
+                kind, help_text = self._help[metric.name]
+                if help_text:
+                    lines.append(f'# HELP {metric.name} {help_text}')
+                lines.append(f'# TYPE {metric.name} {kind}')
+            for name, labels, value in metric.samples():
+                lines.append(f'{name}{_label_text(labels)} {value:g}'
+                             if isinstance(value, float) else f'{name}{_label_text(labels)} {value}')
+        return '\n'.join(lines) + '\n'
+
+    def summary(self):
+        """Console table: one line per histogram, then counters and gauges"""
+        lines = []
+        for metric in self._metrics:
+            label = ','.join(str(v) for v in metric.labels.values()) or metric.name
+            if isinstance(metric, Histogram):
+                if metric.count:
+                    lines.append(f"  {label:<12} n={metric.count:<8d} mean {1e3 * metric.mean:7.3f}ms | "
+                                 f"p50 <{1e3 * metric.quantile(0.5):g}ms | "
+                                 f"p99 <{1e3 * metric.quantile(0.99):g}ms | "
+                                 f"total {metric.sum:6.2f}s")
+            elif isinstance(metric, Counter):
+                lines.append(f"  {metric.name:<28} {metric.value}")
+            else:
+                lines.append(f"  {metric.name:<28} {metric.fn():.4g}")
+        return '\n'.join(lines)
+
+
+class MetricsServer:
+    """Serves GET /metrics in Prometheus text format from a daemon thread"""
+
+    def __init__(self, registry, port=9108, host='127.0.0.1'):
+        self.registry = registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(handler):
+                if handler.path.split('?')[0] not in ('/metrics', '/'):
+                    handler.send_error(404)
+                    return
+                body = registry.render_prometheus().encode()
+                handler.send_response(200)
+                handler.send_header('Content-Type', 'text/plain; version=0.0.4')
+                handler.send_header('Content-Length', str(len(body)))
+                handler.end_headers()
+                handler.wfile.write(body)
+
+            def log_message(handler, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.address = self.httpd.server_address
+        self._thread = threading.Thread(target=self.httpd.serve_forever,
+                                        name='metrics-http', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        print(f"✓ Metrics: http://{self.address[0]}:{self.address[1]}/metrics")
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class ConsoleReporter(threading.Thread):
+    """Prints registry.summary() every `interval` seconds"""
+
+    def __init__(self, registry, interval=5.0):
+        super().__init__(name='metrics-console', daemon=True)
+        self.registry = registry
+        self.interval = interval
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            print(f"Stage timings ({time.time() - self.registry.started:.0f}s):")
+            print(self.registry.summary())
+
+    def stop(self):
+        self._stop_event.set()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Instrumentation overhead check')
+    parser.add_argument('--iterations', type=int, default=200000)
+    parser.add_argument('--port', type=int, help='Also serve the test registry on this port')
+    args = parser.parse_args()
+
+    registry = MetricsRegistry('vl53_')
+    stage = registry.histogram('stage_seconds', 'Stage duration (s)', stage='work')
+    frames = registry.counter('frames_total', 'Frames processed')
+    clock = time.perf_counter
+
+    def loop(metrics):
+        for _ in range(args.iterations):
+            if metrics is not None:
+                t0 = clock()
+            if metrics is not None:
+                stage.observe(clock() - t0)
+                frames.inc()
+
+    results = {}
+    for label, metrics in (('disabled', None), ('enabled', registry)):
+        start = clock()
+        loop(metrics)
+        results[label] = 1e9 * (clock() - start) / args.iterations
+
+    print(f"✓ Per-stage cost: disabled {results['disabled']:.0f}ns | "
+          f"enabled {results['enabled']:.0f}ns")
+    print(registry.summary())
+
+    if args.port:
+        server = MetricsServer(registry, args.port).start()
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            server.stop()
+
+
+if __name__ == '__main__':
+    main()
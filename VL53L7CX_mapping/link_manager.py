@@ -0,0 +1,443 @@
+"""
+Serial link health and automatic reconnect for the VL53L7CX mapper
+
+The firmware numbers every frame, so the host can tell exactly what the
+link lost. SequenceTracker classifies each frame number as in order, after
+a gap, a duplicate, late (a frame a gap counted lost, arriving after all),
+stale (any other backwards frame) or a counter reset (firmware reboot,
+seen as the device clock running backwards). LinkManager attaches to a
+LowLatencyMapper (mapper.link), turns decoder CRC/parse failures and read exceptions into per-second rates, and
+reopens the port with bounded exponential backoff when it vanishes or the
+stream stalls. Everything is plain integer counters, cheap enough to update
+on every frame.
+
+Usage:
+    python vl53l7cx_mapper.py --port /dev/ttyUSB0 --headless    # link stats in the report
+    python link_manager.py --port /dev/ttyUSB0                  # link health only
+"""
+
+import argparse
+import time
+
+import serial
+
+# Binary headers carry frame_num as uint32
+SEQ_MODULO = 1 << 32
+# Frames further back than this are no longer tracked individually
+REORDER_WINDOW = 64
+# Device timestamps are millis() as uint32
+CLOCK_MODULO = 1 << 32
+
+
+class SequenceTracker:
+    """
+    Gap / duplicate / reorder accounting over frame numbers.
+
+    When observe() also gets the frame's device timestamp, a clock that runs
+    backwards marks a firmware reboot (as in ClockSync), unless the frame is
+    a duplicate carrying the same timestamp or a late frame that fits between its
+    neighbours. A far jump in frame number without that evidence is only
+    taken as a restarted counter once the next frame continues from it; a
+    lone straggler stays stale and does not move the sequence.
+    """
+
+    def __init__(self, reorder_window=REORDER_WINDOW, modulo=SEQ_MODULO):
+        self.reorder_window = reorder_window
+        self.modulo = modulo
+        self.reset()
+
+    def reset(self):
+        self.last = None
+        self._seen = 0        # bit i set = frame (last - i) was received
+        self._missing = 0     # bit i set = frame (last - i) was counted lost
+        self._stamps = [None] * self.reorder_window  # device ms by frame_num % window
+        self._clock = None    # unwrapped device ms of frame `last`
+        self._wrap = 0
+        self._pending = None  # (frame_num, device_ms) of an unconfirmed far jump
+        self.received = 0
+        self.lost = 0
+        self.gaps = 0
+        self.duplicates = 0
+        self.out_of_order = 0
+        self.stale = 0
+        self.resets = 0
+        self.largest_gap = 0
+
+    def _delta(self, frame_num, last=None):
+        delta = (frame_num - (self.last if last is None else last)) % self.modulo
+        return delta - self.modulo if delta >= self.modulo // 2 else delta
+
+    def _unwrap(self, device_ms):
+        value = device_ms + self._wrap
+        if value < self._clock - CLOCK_MODULO // 2:
+            value += CLOCK_MODULO
+        elif value > self._clock + CLOCK_MODULO // 2:
+            value -= CLOCK_MODULO
+        return value
+
+    def _restart(self, frame_num, device_ms):
+        """Start a new sequence at frame_num without counting anything lost"""
+        self.resets += 1
+        self.last = frame_num
+        self._seen = 1
+        self._missing = 0
+        self._stamps = [None] * self.reorder_window
+        self._stamps[frame_num % self.reorder_window] = device_ms
+        self._clock = device_ms
+        self._wrap = 0
+        self._pending = None
+        return 'reset'
+
+    def _same_boot(self, frame_num, delta, device_ms):
+        """
+        The device clock went backwards: True if frame_num can still be a
+        duplicate, late or far-back frame of the current boot, False for
+        a reboot.
+        """
+        window = self.reorder_window
+        if delta > 0:
+            return False
+        if delta <= -window:
+            # Untracked: left to the far-jump confirmation below
+            return True
+        stamps = self._stamps
+        bit = 1 << -delta
+        if self._seen & bit:
+            stamp = stamps[frame_num % window]
+            return stamp is None or stamp == device_ms
+        if self._missing & bit:
+            # A late frame was sampled between the frames either side of it
+            lo = next((stamps[(self.last - i) % window] for i in range(1 - delta, window)
+                       if self._seen >> i & 1), None)
+            hi = next((stamps[(self.last - i) % window] for i in range(-delta - 1, -1, -1)
+                       if self._seen >> i & 1), None)
+            if lo is None or hi is None:
+                return True
+            return lo <= device_ms <= hi
+        return False
+
+    def observe(self, frame_num, device_ms=None):
+        """Account one frame; returns 'ok', 'gap', 'duplicate', 'late', 'stale' or 'reset'"""
+        self.received += 1
+        if self.last is None:
+            self.last = frame_num
+            self._seen = 1
+            self._stamps[frame_num % self.reorder_window] = device_ms
+            self._clock = device_ms
+            return 'ok'
+
+        if self._pending is not None:
+            pending, pending_ms = self._pending
+            self._pending = None
+            if 0 < self._delta(frame_num, pending) <= self.reorder_window:
+                # The far jump was a restarted counter after all
+                self.stale -= 1
+                self._restart(pending, pending_ms)
+
+        delta = self._delta(frame_num)
+        window = self.reorder_window
+        mask = (1 << window) - 1
+
+        clock = None
+        if device_ms is not None:
+            if self._clock is None:
+                self._clock = device_ms
+            clock = self._unwrap(device_ms)
+            if clock < self._clock and not self._same_boot(frame_num, delta, device_ms):
+                return self._restart(frame_num, device_ms)
+
+        if delta > 0 and clock is not None:
+            self._clock = clock
+            self._wrap = clock - device_ms
+
+        if delta == 1:
+            self.last = frame_num
+            self._seen = ((self._seen << 1) | 1) & mask
+            self._missing = (self._missing << 1) & mask
+            self._stamps[frame_num % window] = device_ms
+            return 'ok'
+
+        if 1 < delta <= window * 1024:
+            missing = delta - 1
+            self.lost += missing
+            self.gaps += 1
+            self.largest_gap = max(self.largest_gap, missing)
+            self.last = frame_num
+            # Bits 1..delta-1 are the frames just counted lost
+            gap_bits = (1 << delta) - 2
+            self._seen = (((self._seen << delta) | 1) & mask) if delta < window else 1
+            self._missing = (((self._missing << delta) | gap_bits) & mask) if delta < window \
+                else gap_bits & mask
+            self._stamps[frame_num % window] = device_ms
+            return 'gap'
+
+        if -window < delta <= 0:
+            bit = 1 << -delta
+            if self._missing & bit:
+                # Counted as lost when the gap opened; it arrived after all
+                self._missing &= ~bit
+                self._seen |= bit
+                self._stamps[frame_num % window] = device_ms
+                self.lost -= 1
+                self.out_of_order += 1
+                return 'late'
+            if self._seen & bit:
+                self.duplicates += 1
+                return 'duplicate'
+            # Older than anything tracked (e.g. before the first frame seen):
+            # never counted lost, so there is nothing to credit back
+            self.stale += 1
+            return 'stale'
+
+        # Far jump either way: a restarted counter if the next frame follows
+        # on from it, otherwise a stray frame
+        self._pending = (frame_num, device_ms)
+        self.stale += 1
+        return 'stale'
+
+    @property
+    def expected(self):
+        """Frames the device sent over the observed span (received + lost - dups - stale)"""
+        return self.received - self.duplicates - self.stale + self.lost
+
+    @property
+    def loss_ratio(self):
+        expected = self.expected
+        return self.lost / expected if expected else 0.0
+
+
+class EventRate:
+    """Events per second over a sliding window of one-second buckets"""
+
+    def __init__(self, window_s=10):
+        self.window_s = window_s
+        self._counts = [0] * window_s
+        self._second = None
+        self.total = 0
+
+    def _advance(self, now):
+        second = int(now)
+        if self._second is None:
+            self._second = second
+            return
+        steps = min(second - self._second, self.window_s)
+        for i in range(1, steps + 1):
+            self._counts[(self._second + i) % self.window_s] = 0
+        self._second = max(second, self._second)
+
+    def add(self, n=1, now=None):
+        if n <= 0:
+            return
+        self._advance(time.time() if now is None else now)
+        self._counts[self._second % self.window_s] += n
+        self.total += n
+
+    def per_second(self, now=None):
+        """Mean rate over the completed seconds of the window"""
+        self._advance(time.time() if now is None else now)
+        current = self._second % self.window_s
+        return (sum(self._counts) - self._counts[current]) / (self.window_s - 1)
+
+
+class LinkManager:
+    """
+    Link health counters plus reconnect for one mapper.
+    The mapper calls on_frame() / on_error() from read_frame_fast and
+    poll() whenever its port is closed; nothing here blocks for long.
+    """
+
+    def __init__(self, mapper, backoff_initial_s=0.25, backoff_max_s=5.0, stall_timeout_s=3.0):
+        self.mapper = mapper
+        self.backoff_initial_s = backoff_initial_s
+        self.backoff_max_s = backoff_max_s
+        self.stall_timeout_s = stall_timeout_s
+
+        self.sequence = SequenceTracker()
+        self.crc_errors = EventRate()
+        self.parse_errors = EventRate()
+        self.read_errors = EventRate()
+
+        self.link_up = True
+        self.disconnects = 0
+        self.reconnects = 0
+        self.reconnect_attempts = 0
+        self.stalls = 0
+        self.last_error = None
+        self.down_since = None
+        self.downtime_s = 0.0
+
+        self._backoff = backoff_initial_s
+        self._next_attempt = 0.0
+        self._last_frame = time.time()
+        self._decoder_crc = 0
+        self._decoder_parse = 0
+        self._decoder_header = 0
+        self._closed = False
+
+    # ----- hooks called by the mapper -----
+
+    def on_frame(self, frame_num, now, device_ms=None):
+        self._last_frame = now
+        self.sequence.observe(frame_num, device_ms)
+        if self._backoff != self.backoff_initial_s:
+            self._backoff = self.backoff_initial_s
+        self._collect_decoder_errors(now)
+
+    def on_error(self, error, now=None):
+        """A read raised: a dead port takes the link down, anything else is a parse error"""
+        now = time.time() if now is None else now
+        self.last_error = error
+        if isinstance(error, (serial.SerialException, OSError)):
+            self.read_errors.add(1, now)
+            self._link_down(now)
+        else:
+            self.parse_errors.add(1, now)
+
+    def poll(self, now=None):
+        """
+        Called on every idle read: detects stalls and retries the port
+        once its backoff has expired. Returns True while the link is up.
+        """
+        now = time.time() if now is None else now
+        if self._closed:
+            return False
+        if self.link_up:
+            self._collect_decoder_errors(now)
+            if self.stall_timeout_s and now - self._last_frame > self.stall_timeout_s:
+                self.stalls += 1
+                self.last_error = f"no frame for {now - self._last_frame:.1f}s"
+                self._link_down(now)
+                # A silent device that opens fine would otherwise cycle at the floor
+                self._backoff = min(self._backoff * 2, self.backoff_max_s)
+            return self.link_up
+        if now >= self._next_attempt:
+            self._reopen(now)
+        return self.link_up
+
+    def close(self):
+        """Final disconnect: stop reconnecting"""
+        self._closed = True
+
+    # ----- internals -----
+
+    def _collect_decoder_errors(self, now):
+        decoder = self.mapper.decoder
+        if decoder is None:
+            return
+        self.crc_errors.add(decoder.crc_errors - self._decoder_crc, now)
+        # A bad binary header is a framing problem, not a corrupted payload
+        self.parse_errors.add(decoder.parse_errors - self._decoder_parse
+                              + decoder.header_errors - self._decoder_header, now)
+        self._decoder_crc = decoder.crc_errors
+        self._decoder_parse = decoder.parse_errors
+        self._decoder_header = decoder.header_errors
+
+    def _link_down(self, now):
+        if not self.link_up:
+            return
+        self.link_up = False
+        self.disconnects += 1
+        self.down_since = now
+        self._next_attempt = now + self._backoff
+        conn = self.mapper.serial_conn
+        try:
+            if conn is not None:
+                conn.close()
+        except (serial.SerialException, OSError):
+            pass
+        print(f"⚠️ Link down ({self.last_error}); retrying in {self._backoff:.2f}s")
+
+    def _reopen(self, now):
+        self.reconnect_attempts += 1
+        mapper = self.mapper
+        try:
+            mapper.serial_conn = serial.Serial(mapper.port, mapper.baudrate,
+                                               timeout=0.05, write_timeout=0.05)
+            mapper.serial_conn.reset_input_buffer()
+        except (serial.SerialException, OSError) as e:
+            self.last_error = e
+            self._backoff = min(self._backoff * 2, self.backoff_max_s)
+            self._next_attempt = now + self._backoff
+            return
+
+        if mapper.decoder is not None:
+            mapper.decoder.reset()
+        # Frames after a reopen continue the device's numbering; a
+        # rebooted device shows up as a counter reset, not as loss
+        self.link_up = True
+        self.reconnects += 1
+        self.downtime_s += now - self.down_since
+        self._last_frame = now
+        print(f"✓ Reconnected: {mapper.port} (attempt {self.reconnect_attempts}, "
+              f"down {now - self.down_since:.1f}s)")
+
+    # ----- reporting -----
+
+    def stats(self, now=None):
+        now = time.time() if now is None else now
+        seq = self.sequence
+        return {
+            'link_up': self.link_up,
+            'received': seq.received,
+            'lost': seq.lost,
+            'loss_ratio': seq.loss_ratio,
+            'gaps': seq.gaps,
+            'largest_gap': seq.largest_gap,
+            'duplicates': seq.duplicates,
+            'out_of_order': seq.out_of_order,
+            'stale': seq.stale,
+            'counter_resets': seq.resets,
+            'crc_errors': self.crc_errors.total,
+            'crc_errors_per_s': self.crc_errors.per_second(now),
+            'parse_errors': self.parse_errors.total,
+            'parse_errors_per_s': self.parse_errors.per_second(now),
+            'read_errors': self.read_errors.total,
+            'disconnects': self.disconnects,
+            'reconnects': self.reconnects,
+            'stalls': self.stalls,
+            'downtime_s': self.downtime_s + (now - self.down_since if not self.link_up else 0.0),
+        }
+
+    def summary(self, now=None):
+        s = self.stats(now)
+        return (f"loss {s['lost']} ({100 * s['loss_ratio']:.2f}%) | dup {s['duplicates']} | "
+                f"ooo {s['out_of_order']} | crc {s['crc_errors_per_s']:.1f}/s | "
+                f"reconnects {s['reconnects']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='VL53L7CX link health monitor')
+    parser.add_argument('--port', type=str, required=True)
+    parser.add_argument('--baudrate', type=int, default=921600)
+    parser.add_argument('--grid', type=int, default=8, choices=[4, 8])
+    parser.add_argument('--stall', type=float, default=3.0,
+                        help='Reconnect after this many seconds without a frame (0 = never)')
+    parser.add_argument('--interval', type=float, default=1.0, help='Report interval (s)')
+    args = parser.parse_args()
+
+    from vl53l7cx_mapper import LowLatencyMapper
+    mapper = LowLatencyMapper(args.port, args.baudrate, args.grid)
+    if not mapper.connect():
+        return
+    link = mapper.enable_reconnect(stall_timeout_s=args.stall)
+
+    last_report = time.time()
+    try:
+        while True:
+            if not mapper.read_frame_fast():
+                mapper.wait_for_data(0.05)
+            now = time.time()
+            if now - last_report >= args.interval:
+                state = '✓' if link.link_up else '✗'
+                print(f"{state} Frames: {mapper.frame_count:7d} | {link.summary(now)}")
+                last_report = now
+    except KeyboardInterrupt:
+        print("\n✓ Interrupted by user")
+    finally:
+        mapper.disconnect()
+        for key, value in link.stats().items():
+            print(f"  {key:<20} {value:.4g}" if isinstance(value, float) else f"  {key:<20} {value}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,693 @@
+"""
+Parallel offline analytics over captured VL53L7CX logs
+
+Works on capture files (capture.py, .vlcap) and on raw serial dumps (the
+bytes exactly as they came off the port, binary or ASCII frames). A file is
+cut into chunks whose boundaries are snapped to frame (or capture record)
+starts, every chunk is decoded with whole-buffer numpy operations in a
+process pool, and the per-chunk statistics - counters and fixed-bin
+histograms - are merged in file order into one report:
+
+    zone validity     fraction of frames each zone reported a target
+    distances         per-zone distance histogram (and its median)
+    near misses       frames / events with any zone inside --near
+    jitter            device frame-interval histogram, sequence gaps
+    host timing       receive-interval histogram (captures only)
+
+Usage:
+    python log_analytics.py session.vlcap
+    python log_analytics.py day1.bin day2.bin --jobs 8 --json report.json
+    python log_analytics.py serial.log --grid 8 --near 250
+    python log_analytics.py --selftest      # agreement with FrameDecoder on corrupted logs
+"""
+
+import argparse
+import json
+import math
+import mmap
+import os
+import sys
+import tempfile
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from capture import FILE_HEADER, FILE_MAGIC, RECORD_HEADER
+from frame_protocol import (FrameDecoder, MAX_LINE_BYTES, MAX_VALID_MM, MIN_VALID_MM, SUPPORTED_GRIDS, SYNC,
+                            VERSION, binary_frame_size, parse_ascii_frame)
+
+CHUNK_BYTES = 32 * 1024 * 1024
+DIST_BIN_MM = 25
+N_DIST_BINS = MAX_VALID_MM // DIST_BIN_MM + 1
+MAX_INTERVAL_MS = 250          # last interval bin collects everything longer
+NEAR_MISS_MM = 300
+SEQ_MODULO = 1 << 32
+DETECT_BYTES = 65536
+# Consecutive well-formed records required to trust a capture record boundary
+RECORD_CHAIN = 4
+MAX_EPOCH_S = 1e10
+
+
+# ----- format detection and chunk boundaries -----
+
+def detect_format(mm):
+    """(container, encoding, grid): container 'vlcap' or 'raw', encoding 'binary' or 'ascii'"""
+    if mm[:len(FILE_MAGIC)] == FILE_MAGIC:
+        grid = FILE_HEADER.unpack_from(mm)[2]
+        first = FILE_HEADER.size + RECORD_HEADER.size
+        encoding = 'binary' if mm[first:first + 2] == SYNC else 'ascii'
+        return 'vlcap', encoding, grid
+
+    sample = mm[:DETECT_BYTES]
+    grids = []
+    start = sample.find(SYNC)
+    while 0 <= start and start + 4 <= len(sample):
+        if sample[start + 2] == VERSION and sample[start + 3] in SUPPORTED_GRIDS:
+            grids.append(sample[start + 3])
+        start = sample.find(SYNC, start + 1)
+    lines = sample.count(b'\nF:') + sample.startswith(b'F:')
+    if len(grids) >= max(lines, 1):
+        return 'raw', 'binary', max(set(grids), key=grids.count)
+    return 'raw', 'ascii', None
+
+
+def _binary_frame_at(mm, offset, grid):
+    size = binary_frame_size(grid)
+    if mm[offset:offset + 2] != SYNC or mm[offset + 2] != VERSION or mm[offset + 3] != grid:
+        return False
+    frame = mm[offset:offset + size]
+    if len(frame) < size:
+        return False
+    return zlib.crc32(frame[2:-4]) & 0xFFFFFFFF == int.from_bytes(frame[-4:], 'little')
+
+
+def _record_chain_at(mm, offset):
+    """True if RECORD_CHAIN plausible capture records start at offset"""
+    end = len(mm)
+    for _ in range(RECORD_CHAIN):
+        if offset == end:
+            return True
+        if offset + RECORD_HEADER.size > end:
+            return False
+        host_time, length = RECORD_HEADER.unpack_from(mm, offset)
+        payload = offset + RECORD_HEADER.size
+        if not (0 < length <= MAX_LINE_BYTES and payload + length <= end):
+            return False
+        if not (math.isfinite(host_time) and 0 <= host_time < MAX_EPOCH_S):
+            return False
+        if mm[payload:payload + 2] not in (SYNC, b'F:'):
+            return False
+        offset = payload + length
+    return True
+
+
+def frame_boundary(mm, offset, container, encoding, grid):
+    """First frame (or capture record) start at or after offset"""
+    end = len(mm)
+    if container == 'vlcap':
+        offset = max(offset, FILE_HEADER.size)
+        while offset < end and not _record_chain_at(mm, offset):
+            offset += 1
+        return min(offset, end)
+    if encoding == 'ascii':
+        if offset == 0:
+            return 0
+        newline = mm.find(b'\n', offset - 1)
+        return end if newline < 0 else newline + 1
+    while True:
+        offset = mm.find(SYNC, offset)
+        if offset < 0:
+            return end
+        if _binary_frame_at(mm, offset, grid):
+            return offset
+        offset += 1
+
+
+def plan_chunks(path, chunk_bytes=CHUNK_BYTES):
+    """[(path, start, end, container, encoding, grid)] covering the whole file"""
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return []
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            container, encoding, grid = detect_format(mm)
+            bounds = [frame_boundary(mm, 0, container, encoding, grid)]
+            for target in range(chunk_bytes, size, chunk_bytes):
+                b = frame_boundary(mm, max(target, bounds[-1]), container, encoding, grid)
+                if b > bounds[-1]:
+                    bounds.append(b)
+            if bounds[-1] < size:
+                bounds.append(size)
+        finally:
+            mm.close()
+    return [(path, s, e, container, encoding, grid) for s, e in zip(bounds[:-1], bounds[1:])]
+
+
+# ----- whole-buffer decoders -----
+
+def parse_binary(buf, grid, final=True):
+    """
+    Every CRC-valid binary frame in buf.
+    Returns (starts, frame_num, timestamp, distance (F,N,N), valid, crc_errors).
+    final=False for a chunk that more data follows: a header cut off by the
+    chunk end then runs into the next chunk's first frame, so it counts as
+    the CRC error FrameDecoder would see over the whole file.
+    """
+    a = np.frombuffer(buf, dtype=np.uint8)
+    size = binary_frame_size(grid)
+    n_zones = grid * grid
+    cand = np.flatnonzero((a[:-1] == SYNC[0]) & (a[1:] == SYNC[1]))
+    cand = cand[cand <= len(a) - 4]
+    cand = cand[(a[cand + 2] == VERSION) & (a[cand + 3] == grid)]
+    truncated = cand[cand > len(a) - size]
+    cand = cand[cand <= len(a) - size]
+
+    # CRC has to be checked frame by frame; zlib does the heavy lifting
+    view = memoryview(buf)
+    crc_at = size - 4
+    starts = []
+    end = 0
+    crc_errors = 0
+    for s in cand.tolist():
+        if s < end:
+            continue
+        if zlib.crc32(view[s + 2:s + crc_at]) & 0xFFFFFFFF == int.from_bytes(view[s + crc_at:s + size], 'little'):
+            starts.append(s)
+            end = s + size
+        else:
+            crc_errors += 1
+    if not final and truncated.size:
+        crc_errors += int(np.count_nonzero(truncated >= end))
+
+    starts = np.asarray(starts, dtype=np.int64)
+    rows = a[starts[:, None] + np.arange(size)]
+    frame_num = rows[:, 4:8].copy().view('<u4').ravel().astype(np.int64)
+    timestamp = rows[:, 8:12].copy().view('<u4').ravel().astype(np.int64)
+    dist = rows[:, 12:12 + 2 * n_zones].copy().view('<i2').reshape(-1, grid, grid)
+    valid = (dist >= MIN_VALID_MM) & (dist <= MAX_VALID_MM)
+    dist = np.where(valid, dist, 0).astype(np.int16)
+    return starts, frame_num, timestamp, dist, valid, crc_errors
+
+
+def parse_ascii(buf, grid):
+    """
+    Every ASCII frame in buf, exactly as FrameDecoder(grid, 'ascii') would
+    decode it: each newline-terminated line holding 'F:' is one candidate,
+    starting at its first 'F:'. Lines in the strict F:n:t:Z:r:c:d:...:E form
+    are tokenized without a per-zone loop; anything else (corruption,
+    stray whitespace, bytes that are not ASCII) goes through
+    frame_protocol.parse_ascii_frame itself, so both take the same
+    acceptance rules.
+    Returns (starts, frame_num, timestamp, distance (F,N,N), valid, bad_lines).
+    """
+    a = np.frombuffer(buf, dtype=np.uint8)
+    dist = np.zeros((0, grid, grid), dtype=np.int16)
+    empty = (np.zeros(0, np.int64),) * 3 + (dist, dist > 0, 0)
+
+    # Candidate lines; an unterminated last line is not a frame yet
+    newline = np.flatnonzero(a == ord('\n'))
+    marker = np.flatnonzero((a[:-1] == ord('F')) & (a[1:] == ord(':')))
+    if newline.size == 0 or marker.size == 0:
+        return empty
+    line_start = np.r_[0, newline[:-1] + 1]
+    i = np.searchsorted(marker, line_start)
+    head_pos = marker[np.minimum(i, marker.size - 1)]
+    has = (i < marker.size) & (head_pos < newline)
+    head_pos, line_end = head_pos[has], newline[has]
+    lines = head_pos.size
+    if lines == 0:
+        return empty
+    # A trailing '\r' is stripped by the decoder too
+    line_end = line_end - (a[np.maximum(line_end - 1, 0)] == ord('\r'))
+
+    def before(i, k):
+        """Byte k positions before index array i (0 where that is before buf)"""
+        j = i - k
+        return np.where(j >= 0, a[np.maximum(j, 0)], 0)
+
+    # Numeric tokens: runs of digits, kept if they sit on a candidate line
+    digit = (a - ord('0')).astype(np.uint8) < 10
+    edges = np.diff(digit.view(np.int8), prepend=np.int8(0), append=np.int8(0))
+    tok_start = np.flatnonzero(edges == 1)
+    tok_end = np.flatnonzero(edges == -1)
+    tok_line = np.searchsorted(head_pos, tok_start, side='right') - 1
+    keep = tok_line >= 0
+    keep[keep] = tok_start[keep] < line_end[tok_line[keep]]
+    tok_start, tok_end, tok_line = tok_start[keep], tok_end[keep], tok_line[keep]
+
+    # Token k of a line: 0 frame number, 1 timestamp, then (row, col, dist) triples
+    per_line = np.bincount(tok_line, minlength=lines)
+    first_tok = np.r_[0, np.cumsum(per_line)[:-1]]
+    k = np.arange(tok_start.size) - first_tok[tok_line]
+    is_row = (k >= 2) & ((k - 2) % 3 == 0)
+    rows = np.flatnonzero(is_row)
+    dists = rows + 2
+    dists = dists[dists < tok_start.size]
+    colon = ord(':')
+
+    # Strict form: every token preceded by exactly its separator and the
+    # line ending ':E'. Checking each separator as a minimum and the total
+    # line length as an equality leaves no room for any other byte.
+    prev = before(tok_start, 1)
+    negative = np.zeros(tok_start.size, dtype=bool)
+    negative[dists] = prev[dists] == ord('-')
+    bad = (prev != colon) & ~negative
+    bad[negative] = before(tok_start[negative], 2) != colon
+    bad[rows] |= (before(tok_start[rows], 2) != ord('Z')) | (before(tok_start[rows], 3) != colon)
+    bad[first_tok[per_line > 0]] |= tok_start[first_tok[per_line > 0]] != head_pos[per_line > 0] + 2
+    bad |= tok_end - tok_start > 18
+
+    def line_sum(x):
+        total = np.r_[0, np.cumsum(x, dtype=np.int64)]
+        return total[first_tok + per_line] - total[first_tok]
+
+    # 'F:' + ':' before the timestamp + ':Z:', ':', ':' per triple + ':E'
+    expected = line_sum(tok_end - tok_start) + line_sum(negative) + 5 + 5 * ((per_line - 2) // 3)
+    strict = ((per_line >= 2) & ((per_line - 2) % 3 == 0) & (line_sum(bad) == 0)
+              & (line_end - head_pos == expected)
+              & (before(line_end, 2) == colon) & (before(line_end, 1) == ord('E')))
+
+    # Token values of strict lines, one pass per digit position
+    on_strict = strict[tok_line]
+    ts_, te = tok_start[on_strict], tok_end[on_strict]
+    values = np.zeros(ts_.size, dtype=np.int64)
+    if ts_.size:
+        for j in range(int((te - ts_).max())):
+            idx = np.flatnonzero(te - ts_ > j)
+            values[idx] = values[idx] * 10 + (a[ts_[idx] + j] - ord('0'))
+    values[negative[on_strict]] *= -1
+
+    is_frame = strict.copy()
+    frame_num = np.zeros(lines, dtype=np.int64)
+    timestamp = np.zeros(lines, dtype=np.int64)
+    heads = np.flatnonzero(strict)
+    first = (np.cumsum(on_strict) - 1)[first_tok[heads]]   # index into values
+    frame_num[heads] = values[first]
+    timestamp[heads] = values[first + 1]
+    dist = np.zeros((lines, grid, grid), dtype=np.int16)
+    valid = np.zeros((lines, grid, grid), dtype=bool)
+    rows = np.flatnonzero(is_row[on_strict])
+    f, r, c, d = tok_line[on_strict][rows], values[rows], values[rows + 1], values[rows + 2]
+    ok = (r >= 0) & (r < grid) & (c >= 0) & (c < grid) & (d >= MIN_VALID_MM) & (d <= MAX_VALID_MM)
+    dist[f[ok], r[ok], c[ok]] = d[ok]
+    valid[f[ok], r[ok], c[ok]] = True
+
+    # Everything else: the decoder's own line parser
+    for line in np.flatnonzero(~strict).tolist():
+        text = bytes(buf[head_pos[line]:line_end[line]]).decode('utf-8', errors='ignore').strip()
+        result = parse_ascii_frame(text, dist[line], valid[line])
+        if result is not None:
+            is_frame[line] = True
+            frame_num[line], timestamp[line] = result[0], result[1]
+
+    bad_lines = int(lines - np.count_nonzero(is_frame))
+    return (head_pos[is_frame].astype(np.int64), frame_num[is_frame], timestamp[is_frame],
+            dist[is_frame], valid[is_frame], bad_lines)
+
+
+def decode_buffer(buf, encoding, grid, final=True):
+    return parse_binary(buf, grid, final) if encoding == 'binary' else parse_ascii(buf, grid)
+
+
+# ----- statistics -----
+
+class LogStats:
+    """Mergeable counters and histograms for a contiguous run of frames"""
+
+    def __init__(self, grid, near_mm=NEAR_MISS_MM):
+        self.grid = grid
+        self.near_mm = near_mm
+        self.frames = 0
+        self.bytes = 0
+        self.decode_errors = 0
+        self.valid_count = np.zeros((grid, grid), dtype=np.int64)
+        self.near_count = np.zeros((grid, grid), dtype=np.int64)
+        self.dist_hist = np.zeros((grid * grid, N_DIST_BINS), dtype=np.int64)
+        self.interval_hist = np.zeros(MAX_INTERVAL_MS + 1, dtype=np.int64)
+        self.host_interval_hist = np.zeros(MAX_INTERVAL_MS + 1, dtype=np.int64)
+        self.near_frames = 0
+        self.near_events = 0
+        self.seq_gaps = 0
+        self.seq_lost = 0
+        self.seq_resets = 0
+        # Edge state so adjacent chunks can be stitched together
+        self.first = None    # (frame_num, device_ts, host_time, near)
+        self.last = None
+
+    def add(self, frame_num, timestamp, dist, valid, host_time=None):
+        """Fold a decoded run of consecutive frames in"""
+        count = len(frame_num)
+        if count == 0:
+            return
+        grid = self.grid
+        self.frames += count
+        self.valid_count += valid.sum(axis=0)
+
+        near_zone = valid & (dist < self.near_mm)
+        self.near_count += near_zone.sum(axis=0)
+        near = near_zone.reshape(count, -1).any(axis=1)
+        self.near_frames += int(np.count_nonzero(near))
+        self.near_events += int(np.count_nonzero(near[1:] & ~near[:-1])) + int(near[0])
+
+        zone = np.broadcast_to(np.arange(grid * grid).reshape(grid, grid), dist.shape)[valid]
+        bins = np.minimum(dist[valid] // DIST_BIN_MM, N_DIST_BINS - 1)
+        self.dist_hist += np.bincount(zone * N_DIST_BINS + bins,
+                                      minlength=grid * grid * N_DIST_BINS).reshape(grid * grid, -1)
+
+        self._intervals(np.diff(timestamp) % SEQ_MODULO, self.interval_hist)
+        if host_time is not None:
+            self._intervals(np.rint(np.diff(host_time) * 1000).astype(np.int64), self.host_interval_hist)
+        self._sequence(np.diff(frame_num) % SEQ_MODULO)
+
+        host_first = None if host_time is None else float(host_time[0])
+        host_last = None if host_time is None else float(host_time[-1])
+        if self.first is None:
+            self.first = (int(frame_num[0]), int(timestamp[0]), host_first, bool(near[0]))
+        elif self.last is not None:
+            self._stitch(self.last, (int(frame_num[0]), int(timestamp[0]), host_first, bool(near[0])))
+        self.last = (int(frame_num[-1]), int(timestamp[-1]), host_last, bool(near[-1]))
+
+    @staticmethod
+    def _intervals(diffs, hist):
+        if diffs.size:
+            hist += np.bincount(np.clip(diffs, 0, MAX_INTERVAL_MS), minlength=hist.size)
+
+    def _sequence(self, steps):
+        gaps = (steps > 1) & (steps < SEQ_MODULO // 2)
+        self.seq_gaps += int(np.count_nonzero(gaps))
+        self.seq_lost += int(steps[gaps].sum() - np.count_nonzero(gaps))
+        self.seq_resets += int(np.count_nonzero((steps == 0) | (steps >= SEQ_MODULO // 2)))
+
+    def _stitch(self, last, first):
+        """Account the single boundary between two runs"""
+        frame_a, ts_a, host_a, near_a = last
+        frame_b, ts_b, host_b, near_b = first
+        self._intervals(np.array([(ts_b - ts_a) % SEQ_MODULO]), self.interval_hist)
+        if host_a is not None and host_b is not None:
+            self._intervals(np.array([int(round((host_b - host_a) * 1000))]), self.host_interval_hist)
+        self._sequence(np.array([(frame_b - frame_a) % SEQ_MODULO]))
+        if near_a and near_b:
+            # The run continued across the boundary: not a new event
+            self.near_events -= 1
+
+    def merge(self, other, contiguous=True):
+        """Fold in the run that follows this one (contiguous=False for another file)"""
+        if other.first is None:
+            self.bytes += other.bytes
+            self.decode_errors += other.decode_errors
+            return self
+        if contiguous and self.last is not None:
+            self._stitch(self.last, other.first)
+        for name in ('frames', 'bytes', 'decode_errors', 'near_frames', 'near_events',
+                     'seq_gaps', 'seq_lost', 'seq_resets'):
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+        for name in ('valid_count', 'near_count', 'dist_hist', 'interval_hist', 'host_interval_hist'):
+            getattr(self, name)[...] += getattr(other, name)
+        if self.first is None:
+            self.first = other.first
+        self.last = other.last
+        return self
+
+    # ----- reporting -----
+
+    @staticmethod
+    def _percentile(hist, q):
+        total = hist.sum()
+        if total == 0:
+            return float('nan')
+        return float(np.searchsorted(np.cumsum(hist), q / 100.0 * total))
+
+    def median_distance(self):
+        """(N, N) median distance per zone from the histogram (bin centres)"""
+        cum = np.cumsum(self.dist_hist, axis=1)
+        half = cum[:, -1:] / 2.0
+        idx = (cum < half).sum(axis=1)
+        med = (idx + 0.5) * DIST_BIN_MM
+        med[cum[:, -1] == 0] = np.nan
+        return med.reshape(self.grid, self.grid)
+
+    def interval_summary(self, hist):
+        total = int(hist.sum())
+        if not total:
+            return None
+        ms = np.arange(hist.size)
+        mean = float((hist * ms).sum() / total)
+        std = float(np.sqrt((hist * (ms - mean) ** 2).sum() / total))
+        return {'intervals': total, 'mean_ms': mean, 'std_ms': std,
+                'p50_ms': self._percentile(hist, 50), 'p95_ms': self._percentile(hist, 95),
+                'p99_ms': self._percentile(hist, 99),
+                'over_max': int(hist[-1])}
+
+    def to_dict(self):
+        frames = max(self.frames, 1)
+        return {
+            'grid': self.grid,
+            'frames': self.frames,
+            'bytes': self.bytes,
+            'decode_errors': self.decode_errors,
+            'zone_validity': (self.valid_count / frames).round(4).tolist(),
+            'zone_median_mm': np.nan_to_num(self.median_distance(), nan=-1).tolist(),
+            'zone_near_miss_frames': self.near_count.tolist(),
+            'near_miss_mm': self.near_mm,
+            'near_miss_frames': self.near_frames,
+            'near_miss_events': self.near_events,
+            'sequence': {'gaps': self.seq_gaps, 'lost': self.seq_lost, 'resets': self.seq_resets},
+            'device_interval': self.interval_summary(self.interval_hist),
+            'host_interval': self.interval_summary(self.host_interval_hist),
+            'dist_bin_mm': DIST_BIN_MM,
+            'dist_hist': self.dist_hist.tolist(),
+        }
+
+    def report(self):
+        frames = max(self.frames, 1)
+        print(f"Frames:          {self.frames} ({self.bytes / 1e6:.1f} MB, "
+              f"{self.decode_errors} CRC/parse errors)")
+        print(f"Sequence:        {self.seq_gaps} gaps, {self.seq_lost} frames lost, "
+              f"{self.seq_resets} counter resets")
+        print(f"Near misses:     {self.near_frames} frames ({100 * self.near_frames / frames:.2f}%), "
+              f"{self.near_events} events (< {self.near_mm:.0f}mm)")
+        for label, hist in (('Device interval', self.interval_hist),
+                            ('Host interval', self.host_interval_hist)):
+            s = self.interval_summary(hist)
+            if s:
+                print(f"{label + ':':<17}mean {s['mean_ms']:.2f}ms | std {s['std_ms']:.2f}ms | "
+                      f"p50 {s['p50_ms']:.0f} | p95 {s['p95_ms']:.0f} | p99 {s['p99_ms']:.0f}ms | "
+                      f"> {MAX_INTERVAL_MS}ms: {s['over_max']}")
+
+        print("\nZone validity (%):")
+        for row in 100 * self.valid_count / frames:
+            print("  " + " ".join(f"{v:5.1f}" for v in row))
+        print("\nZone median distance (mm):")
+        for row in self.median_distance():
+            print("  " + " ".join("    -" if np.isnan(v) else f"{v:5.0f}" for v in row))
+
+
+# ----- workers -----
+
+def analyze_chunk(task, near_mm=NEAR_MISS_MM):
+    """Decode one chunk of a file and return its LogStats (runs in a worker)"""
+    path, start, end, container, encoding, grid = task
+    with open(path, 'rb') as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        final = end == len(mm)
+        try:
+            host_time = None
+            if container == 'vlcap':
+                # Gather the records' payloads into one contiguous stream
+                offsets, times, payloads = [], [], []
+                offset, total = start, 0
+                while offset + RECORD_HEADER.size <= end:
+                    t, length = RECORD_HEADER.unpack_from(mm, offset)
+                    payload = offset + RECORD_HEADER.size
+                    if payload + length > end:
+                        break
+                    offsets.append(total)
+                    times.append(t)
+                    payloads.append(mm[payload:payload + length])
+                    total += length
+                    offset = payload + length
+                buf = b''.join(payloads)
+                starts, frame_num, ts, dist, valid, errors = decode_buffer(buf, encoding, grid, final)
+                record = np.searchsorted(np.asarray(offsets, dtype=np.int64), starts, side='right') - 1
+                host_time = np.asarray(times)[record] if len(record) else np.zeros(0)
+            else:
+                buf = mm[start:end]
+                starts, frame_num, ts, dist, valid, errors = decode_buffer(buf, encoding, grid, final)
+        finally:
+            mm.close()
+
+    stats = LogStats(grid, near_mm)
+    stats.bytes = end - start
+    stats.decode_errors = errors
+    stats.add(frame_num, ts, dist, valid, host_time)
+    return stats
+
+
+def _analyze(task_and_near):
+    return analyze_chunk(*task_and_near)
+
+
+def analyze_files(paths, jobs=None, chunk_bytes=CHUNK_BYTES, near_mm=NEAR_MISS_MM, grid=None):
+    """Merged LogStats over all files (chunks run in a process pool)"""
+    tasks = []
+    for path in paths:
+        for task in plan_chunks(path, chunk_bytes):
+            if task[5] is None:
+                if grid is None:
+                    raise ValueError(f"{path}: ASCII log, pass the grid size (--grid)")
+                task = task[:5] + (grid,)
+            tasks.append(task)
+    if not tasks:
+        return None
+
+    total = None
+    previous_path = None
+    jobs = jobs or os.cpu_count() or 1
+    if jobs == 1:
+        results = map(_analyze, [(t, near_mm) for t in tasks])
+    else:
+        pool = ProcessPoolExecutor(max_workers=jobs)
+        results = pool.map(_analyze, [(t, near_mm) for t in tasks])
+    try:
+        for task, stats in zip(tasks, results):
+            if total is None:
+                total = stats
+            else:
+                if stats.grid != total.grid:
+                    raise ValueError(f"{task[0]}: grid {stats.grid}x{stats.grid} does not match "
+                                     f"{total.grid}x{total.grid}")
+                total.merge(stats, contiguous=task[0] == previous_path)
+            previous_path = task[0]
+    finally:
+        if jobs != 1:
+            pool.shutdown()
+    return total
+
+
+# ----- selftest -----
+
+def decode_reference(buf, encoding, grid):
+    """(frame_num, timestamp, distance, valid) of buf run through FrameDecoder, for comparison"""
+    decoder = FrameDecoder(grid, encoding)
+    decoder.feed(buf)
+    dist = np.zeros((grid, grid), dtype=np.int16)
+    valid = np.zeros((grid, grid), dtype=bool)
+    frame_num, timestamp, dists, valids = [], [], [], []
+    while decoder.decode_next(dist, valid) is not None:
+        frame_num.append(decoder.frame_num)
+        timestamp.append(decoder.timestamp)
+        dists.append(dist.copy())
+        valids.append(valid.copy())
+    shape = (len(dists), grid, grid)
+    return (np.asarray(frame_num, dtype=np.int64), np.asarray(timestamp, dtype=np.int64),
+            np.asarray(dists, dtype=np.int16).reshape(shape), np.asarray(valids, dtype=bool).reshape(shape))
+
+
+def corrupt(data, rng, n_edits):
+    """Copy of data with n_edits random byte overwrites, deletions and insertions"""
+    buf = bytearray(data)
+    for _ in range(n_edits):
+        i = int(rng.integers(len(buf)))
+        op = int(rng.integers(3))
+        if op == 0:
+            buf[i] = int(rng.integers(256))
+        elif op == 1:
+            del buf[i]
+        else:
+            buf.insert(i, int(rng.integers(256)))
+    return bytes(buf)
+
+
+def selftest(grid=8, frames=3000, edits=300, seeds=3):
+    """
+    Corrupted synthetic logs, both encodings: the whole-buffer parsers must
+    match FrameDecoder frame for frame, and a chunked run the one-chunk run
+    """
+    from virtual_serial import SyntheticFrameGenerator
+
+    print(f"\nLog analytics selftest ({grid}x{grid}, {frames} frames, {edits} corrupting edits)")
+    ok = True
+    for encoding in ('binary', 'ascii'):
+        for seed in range(seeds):
+            gen = SyntheticFrameGenerator(grid, seed=seed)
+            buf = corrupt(gen.stream(frames, encoding == 'binary'), np.random.default_rng(seed), edits)
+            expected = decode_reference(buf, encoding, grid)
+            got = decode_buffer(buf, encoding, grid)[1:5]
+            same = (len(got[0]) == len(expected[0])
+                    and all(np.array_equal(g, e) for g, e in zip(got, expected)))
+
+            with tempfile.NamedTemporaryFile(suffix='.log', delete=False) as f:
+                f.write(buf)
+            try:
+                whole = analyze_files([f.name], jobs=1, chunk_bytes=len(buf) + 1, grid=grid)
+                chunked = analyze_files([f.name], jobs=1, chunk_bytes=max(len(buf) // 7, 1), grid=grid)
+            finally:
+                os.unlink(f.name)
+            merged = whole.to_dict() == chunked.to_dict()
+
+            ok &= same and merged
+            print(f"{'✓' if same and merged else '✗'} {encoding:<6} seed {seed}: "
+                  f"FrameDecoder {len(expected[0])} frames, parser {len(got[0])} "
+                  f"({'identical' if same else 'DIFFERENT'}), "
+                  f"7 chunks vs 1 {'identical' if merged else 'DIFFERENT'}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline analytics over VL53L7CX logs')
+    parser.add_argument('paths', nargs='*', help='.vlcap captures or raw serial dumps')
+    parser.add_argument('--selftest', action='store_true',
+                        help='Check the parsers against FrameDecoder on corrupted synthetic logs')
+    parser.add_argument('--jobs', type=int, default=None,
+                        help='Worker processes (default: all cores)')
+    parser.add_argument('--chunk-mb', type=float, default=CHUNK_BYTES / 2**20,
+                        help='Chunk size per task (MB)')
+    parser.add_argument('--grid', type=int, choices=SUPPORTED_GRIDS,
+                        help='Grid size for ASCII logs (binary frames carry it)')
+    parser.add_argument('--near', type=float, default=NEAR_MISS_MM,
+                        help='Near-miss distance threshold (mm)')
+    parser.add_argument('--json', type=str, metavar='FILE', help='Also write the report as JSON')
+    args = parser.parse_args()
+
+    if args.selftest:
+        if not selftest(args.grid or 8):
+            sys.exit(1)
+        return
+    if not args.paths:
+        parser.error('give at least one log file (or --selftest)')
+
+    size = sum(os.path.getsize(p) for p in args.paths)
+    jobs = args.jobs or os.cpu_count() or 1
+
+    print("\n" + "="*60)
+    print("VL53L7CX LOG ANALYTICS")
+    print("="*60)
+    print(f"Files:     {len(args.paths)} ({size / 1e6:.1f} MB)")
+    print(f"Workers:   {jobs}")
+    print("="*60 + "\n")
+
+    start = time.perf_counter()
+    try:
+        stats = analyze_files(args.paths, jobs, int(args.chunk_mb * 2**20), args.near, args.grid)
+    except ValueError as e:
+        print(f"✗ {e}")
+        return
+    elapsed = time.perf_counter() - start
+    if stats is None or stats.frames == 0:
+        print("✗ No frames found")
+        return
+
+    stats.report()
+    print(f"\n✓ {stats.frames} frames in {elapsed:.2f}s "
+          f"({stats.frames / elapsed:,.0f} frames/s, {size / 1e6 / elapsed:.0f} MB/s)")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(stats.to_dict(), f, indent=2)
+        print(f"✓ Report written to {args.json}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,306 @@
+"""
+Multi-sensor aggregator - one VL53L7CX corner module per lift corner
+
+Every module gets its own LowLatencyMapper; a single selector loop services
+all ports and only touches the ones that have bytes waiting. Each module's
+mounting pose (position + yaw) is folded into its zone direction table once,
+so merging N modules into the lift frame is one broadcast multiply-add over
+an (N, zones, 3) array, no matter how many modules are attached.
+
+Lift frame: X forward, Y left, Z up (mm), origin at the platform centre.
+Sensor frame (point_cloud.py): x right, y down the rows, z out of the lens.
+
+Usage:
+    python multi_sensor.py --module /dev/ttyUSB0@1135,405,0,45 --module ...
+    python multi_sensor.py --simulate 4              # pty-backed modules
+"""
+
+import argparse
+import math
+import selectors
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from point_cloud import direction_lut
+from vl53l7cx_mapper import LowLatencyMapper
+
+# Typical slab scissor platform, used for the default corner poses
+LIFT_LENGTH_MM = 2270
+LIFT_WIDTH_MM = 810
+
+# Sensor axes expressed in the lift frame for a module with zero yaw:
+# lens (z) looks forward, sensor x points right (-Y), rows run downwards (-Z)
+SENSOR_TO_MODULE = np.array([
+    [0.0, 0.0, 1.0],
+    [-1.0, 0.0, 0.0],
+    [0.0, -1.0, 0.0],
+])
+
+
+class ModulePose:
+    """Mounting position (mm, lift frame) and yaw (deg, CCW from +X)"""
+
+    __slots__ = ('x', 'y', 'z', 'yaw_deg')
+
+    def __init__(self, x=0.0, y=0.0, z=0.0, yaw_deg=0.0):
+        self.x = x
+        self.y = y
+        self.z = z
+        self.yaw_deg = yaw_deg
+
+    @classmethod
+    def parse(cls, text):
+        """'x,y,z,yaw' -> ModulePose"""
+        values = [float(v) for v in text.split(',')]
+        if len(values) != 4:
+            raise ValueError(f"Pose must be x,y,z,yaw: {text}")
+        return cls(*values)
+
+    def rotation(self):
+        """3x3 matrix taking sensor-frame vectors into the lift frame"""
+        yaw = math.radians(self.yaw_deg)
+        c, s = math.cos(yaw), math.sin(yaw)
+        rz = np.array([[c, -s, 0.0], [s, c, 0.0], [0.0, 0.0, 1.0]])
+        return rz @ SENSOR_TO_MODULE
+
+    def origin(self):
+        return np.array([self.x, self.y, self.z], dtype=np.float64)
+
+    def __repr__(self):
+        return f"ModulePose({self.x:.0f}, {self.y:.0f}, {self.z:.0f}, yaw={self.yaw_deg:.0f})"
+
+
+def corner_poses(length=LIFT_LENGTH_MM, width=LIFT_WIDTH_MM):
+    """Default poses: one module per corner, looking diagonally outwards"""
+    hl, hw = length / 2.0, width / 2.0
+    return [
+        ModulePose(hl, hw, 0.0, 45.0),      # front left
+        ModulePose(-hl, hw, 0.0, 135.0),    # rear left
+        ModulePose(-hl, -hw, 0.0, 225.0),   # rear right
+        ModulePose(hl, -hw, 0.0, 315.0),    # front right
+    ]
+
+
+class MultiSensorAggregator:
+    """Concurrent ingest of N modules merged into one lift-centric frame"""
+
+    def __init__(self, modules, baudrate=921600, grid_size=8, protocol='auto'):
+        """modules: list of (port, ModulePose)"""
+        self.grid_size = grid_size
+        self.n_modules = len(modules)
+        self.n_zones = grid_size * grid_size
+        self.ports = [port for port, _ in modules]
+        self.poses = [pose for _, pose in modules]
+        self.mappers = [LowLatencyMapper(port, baudrate, grid_size, protocol)
+                        for port in self.ports]
+
+        # Pose folded into the direction table: (N, zones, 3) and (N, 1, 3)
+        lut = direction_lut(grid_size)
+        self.directions = np.stack([lut @ pose.rotation().T for pose in self.poses])
+        self.origins = np.stack([pose.origin() for pose in self.poses])[:, np.newaxis, :]
+
+        # Latest frame per module
+        self.distances = np.zeros((self.n_modules, self.n_zones), dtype=np.int16)
+        self.valid = np.zeros((self.n_modules, self.n_zones), dtype=bool)
+        self.host_timestamps = np.zeros(self.n_modules, dtype=np.float64)
+        self.device_timestamps = np.zeros(self.n_modules, dtype=np.int64)
+        self.frame_nums = np.full(self.n_modules, -1, dtype=np.int64)
+        self.frames_received = np.zeros(self.n_modules, dtype=np.int64)
+
+        self.points = np.empty((self.n_modules, self.n_zones, 3), dtype=np.float64)
+        self.module_ids = np.repeat(np.arange(self.n_modules), self.n_zones).reshape(
+            self.n_modules, self.n_zones)
+
+        self.selector = selectors.DefaultSelector()
+        self._unselectable = []
+
+    def connect(self):
+        """Open every port concurrently; returns True only if all connected"""
+        with ThreadPoolExecutor(max_workers=max(1, self.n_modules)) as pool:
+            results = list(pool.map(lambda m: m.connect(), self.mappers))
+
+        for index, (mapper, ok) in enumerate(zip(self.mappers, results)):
+            if not ok:
+                continue
+            try:
+                self.selector.register(mapper.serial_conn.fileno(), selectors.EVENT_READ, index)
+            except (AttributeError, OSError, ValueError):
+                # No pollable descriptor (e.g. Windows, replay) - poll every pass
+                self._unselectable.append(index)
+        return all(results)
+
+    def attach(self, index, serial_conn):
+        """Use an already-open serial-like object for module `index`"""
+        self.mappers[index].serial_conn = serial_conn
+        try:
+            self.selector.register(serial_conn.fileno(), selectors.EVENT_READ, index)
+        except (AttributeError, OSError, ValueError):
+            self._unselectable.append(index)
+
+    def _drain(self, index):
+        """Decode everything buffered for one module and keep its newest frame"""
+        mapper = self.mappers[index]
+        start = mapper.frame_count
+        while True:
+            before = mapper.frame_count
+            mapper.read_frame_fast()
+            if mapper.frame_count == before and not self._lines_waiting(mapper):
+                break
+        if mapper.frame_count == start:
+            return 0
+
+        self.distances[index] = mapper.distance_map.ravel()
+        self.valid[index] = mapper.valid_mask.ravel()
+        self.host_timestamps[index] = mapper.last_frame_time
+        self.device_timestamps[index] = mapper.device_timestamp
+        self.frame_nums[index] = mapper.frame_num
+        self.frames_received[index] += mapper.frame_count - start
+        return mapper.frame_count - start
+
+    @staticmethod
+    def _lines_waiting(mapper):
+        """ASCII mode reads a line per call: a banner or status line is not the end of the data"""
+        conn = mapper.serial_conn
+        return (mapper.decoder is None and conn is not None and conn.is_open
+                and conn.in_waiting > 0)
+
+    def poll(self, timeout=0.01):
+        """Service every port with data waiting; returns module frames decoded"""
+        frames = 0
+        for key, _ in self.selector.select(timeout):
+            frames += self._drain(key.data)
+        for index in self._unselectable:
+            frames += self._drain(index)
+        return frames
+
+    def merged_cloud(self, max_age_s=None):
+        """
+        Merged lift-frame cloud as (points (M, 3), module_ids (M,)).
+        Modules whose latest frame is older than max_age_s are left out.
+        """
+        np.multiply(self.directions, self.distances[:, :, np.newaxis], out=self.points)
+        self.points += self.origins
+
+        mask = self.live_mask(max_age_s)
+        return self.points[mask], self.module_ids[mask]
+
+    def live_mask(self, max_age_s=None):
+        """(n_modules, n_zones) valid mask with modules older than max_age_s cleared"""
+        if max_age_s is None:
+            return self.valid
+        fresh = (time.time() - self.host_timestamps) <= max_age_s
+        return self.valid & fresh[:, np.newaxis]
+
+    def disconnect(self):
+        self.selector.close()
+        for mapper in self.mappers:
+            mapper.disconnect()
+
+
+def plot_live(aggregator, max_age_s):
+    """Live 3D view of the merged cloud, coloured by module"""
+    import matplotlib.pyplot as plt
+    from matplotlib.animation import FuncAnimation
+
+    fig = plt.figure(figsize=(8, 8))
+    ax = fig.add_subplot(111, projection='3d')
+    reach = max(LIFT_LENGTH_MM, LIFT_WIDTH_MM) / 2.0 + 1200
+    ax.set_xlim([-reach, reach])
+    ax.set_ylim([-reach, reach])
+    ax.set_zlim([-1200, 1200])
+    ax.set_xlabel('X fwd (mm)')
+    ax.set_ylabel('Y left (mm)')
+    ax.set_zlabel('Z up (mm)')
+    scatter = ax.scatter([], [], [], c=[], cmap='tab10', vmin=0, vmax=9, s=20)
+
+    def update(_):
+        aggregator.poll(0)
+        points, ids = aggregator.merged_cloud(max_age_s)
+        scatter._offsets3d = (points[:, 0], points[:, 1], points[:, 2])
+        scatter.set_array(ids)
+        ax.set_title(f"{len(points)} points from {aggregator.n_modules} modules")
+
+    anim = FuncAnimation(fig, update, interval=20, cache_frame_data=False)
+    plt.show(block=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='VL53L7CX multi-module aggregator')
+    parser.add_argument('--module', action='append', default=[], metavar='PORT@x,y,z,yaw',
+                        help='Module port and mounting pose (repeat per module)')
+    parser.add_argument('--simulate', type=int, default=0, metavar='N',
+                        help='Run N simulated pty-backed modules at the corner poses')
+    parser.add_argument('--baudrate', type=int, default=921600)
+    parser.add_argument('--grid', type=int, default=8, choices=[4, 8])
+    parser.add_argument('--rate', type=float, default=60.0,
+                        help='Simulated frame rate (default: 60)')
+    parser.add_argument('--max-age', type=float, default=0.25,
+                        help='Drop modules whose last frame is older than this (s)')
+    parser.add_argument('--plot', action='store_true', help='Show a live 3D view')
+    args = parser.parse_args()
+
+    sims = []
+    modules = []
+    if args.simulate:
+        from virtual_serial import SimulatedSensor
+        poses = corner_poses()
+        for i in range(args.simulate):
+            sim = SimulatedSensor(args.grid, args.rate, seed=i, phase=i * 0.7)
+            sims.append(sim)
+            modules.append((sim.port, poses[i % len(poses)]))
+    for spec in args.module:
+        port, _, pose = spec.partition('@')
+        modules.append((port, ModulePose.parse(pose) if pose else ModulePose()))
+
+    if not modules:
+        parser.error('give at least one --module or --simulate N')
+
+    print("\n" + "="*60)
+    print("VL53L7CX MULTI-MODULE AGGREGATOR")
+    print("="*60)
+    for port, pose in modules:
+        print(f"  {port:<24} {pose}")
+    print("="*60 + "\n")
+
+    aggregator = MultiSensorAggregator(modules, args.baudrate, args.grid)
+    if not aggregator.connect():
+        aggregator.disconnect()
+        return
+    for sim in sims:
+        sim.start()
+
+    try:
+        if args.plot:
+            plot_live(aggregator, args.max_age)
+        else:
+            last_report = time.time()
+            last_frames = aggregator.frames_received.copy()
+            merge_time = 0.0
+            merges = 0
+            points = np.empty((0, 3))
+            while True:
+                if aggregator.poll(0.01):
+                    t0 = time.perf_counter()
+                    points, _ = aggregator.merged_cloud(args.max_age)
+                    merge_time += time.perf_counter() - t0
+                    merges += 1
+                now = time.time()
+                if now - last_report >= 1.0:
+                    rates = (aggregator.frames_received - last_frames) / (now - last_report)
+                    last_frames[:] = aggregator.frames_received
+                    print(f"Points: {len(points):4d} | per-module fps: "
+                          + " ".join(f"{r:5.1f}" for r in rates)
+                          + f" | merge: {1e6 * merge_time / max(merges, 1):.0f}us")
+                    last_report = now
+    except KeyboardInterrupt:
+        print("\n✓ Interrupted by user")
+    finally:
+        for sim in sims:
+            sim.stop()
+        aggregator.disconnect()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,295 @@
+"""
+Incremental 3D occupancy grid built from the VL53L7CX point stream
+
+Each frame's rays are integrated into a log-odds voxel grid: cells along a
+ray up to the return become more likely free, the cell holding the return
+becomes more likely occupied. Ray traversal is done for all rays at once by
+sampling every ray at half-voxel steps and de-duplicating the voxel keys.
+
+Storage is a fixed pool of dense chunks (chunk_cells^3 voxels each) looked up
+through a dict keyed by chunk coordinates, so a whole bay can be mapped at a
+fixed memory ceiling; the least recently used chunk is recycled when the
+pool is full. Returns beyond max_range_mm are dropped, which bounds the
+chunks one frame can touch; the pool must hold at least that many, and
+the chunks of the frame being integrated are pinned against eviction.
+Log-odds decay towards "unknown" over time so obstacles that move away
+fade out. Decay is applied lazily, per chunk, when it is updated; queries
+scale by the pending decay without modifying the map.
+
+Usage:
+    python occupancy_map.py --replay session.vlcap --pose 0,0,0,0
+"""
+
+import argparse
+import math
+import time
+
+import numpy as np
+
+# Voxel keys are packed into one int64: 21 bits per axis, biased to be positive
+_KEY_BITS = 21
+_KEY_BIAS = 1 << (_KEY_BITS - 1)
+_KEY_MASK = (1 << _KEY_BITS) - 1
+
+
+def _pack(idx):
+    biased = idx + _KEY_BIAS
+    return (biased[:, 0] << (2 * _KEY_BITS)) | (biased[:, 1] << _KEY_BITS) | biased[:, 2]
+
+
+def _unpack(keys):
+    idx = np.empty((len(keys), 3), dtype=np.int64)
+    idx[:, 0] = (keys >> (2 * _KEY_BITS)) & _KEY_MASK
+    idx[:, 1] = (keys >> _KEY_BITS) & _KEY_MASK
+    idx[:, 2] = keys & _KEY_MASK
+    return idx - _KEY_BIAS
+
+
+class OccupancyMap:
+    """Chunked log-odds voxel map with constant-time cell access"""
+
+    def __init__(self, resolution_mm=50.0, chunk_cells=16, max_chunks=256,
+                 max_range_mm=1200.0, hit_logodds=0.85, miss_logodds=-0.4,
+                 min_logodds=-2.0, max_logodds=3.5, occupied_logodds=0.85,
+                 decay_per_s=0.05):
+        self.resolution = float(resolution_mm)
+        self.chunk_cells = chunk_cells
+        self.max_chunks = max_chunks
+        self.hit = hit_logodds
+        self.miss = miss_logodds
+        self.min_logodds = min_logodds
+        self.max_logodds = max_logodds
+        self.occupied_logodds = occupied_logodds
+        self.decay_per_s = decay_per_s
+        self.max_range = float(max_range_mm)
+
+        # Every ray lies within max_range of the origin, so a frame touches at
+        # most this many chunks; a smaller pool would evict its own chunks
+        span = 2.0 * self.max_range / self.resolution + 1.0
+        self.frame_chunks = (int(math.ceil(span / chunk_cells)) + 1) ** 3
+        if max_chunks < self.frame_chunks:
+            raise ValueError(f"max_chunks={max_chunks} is below the {self.frame_chunks} chunks "
+                             f"one frame can touch at {resolution_mm:g}mm x {chunk_cells} cells")
+
+        c = chunk_cells
+        self.pool = np.zeros((max_chunks, c, c, c), dtype=np.float32)
+        self.chunk_keys = np.zeros((max_chunks, 3), dtype=np.int64)
+        self.last_used = np.zeros(max_chunks, dtype=np.float64)
+        self.last_decay = np.zeros(max_chunks, dtype=np.float64)
+        self.chunks = {}
+        self._free_slots = list(range(max_chunks - 1, -1, -1))
+
+        # Ray sample distances (half-voxel steps out to max range)
+        step = self.resolution / 2.0
+        self._sample_dist = np.arange(step / 2.0, max_range_mm, step)
+
+        self.frames_integrated = 0
+        self.chunks_evicted = 0
+
+    @property
+    def memory_bytes(self):
+        return self.pool.nbytes
+
+    # ----- chunk management -----
+
+    def _slot_for(self, key, now):
+        """Slot of chunk key for an update: decayed to now, or newly allocated"""
+        slot = self.chunks.get(key)
+        if slot is not None:
+            self._decay_chunk(slot, now)
+            self.last_used[slot] = now
+            return slot
+
+        if self._free_slots:
+            slot = self._free_slots.pop()
+        else:
+            # Recycle the least recently used chunk
+            slot = int(np.argmin(self.last_used))
+            old = tuple(self.chunk_keys[slot])
+            del self.chunks[old]
+            self.chunks_evicted += 1
+        self.pool[slot].fill(0.0)
+        self.chunk_keys[slot] = key
+        self.chunks[key] = slot
+        self.last_used[slot] = now
+        self.last_decay[slot] = now
+        return slot
+
+    def _lookup(self, key, now):
+        """Read-only: (slot, pending decay factor), or (None, 0.0) if unmapped"""
+        slot = self.chunks.get(key)
+        if slot is None:
+            return None, 0.0
+        elapsed = now - self.last_decay[slot]
+        if self.decay_per_s > 0 and elapsed > 0:
+            return slot, math.exp(-self.decay_per_s * elapsed)
+        return slot, 1.0
+
+    def _decay_chunk(self, slot, now):
+        elapsed = now - self.last_decay[slot]
+        if self.decay_per_s > 0 and elapsed > 0:
+            self.pool[slot] *= math.exp(-self.decay_per_s * elapsed)
+        self.last_decay[slot] = now
+
+    def _apply(self, voxel_idx, delta, now):
+        """Add delta (scalar or per voxel) to each unique voxel and clamp"""
+        if len(voxel_idx) == 0:
+            return
+        c = self.chunk_cells
+        chunk_idx = voxel_idx // c
+        local = voxel_idx - chunk_idx * c
+
+        chunk_keys, inverse = np.unique(_pack(chunk_idx), return_inverse=True)
+        if len(chunk_keys) > self.max_chunks:
+            raise ValueError(f"update spans {len(chunk_keys)} chunks, pool holds {self.max_chunks}")
+        slots = np.empty(len(chunk_keys), dtype=np.int64)
+        for i, k in enumerate(_unpack(chunk_keys)):
+            slots[i] = self._slot_for(tuple(k), now)
+            # Pinned: LRU eviction must not hand this slot to a later chunk
+            self.last_used[slots[i]] = math.inf
+        self.last_used[slots] = now
+        cell_slots = slots[inverse.ravel()]
+
+        index = (cell_slots, local[:, 0], local[:, 1], local[:, 2])
+        values = self.pool[index] + delta
+        np.clip(values, self.min_logodds, self.max_logodds, out=values)
+        self.pool[index] = values
+
+    # ----- integration -----
+
+    def voxel_of(self, points):
+        return np.floor(np.asarray(points, dtype=np.float64) / self.resolution).astype(np.int64)
+
+    def integrate(self, origin, points, now=None):
+        """
+        Integrate one frame: origin (3,) sensor position, points (M, 3)
+        returns, both in the map frame (mm).
+        """
+        now = time.monotonic() if now is None else now
+        points = np.asarray(points, dtype=np.float64)
+        origin = np.asarray(origin, dtype=np.float64)
+
+        rays = points - origin
+        length = np.sqrt(np.einsum('ij,ij->i', rays, rays))
+        in_range = length <= self.max_range
+        if not in_range.all():
+            points, rays, length = points[in_range], rays[in_range], length[in_range]
+        if len(points) == 0:
+            return
+        unit = rays / np.maximum(length, 1e-9)[:, np.newaxis]
+
+        # Free space: every sample short of the last voxel before the return
+        dist = self._sample_dist
+        free = dist[np.newaxis, :] < (length - self.resolution)[:, np.newaxis]
+        ray_id, sample_id = np.nonzero(free)
+        samples = origin + unit[ray_id] * dist[sample_id][:, np.newaxis]
+
+        hit_keys = np.unique(_pack(self.voxel_of(points)))
+        free_keys = np.unique(_pack(self.voxel_of(samples)))
+        free_keys = free_keys[~np.isin(free_keys, hit_keys, assume_unique=True)]
+
+        # One update, so the whole frame's chunks are pinned together
+        delta = np.full(len(free_keys) + len(hit_keys), self.hit, dtype=np.float32)
+        delta[:len(free_keys)] = self.miss
+        self._apply(_unpack(np.concatenate((free_keys, hit_keys))), delta, now)
+        self.frames_integrated += 1
+
+    # ----- queries -----
+
+    def logodds_at(self, point, now=None):
+        """Log-odds of the cell holding point (0 = unknown)"""
+        now = time.monotonic() if now is None else now
+        idx = self.voxel_of(point)
+        chunk = tuple(int(v) for v in idx // self.chunk_cells)
+        slot, decay = self._lookup(chunk, now)
+        if slot is None:
+            return 0.0
+        lx, ly, lz = idx - np.array(chunk) * self.chunk_cells
+        return float(self.pool[slot, lx, ly, lz]) * decay
+
+    def box_occupied(self, box_min, box_max, now=None):
+        """True if any cell overlapping the axis-aligned box is occupied"""
+        now = time.monotonic() if now is None else now
+        c = self.chunk_cells
+        lo = self.voxel_of(box_min)
+        hi = self.voxel_of(box_max)
+        chunk_lo = lo // c
+        chunk_hi = hi // c
+
+        for cx in range(chunk_lo[0], chunk_hi[0] + 1):
+            for cy in range(chunk_lo[1], chunk_hi[1] + 1):
+                for cz in range(chunk_lo[2], chunk_hi[2] + 1):
+                    slot, decay = self._lookup((cx, cy, cz), now)
+                    if slot is None:
+                        continue
+                    base = np.array((cx, cy, cz)) * c
+                    a = np.maximum(lo - base, 0)
+                    b = np.minimum(hi - base, c - 1) + 1
+                    cells = self.pool[slot, a[0]:b[0], a[1]:b[1], a[2]:b[2]]
+                    if decay * cells.max() > self.occupied_logodds:
+                        return True
+        return False
+
+    def occupied_points(self):
+        """Centres (mm) of every occupied cell, for display"""
+        slots = np.fromiter(self.chunks.values(), dtype=np.int64, count=len(self.chunks))
+        if len(slots) == 0:
+            return np.empty((0, 3))
+        s, x, y, z = np.nonzero(self.pool[slots] > self.occupied_logodds)
+        cells = self.chunk_keys[slots[s]] * self.chunk_cells + np.stack((x, y, z), axis=1)
+        return (cells + 0.5) * self.resolution
+
+
+def main():
+    from multi_sensor import ModulePose
+    from vl53l7cx_mapper import LowLatencyMapper
+
+    parser = argparse.ArgumentParser(description='Build an occupancy map from a capture')
+    parser.add_argument('--replay', type=str, required=True, metavar='FILE')
+    parser.add_argument('--pose', type=str, default='0,0,0,0',
+                        help='Module pose in the map frame: x,y,z,yaw (mm, deg)')
+    parser.add_argument('--resolution', type=float, default=50.0, help='Voxel size (mm)')
+    parser.add_argument('--max-chunks', type=int, default=256)
+    parser.add_argument('--box', type=str, metavar='x0,y0,z0,x1,y1,z1',
+                        help='Report whether anything is occupied in this box')
+    args = parser.parse_args()
+
+    from capture import CaptureReader
+    reader = CaptureReader(args.replay)
+    grid_size = reader.grid_size
+    reader.close()
+
+    pose = ModulePose.parse(args.pose)
+    rotation = pose.rotation()
+    origin = pose.origin()
+
+    mapper = LowLatencyMapper('replay', grid_size=grid_size)
+    mapper.open_replay(args.replay, speed=0)
+    occupancy = OccupancyMap(args.resolution, max_chunks=args.max_chunks)
+
+    start = time.perf_counter()
+    conn = mapper.serial_conn
+    while True:
+        before = mapper.frame_count
+        mapper.read_frame_fast()
+        if mapper.frame_count == before:
+            if conn.finished and conn.in_waiting == 0:
+                break
+            continue
+        points = mapper.get_point_cloud_fast() @ rotation.T + origin
+        occupancy.integrate(origin, points)
+    elapsed = time.perf_counter() - start
+
+    print(f"Frames:     {occupancy.frames_integrated} "
+          f"({occupancy.frames_integrated / max(elapsed, 1e-9):.0f} frames/s)")
+    print(f"Chunks:     {len(occupancy.chunks)}/{occupancy.max_chunks} "
+          f"(evicted {occupancy.chunks_evicted}, {occupancy.memory_bytes / 1e6:.1f} MB pool)")
+    print(f"Occupied:   {len(occupancy.occupied_points())} cells")
+    if args.box:
+        values = [float(v) for v in args.box.split(',')]
+        hit = occupancy.box_occupied(values[:3], values[3:])
+        print(f"Box {args.box}: {'OCCUPIED' if hit else 'clear'}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""
+Vectorized point-cloud engine for the VL53L7CX zone grid
+
+Zone angles never change for a given grid size and FOV, so the unit
+direction of every zone is computed once and cached. A frame then becomes
+a single broadcast multiply into a preallocated buffer, followed by a
+compress of the valid rows.
+
+Sensor frame (same convention as the original per-zone loop):
+    x = d * sin(h)              h = horizontal zone angle (column)
+    y = d * sin(v)              v = vertical zone angle (row)
+    z = d * cos(h) * cos(v)
+"""
+
+from functools import lru_cache
+
+import numpy as np
+
+DEFAULT_FOV_DEG = 45.0
+
+
+@lru_cache(maxsize=None)
+def direction_lut(grid_size, fov_deg=DEFAULT_FOV_DEG):
+    """(grid_size*grid_size, 3) read-only unit directions, row-major zones"""
+    angle_step = fov_deg / grid_size
+    start_angle = -fov_deg / 2.0
+    centers = np.radians(start_angle + (np.arange(grid_size) + 0.5) * angle_step)
+
+    angle_h = centers[np.newaxis, :]   # varies along columns
+    angle_v = centers[:, np.newaxis]   # varies along rows
+
+    dirs = np.empty((grid_size, grid_size, 3), dtype=np.float64)
+    dirs[..., 0] = np.sin(angle_h)
+    dirs[..., 1] = np.sin(angle_v)
+    dirs[..., 2] = np.cos(angle_h) * np.cos(angle_v)
+
+    dirs = dirs.reshape(-1, 3)
+    dirs.setflags(write=False)
+    return dirs
+
+
+class PointCloudEngine:
+    """Per-grid point-cloud conversion with preallocated output"""
+
+    def __init__(self, grid_size, fov_deg=DEFAULT_FOV_DEG):
+        self.grid_size = grid_size
+        self.fov_deg = fov_deg
+        self.n_zones = grid_size * grid_size
+        self.directions = direction_lut(grid_size, fov_deg)
+
+        self._full = np.empty((self.n_zones, 3), dtype=np.float64)
+        self._out = np.empty((self.n_zones, 3), dtype=np.float64)
+
+    def compute(self, distance_map, valid_mask):
+        """
+        (n_valid, 3) points for one frame.
+        The result is a view into an internal buffer and is overwritten by
+        the next call - copy it if it has to outlive the frame.
+        """
+        np.multiply(self.directions, distance_map.reshape(-1, 1), out=self._full)
+        mask = valid_mask.reshape(-1)
+        n_valid = np.count_nonzero(mask)
+        return np.compress(mask, self._full, axis=0, out=self._out[:n_valid])
+
+    def compute_full(self, distance_map, out=None):
+        """(n_zones, 3) points for every zone, valid or not"""
+        if out is None:
+            out = np.empty((self.n_zones, 3), dtype=np.float64)
+        return np.multiply(self.directions, distance_map.reshape(-1, 1), out=out)
+
+    def compute_batch(self, distances, valid=None, out=None):
+        """
+        Convert N stacked frames at once for offline work.
+        distances: (N, grid, grid); valid: optional (N, grid, grid) bool.
+        Returns (N, n_zones, 3) with invalid zones set to NaN.
+        """
+        distances = np.asarray(distances)
+        n_frames = distances.shape[0]
+        if out is None:
+            out = np.empty((n_frames, self.n_zones, 3), dtype=np.float64)
+        np.multiply(self.directions[np.newaxis],
+                    distances.reshape(n_frames, -1, 1), out=out)
+        if valid is not None:
+            out[~np.asarray(valid).reshape(n_frames, -1)] = np.nan
+        return out
@@ -0,0 +1,273 @@
+"""
+Raster heatmap backend for the VL53L7CX mapper (pygame + NumPy)
+
+Renders the zone grid straight into a packed 32-bit pixel array and blits
+it with pygame.surfarray - no matplotlib artists, no per-cell text.
+Colours come from a precomputed 256-entry lookup table built with the same
+hue ramp as tof_visualizer.proximity_color (red = near, blue = far), so
+colouring a frame is one np.take.
+
+Bilinear upscaling is separable with fixed weights, so it is two small
+matrix products per frame (W x N @ N x N @ N x H). Distances and validity
+are interpolated separately and divided, which keeps invalid zones from
+dragging their neighbours towards zero. Invalid zones are drawn as a
+hatched mask on their (nearest-neighbour) cells.
+
+Usage:
+    python vl53l7cx_mapper.py --port /dev/ttyUSB0 --mode raster
+    python vl53l7cx_mapper.py --port /dev/ttyUSB0 --mode raster --no-interpolate
+    python raster_view.py --grid 8 --frames 2000      # offscreen render benchmark
+
+Keys: [I] toggle interpolation, [Esc] quit.
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from clock_sync import LatencyTracker
+
+RANGE_MIN_MM = 10
+RANGE_MAX_MM = 1180
+LUT_LEVELS = 256
+HATCH_COLORS = ((28, 28, 28), (75, 75, 75))   # background, stripe
+HATCH_PERIOD = 8
+HATCH_WIDTH = 3
+
+
+def proximity_lut(levels=LUT_LEVELS):
+    """(levels, 3) uint8: hue 0 (red, nearest) -> 240 (blue, farthest), s=0.95, v=1"""
+    h = np.linspace(0.0, 240.0, levels)
+    s, v = 0.95, 1.0
+    c = v * s
+    x = c * (1 - np.abs((h / 60) % 2 - 1))
+    m = v - c
+    zero = np.zeros_like(h)
+    sector = np.minimum((h // 60).astype(int), 5)
+    rgb = np.select(
+        [sector[:, None] == k for k in range(6)],
+        [np.stack(t, axis=1) for t in ((c + zero, x, zero), (x, c + zero, zero),
+                                       (zero, c + zero, x), (zero, x, c + zero),
+                                       (x, zero, c + zero), (c + zero, zero, x))])
+    return ((rgb + m) * 255).astype(np.uint8)
+
+
+def _bilinear_matrix(n_out, n_in):
+    """(n_out, n_in) weights sampling n_in cell centres at n_out pixel centres"""
+    src = np.clip((np.arange(n_out) + 0.5) * n_in / n_out - 0.5, 0, n_in - 1)
+    lo = np.floor(src).astype(int)
+    hi = np.minimum(lo + 1, n_in - 1)
+    w = src - lo
+    weights = np.zeros((n_out, n_in), dtype=np.float32)
+    np.add.at(weights, (np.arange(n_out), lo), 1 - w)
+    np.add.at(weights, (np.arange(n_out), hi), w)
+    return weights
+
+
+def pack_rgb(rgb):
+    """(..., 3) uint8 -> uint32 0xRRGGBB, the pixel layout of 24/32-bit surfaces"""
+    rgb = np.asarray(rgb, dtype=np.uint32)
+    return (rgb[..., 0] << 16) | (rgb[..., 1] << 8) | rgb[..., 2]
+
+
+class RasterRenderer:
+    """
+    Zone grid -> (width, height) packed pixels, all buffers preallocated.
+    The mm -> colour-index scaling is done on the N x N grid before
+    upscaling (bilinear weights are convex, so it commutes), leaving one
+    divide, one cast and one LUT gather per output pixel.
+    """
+
+    def __init__(self, grid_size, cell_px=48, interpolate=True, palette=None, hatch=None):
+        self.grid_size = grid_size
+        self.cell_px = cell_px
+        self.interpolate = interpolate
+        self.size = grid_size * cell_px
+        size = self.size
+
+        # palette/hatch: packed uint32 colours, e.g. Surface.map_rgb() values
+        self.palette = pack_rgb(proximity_lut()) if palette is None else palette
+        hatch = pack_rgb(HATCH_COLORS) if hatch is None else hatch
+        self._weights = _bilinear_matrix(size, grid_size)
+        x, y = np.meshgrid(np.arange(size), np.arange(size), indexing='ij')
+        self._hatch = np.where(((x + y) % HATCH_PERIOD) < HATCH_WIDTH, hatch[1], hatch[0]).astype(np.uint32)
+
+        # Every full-size intermediate is preallocated: fresh ~1 MB
+        # temporaries per frame cost more in page faults than the maths
+        self.pixels = np.zeros((size, size), dtype=np.uint32)   # surfarray order: x, y
+        self._index = np.zeros((size, size), dtype=np.uint8)
+        self._invalid = np.zeros((size, size), dtype=bool)
+        self._value = np.zeros((size, size), dtype=np.float32)
+        self._weight = np.zeros((size, size), dtype=np.float32)
+        self._positive = np.zeros((size, size), dtype=bool)
+        self._level = np.zeros((grid_size, grid_size), dtype=np.float32)
+        # (N, cell, N, cell) views for nearest-neighbour broadcasts
+        blocks = (grid_size, cell_px, grid_size, cell_px)
+        self._index_blocks = self._index.reshape(blocks)
+        self._invalid_blocks = self._invalid.reshape(blocks)
+
+    def render(self, distance_map, valid_mask):
+        """Fill and return self.pixels for one frame"""
+        # Transposed so axis 0 is x (column), as surfarray expects
+        valid = valid_mask.T
+        level = self._level
+        np.subtract(distance_map.T, RANGE_MIN_MM, out=level)
+        np.multiply(level, (LUT_LEVELS - 1) / (RANGE_MAX_MM - RANGE_MIN_MM), out=level)
+        np.clip(level, 0, LUT_LEVELS - 1, out=level)
+
+        if self.interpolate:
+            w = self._weights
+            np.matmul(w @ valid.astype(np.float32), w.T, out=self._weight)
+            np.multiply(level, valid, out=level)
+            np.matmul(w @ level, w.T, out=self._value)
+            np.greater(self._weight, 1e-6, out=self._positive)
+            np.divide(self._value, self._weight, out=self._value, where=self._positive)
+            np.copyto(self._index, self._value, casting='unsafe')
+        else:
+            self._index_blocks[...] = level.astype(np.uint8)[:, None, :, None]
+        np.take(self.palette, self._index, out=self.pixels)
+
+        if not valid.all():
+            np.logical_not(valid[:, None, :, None], out=self._invalid_blocks)
+            np.copyto(self.pixels, self._hatch, where=self._invalid)
+        return self.pixels
+
+
+class RasterView:
+    """pygame window drawing the newest frame through RasterRenderer"""
+
+    def __init__(self, mapper, ring=None, cell_px=64, interpolate=True):
+        import pygame
+        self.pygame = pygame
+        self.mapper = mapper
+        self.ring = ring
+        size = mapper.grid_size * cell_px
+        pygame.init()
+        self.screen = pygame.display.set_mode((size, size))
+        self.surface = pygame.Surface((size, size), depth=32)
+        # Packed colours in the surface's own pixel format
+        lut = proximity_lut()
+        self.renderer = RasterRenderer(
+            mapper.grid_size, cell_px, interpolate,
+            palette=np.array([self.surface.map_rgb(*c) for c in lut], dtype=np.uint32),
+            hatch=np.array([self.surface.map_rgb(*c) for c in HATCH_COLORS], dtype=np.uint32))
+
+        # Same ring/no-ring split as FastVisualizer
+        if ring is None:
+            self.distance_map = mapper.distance_map
+            self.valid_mask = mapper.valid_mask
+        else:
+            self.distance_map = np.zeros_like(mapper.distance_map)
+            self.valid_mask = np.zeros_like(mapper.valid_mask)
+
+        self.frame_device_ts = 0
+        self.update_count = 0
+        self.render_time = 0.0
+        self.display_latency = LatencyTracker()
+
+    def next_frame(self):
+        """True when a new frame was taken from the ring / port"""
+        if self.ring is not None:
+            meta = self.ring.take_latest(self.distance_map, self.valid_mask)
+            if meta is None:
+                return False
+            self.frame_device_ts = meta[1]
+            return True
+        if not self.mapper.read_frame_fast():
+            return False
+        self.frame_device_ts = self.mapper.device_timestamp
+        return True
+
+    def draw(self):
+        stage = self.mapper.stage
+        t0 = time.perf_counter()
+        pixels = self.renderer.render(self.distance_map, self.valid_mask)
+        self.pygame.surfarray.blit_array(self.surface, pixels)
+        self.screen.blit(self.surface, (0, 0))
+        self.pygame.display.flip()
+        elapsed = time.perf_counter() - t0
+        if stage is not None:
+            stage['draw'].observe(elapsed)
+        self.render_time += elapsed
+        self.update_count += 1
+        self.display_latency.record(
+            self.mapper.clock.latency_ms(self.frame_device_ts, time.time()))
+
+    def start(self):
+        pygame = self.pygame
+        print(f"\n✓ Starting visualization (mode: raster, "
+              f"interpolate: {self.renderer.interpolate})")
+        print("  Close window to exit\n")
+        last_title = 0.0
+        running = True
+        try:
+            while running:
+                for event in pygame.event.get():
+                    if event.type == pygame.QUIT:
+                        running = False
+                    elif event.type == pygame.KEYDOWN:
+                        if event.key == pygame.K_ESCAPE:
+                            running = False
+                        elif event.key == pygame.K_i:
+                            self.renderer.interpolate = not self.renderer.interpolate
+
+                if self.next_frame():
+                    self.draw()
+                elif self.ring is not None:
+                    time.sleep(0.002)
+                else:
+                    self.mapper.wait_for_data(0.005)
+
+                now = time.time()
+                if now - last_title >= 0.5:
+                    valid = int(np.count_nonzero(self.valid_mask))
+                    pygame.display.set_caption(
+                        f"VL53L7CX raster | FPS: {self.mapper.fps:.1f} | "
+                        f"Valid: {valid}/{self.valid_mask.size} | "
+                        f"display {self.display_latency.summary()}")
+                    last_title = now
+        finally:
+            if self.update_count:
+                print(f"\n✓ Rendered {self.update_count} frames, "
+                      f"{1e3 * self.render_time / self.update_count:.2f}ms each "
+                      f"({self.update_count / max(self.render_time, 1e-9):.0f} FPS headroom)")
+                print(f"  Display latency: {self.display_latency.summary()}")
+            pygame.quit()
+            self.mapper.disconnect()
+
+
+def benchmark(grid_size=8, cell_px=64, frames=2000):
+    """Offscreen render FPS with and without interpolation (pixels only, then + surfarray)"""
+    import pygame
+    rng = np.random.default_rng(0)
+    shape = (grid_size, grid_size)
+    dists = rng.integers(RANGE_MIN_MM, RANGE_MAX_MM, (frames,) + shape).astype(np.int16)
+    valids = rng.random((frames,) + shape) > 0.1
+
+    print(f"\nRaster render ({grid_size}x{grid_size} -> {grid_size * cell_px}px, {frames} frames)")
+    for interpolate in (False, True):
+        renderer = RasterRenderer(grid_size, cell_px, interpolate)
+        surface = pygame.Surface((renderer.size, renderer.size), depth=32)
+        for blit in (False, True):
+            start = time.perf_counter()
+            for i in range(frames):
+                pixels = renderer.render(dists[i], valids[i])
+                if blit:
+                    pygame.surfarray.blit_array(surface, pixels)
+            fps = frames / (time.perf_counter() - start)
+            label = ('bilinear' if interpolate else 'nearest') + (' + blit' if blit else '')
+            print(f"  {label:<18} {fps:8.0f} FPS")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Raster heatmap render benchmark')
+    parser.add_argument('--grid', type=int, default=8, choices=[4, 8])
+    parser.add_argument('--cell', type=int, default=64, help='Pixels per zone')
+    parser.add_argument('--frames', type=int, default=2000)
+    args = parser.parse_args()
+    benchmark(args.grid, args.cell, args.frames)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,394 @@
+"""
+Safety zone evaluation with time-to-collision
+
+Zones are polygons (or boxes) in the lift frame with a z band and a level:
+the lift footprint itself (points inside it are the lift's own structure and
+are ignored, like the firmware self-mask), then nested warning and stop
+zones. Every frame, all points are tested against all zones in one
+broadcast crossing-number pass, and each point's clearance to the footprint
+is compared with the same point (same module, same zone) in the previous
+frame to get closing speed and time-to-collision.
+
+The alert level rises immediately and only falls after `hold_frames` quieter
+frames, the host-side equivalent of the firmware's SLOW_HOLD_POINTS.
+
+The firmware's own decision (d_eff scaling and target status checks in
+VL53L7CX_ScissorLift_Safety.ino) is mirrored by effective_distance() and
+firmware_threat(), so sweep lines can be cross-checked with check_sweep_line().
+
+Usage:
+    python safety_zones.py --simulate 4       # 4 pty modules, print alerts
+"""
+
+import argparse
+import math
+import time
+
+import numpy as np
+
+# Alert levels (zone levels use the same scale)
+CLEAR = 0
+WARNING = 1
+STOP = 2
+FOOTPRINT = -1
+LEVEL_NAMES = {CLEAR: 'CLEAR', WARNING: 'WARNING', STOP: 'STOP'}
+
+# Firmware constants (VL53L7CX_ScissorLift_Safety.ino)
+BASE_THRESHOLD_MM = 200.0
+MAX_RANGE_MM = 3500.0
+SIN_CLAMP_MIN = 0.25
+DEADBAND_DEG = 5.0
+SELF_MASK_X_MAX = 300.0
+SELF_MASK_Y_MAX = 300.0
+SELF_MASK_RADIUS_MM = 350.0
+VALID_STATUS = (5, 9)
+SLOW_HOLD_POINTS = 25
+
+# Firmware scan order over the row bands (general 1-6, overhead adds 7, low adds 0);
+# the closest zone is only replaced by a strictly closer one, so ties go to
+# whichever zone comes first in this order
+_FIRMWARE_ROW_ORDER = (1, 2, 3, 4, 5, 6, 7, 0)
+
+
+# ----- firmware mirror -----
+
+def effective_distance(angle_deg, distance_mm):
+    """Vectorized calculateEffectiveDistance(): d_eff for a corner module"""
+    theta = np.mod(np.asarray(angle_deg, dtype=np.float64), 360.0)
+    dist = np.asarray(distance_mm, dtype=np.float64)
+    scale = np.maximum(np.abs(np.sin(np.radians(theta))), SIN_CLAMP_MIN)
+
+    first = (theta <= 90.0) & (theta >= DEADBAND_DEG)
+    third = (theta > 180.0) & (theta <= 270.0) & (np.abs(theta - 180.0) >= DEADBAND_DEG)
+    return np.where(first | third, dist * scale, dist)
+
+
+def status_valid(status):
+    """Target status codes the firmware trusts"""
+    return np.isin(status, VALID_STATUS)
+
+
+def self_masked(x, y, distance_mm):
+    """Vectorized isSelfMasked() (sensor-local x/y in mm)"""
+    in_quadrant = (x >= 0) & (y >= 0)
+    in_rect = in_quadrant & (x <= SELF_MASK_X_MAX) & (y <= SELF_MASK_Y_MAX)
+    return in_rect | (in_quadrant & (distance_mm <= SELF_MASK_RADIUS_MM))
+
+
+def firmware_threat(angle_deg, distance_mm, valid, grid_size=8):
+    """
+    What the firmware decides for one 8x8 frame at one servo angle.
+    Returns (threat, zone, distance_mm, d_eff); zone is -1 when clear.
+    """
+    order = (np.array(_FIRMWARE_ROW_ORDER)[:, np.newaxis] * grid_size +
+             np.arange(grid_size)).ravel()
+    dist = np.asarray(distance_mm, dtype=np.float64).ravel()[order]
+    ok = np.asarray(valid, dtype=bool).ravel()[order]
+    ok &= (dist > 0) & (dist <= MAX_RANGE_MM)
+
+    rad = math.radians(angle_deg)
+    ok &= ~self_masked(dist * math.cos(rad), dist * math.sin(rad), dist)
+    d_eff = effective_distance(angle_deg, dist)
+    threat = ok & (d_eff <= BASE_THRESHOLD_MM)
+    if not threat.any():
+        return False, -1, 0.0, 0.0
+
+    candidates = np.where(threat, dist, np.inf)
+    best = int(np.argmin(candidates))
+    return True, int(order[best]), float(dist[best]), float(d_eff[best])
+
+
+def check_sweep_line(line, tolerance_mm=1.0):
+    """
+    Recompute d_eff, x and y of one 'angle,zone,dist_mm,x,y,d_eff,status'
+    line. Returns a list of the fields that disagree (empty if consistent).
+    """
+    fields = line.strip().split(',')
+    if len(fields) != 7:
+        raise ValueError(f"Expected 7 fields: {line!r}")
+    angle, zone, dist, x, y, d_eff, status = (float(v) for v in fields)
+    if zone < 0:
+        return []
+
+    mismatched = []
+    rad = math.radians(angle)
+    if abs(dist * math.cos(rad) - x) > tolerance_mm:
+        mismatched.append('x')
+    if abs(dist * math.sin(rad) - y) > tolerance_mm:
+        mismatched.append('y')
+    if abs(float(effective_distance(angle, dist)) - d_eff) > tolerance_mm:
+        mismatched.append('d_eff')
+    if d_eff > BASE_THRESHOLD_MM:
+        mismatched.append('threshold')
+    if int(status) not in VALID_STATUS:
+        mismatched.append('status')
+    return mismatched
+
+
+# ----- zones -----
+
+class SafetyZone:
+    """Polygon (XY, lift frame mm) extruded over [z_min, z_max]"""
+
+    __slots__ = ('name', 'level', 'polygon', 'z_min', 'z_max')
+
+    def __init__(self, name, level, polygon, z_min=-math.inf, z_max=math.inf):
+        self.name = name
+        self.level = level
+        self.polygon = np.asarray(polygon, dtype=np.float64)
+        self.z_min = z_min
+        self.z_max = z_max
+
+    @classmethod
+    def box(cls, name, level, x_min, x_max, y_min, y_max, z_min=-math.inf, z_max=math.inf):
+        polygon = [(x_min, y_min), (x_max, y_min), (x_max, y_max), (x_min, y_max)]
+        return cls(name, level, polygon, z_min, z_max)
+
+    def __repr__(self):
+        return f"SafetyZone({self.name!r}, {LEVEL_NAMES.get(self.level, 'FOOTPRINT')}, {len(self.polygon)} vertices)"
+
+
+def lift_zones(length_mm=2270.0, width_mm=810.0, stop_margin_mm=BASE_THRESHOLD_MM,
+               warning_margin_mm=600.0):
+    """Footprint plus nested stop and warning boxes around it"""
+    hl, hw = length_mm / 2.0, width_mm / 2.0
+    s, w = stop_margin_mm, warning_margin_mm
+    return [
+        SafetyZone.box('footprint', FOOTPRINT, -hl, hl, -hw, hw),
+        SafetyZone.box('stop', STOP, -hl - s, hl + s, -hw - s, hw + s),
+        SafetyZone.box('warning', WARNING, -hl - w, hl + w, -hw - w, hw + w),
+    ]
+
+
+class SafetyAlert:
+    """Compact per-frame result"""
+
+    __slots__ = ('level', 'raw_level', 'zone', 'nearest_mm', 'ttc_s',
+                 'closing_mm_s', 'n_points', 'timestamp')
+
+    def __init__(self):
+        self.level = CLEAR
+        self.raw_level = CLEAR
+        self.zone = None
+        self.nearest_mm = math.inf
+        self.ttc_s = math.inf
+        self.closing_mm_s = 0.0
+        self.n_points = 0
+        self.timestamp = 0.0
+
+    def __repr__(self):
+        return (f"{LEVEL_NAMES[self.level]:<7} zone={self.zone} nearest={self.nearest_mm:.0f}mm "
+                f"ttc={self.ttc_s:.2f}s closing={self.closing_mm_s:.0f}mm/s")
+
+
+class SafetyEngine:
+    """Classifies each frame's points against all zones and tracks closing speed"""
+
+    def __init__(self, zones, ttc_warning_s=1.5, ttc_stop_s=0.5,
+                 min_closing_mm_s=50.0, closing_alpha=0.3, hold_frames=SLOW_HOLD_POINTS):
+        self.zones = list(zones)
+        self.ttc_warning_s = ttc_warning_s
+        self.ttc_stop_s = ttc_stop_s
+        self.min_closing_mm_s = min_closing_mm_s
+        self.closing_alpha = closing_alpha
+        self.hold_frames = hold_frames
+
+        # Polygons padded to a common vertex count by repeating the last
+        # vertex (zero-length edges never count as crossings)
+        n_vertices = max(len(z.polygon) for z in self.zones)
+        padded = np.stack([
+            np.concatenate([z.polygon, np.repeat(z.polygon[-1:], n_vertices - len(z.polygon), axis=0)])
+            for z in self.zones])
+        self._xi, self._yi = padded[:, :, 0], padded[:, :, 1]
+        self._xj, self._yj = np.roll(self._xi, 1, axis=1), np.roll(self._yi, 1, axis=1)
+        dy = self._yj - self._yi
+        self._dxdy = (self._xj - self._xi) / np.where(dy != 0, dy, 1.0)
+        self._z_min = np.array([z.z_min for z in self.zones])
+        self._z_max = np.array([z.z_max for z in self.zones])
+        self.levels = np.array([z.level for z in self.zones])
+
+        footprints = [z for z in self.zones if z.level == FOOTPRINT]
+        if len(footprints) != 1:
+            raise ValueError("Exactly one footprint zone is required")
+        poly = footprints[0].polygon
+        self._edge_a = poly
+        self._edge_d = np.roll(poly, -1, axis=0) - poly
+        self._edge_len2 = np.maximum(np.einsum('ij,ij->i', self._edge_d, self._edge_d), 1e-12)
+        self._footprint = self.zones.index(footprints[0])
+
+        self._prev_clearance = None
+        self._prev_closing = None
+        self._prev_live = None
+        self._prev_time = None
+        self._hold = 0
+        self.alert = SafetyAlert()
+        self.frames = 0
+
+    def reset(self):
+        self._prev_clearance = None
+        self._prev_time = None
+        self._hold = 0
+        self.alert = SafetyAlert()
+
+    def classify(self, points):
+        """(M, 3) points -> (M, K) bool, point inside zone k"""
+        px = points[:, 0, np.newaxis, np.newaxis]
+        py = points[:, 1, np.newaxis, np.newaxis]
+        crosses = (self._yi > py) != (self._yj > py)
+        x_cross = self._dxdy * (py - self._yi) + self._xi
+        inside = np.count_nonzero(crosses & (px < x_cross), axis=2) & 1
+        z = points[:, 2, np.newaxis]
+        return inside.astype(bool) & (z >= self._z_min) & (z <= self._z_max)
+
+    def clearance(self, points):
+        """XY distance (mm) from each point to the footprint outline"""
+        rel = points[:, np.newaxis, :2] - self._edge_a
+        t = np.clip(np.einsum('mij,ij->mi', rel, self._edge_d) / self._edge_len2, 0.0, 1.0)
+        gap = rel - t[:, :, np.newaxis] * self._edge_d
+        return np.sqrt(np.einsum('mij,mij->mi', gap, gap).min(axis=1))
+
+    def evaluate(self, points, valid, timestamp=None):
+        """
+        points: (..., 3) lift-frame mm in a fixed layout (e.g. modules x zones)
+        so the same index means the same zone from frame to frame.
+        valid: matching bool mask. Returns the updated SafetyAlert.
+        """
+        timestamp = time.time() if timestamp is None else timestamp
+        flat = points.reshape(-1, 3)
+        valid = valid.reshape(-1)
+
+        inside = self.classify(flat)
+        own = inside[:, self._footprint]
+        live = valid & ~own
+        inside &= live[:, np.newaxis]
+
+        clearance = self.clearance(flat)
+        # Closing speed per point, EMA-smoothed so single-frame range noise
+        # (~10 mm at 60 Hz is ~600 mm/s) does not read as an approach
+        closing = np.zeros(len(flat))
+        if self._prev_clearance is not None and timestamp > self._prev_time:
+            seen = live & self._prev_live
+            speed = (self._prev_clearance[seen] - clearance[seen]) / (timestamp - self._prev_time)
+            a = self.closing_alpha
+            closing[seen] = a * speed + (1.0 - a) * self._prev_closing[seen]
+        approaching = closing > self.min_closing_mm_s
+        ttc = np.full(len(flat), np.inf)
+        ttc[approaching] = clearance[approaching] / closing[approaching]
+
+        self._prev_clearance = clearance
+        self._prev_closing = closing
+        self._prev_live = live
+        self._prev_time = timestamp
+
+        # Zone level per point, then TTC can escalate it
+        point_level = np.where(inside, self.levels, CLEAR).max(axis=1, initial=CLEAR)
+        point_level = np.where(live & (ttc < self.ttc_warning_s), np.maximum(point_level, WARNING), point_level)
+        point_level = np.where(live & (ttc < self.ttc_stop_s), STOP, point_level)
+
+        alert = self.alert
+        alert.timestamp = timestamp
+        alert.n_points = int(np.count_nonzero(live))
+        alert.raw_level = int(point_level.max(initial=CLEAR))
+        if alert.n_points:
+            nearest = int(np.argmin(np.where(live, clearance, np.inf)))
+            alert.nearest_mm = float(clearance[nearest])
+            worst = int(np.argmin(np.where(live, ttc, np.inf)))
+            alert.ttc_s = float(ttc[worst])
+            alert.closing_mm_s = float(closing[worst]) if approaching[worst] else 0.0
+            hits = inside[nearest] & (self.levels > CLEAR)
+            alert.zone = self.zones[int(np.argmax(np.where(hits, self.levels, -2)))].name if hits.any() else None
+        else:
+            alert.nearest_mm, alert.ttc_s, alert.closing_mm_s, alert.zone = math.inf, math.inf, 0.0, None
+
+        # Hysteresis: rise now, fall only after hold_frames quieter frames
+        if alert.raw_level >= alert.level:
+            alert.level = alert.raw_level
+            self._hold = self.hold_frames
+        else:
+            self._hold -= 1
+            if self._hold <= 0:
+                alert.level = alert.raw_level
+                self._hold = self.hold_frames
+
+        self.frames += 1
+        return alert
+
+    def listener(self, pose, on_alert=None):
+        """
+        IngestThread listener for a single module mounted at `pose`
+        (anything with rotation() and origin(), e.g. multi_sensor.ModulePose).
+        on_alert(alert) is called whenever the alert level changes.
+        """
+        rotation = pose.rotation().T
+        origin = pose.origin()
+        points = None
+        last_level = [CLEAR]
+
+        def callback(mapper):
+            nonlocal points
+            cloud = mapper.point_cloud.compute_full(mapper.distance_map)
+            if points is None:
+                points = np.empty_like(cloud)
+            np.matmul(cloud, rotation, out=points)
+            points += origin
+            alert = self.evaluate(points, mapper.valid_mask, mapper.last_frame_time)
+            if on_alert is not None and alert.level != last_level[0]:
+                on_alert(alert)
+            last_level[0] = alert.level
+
+        return callback
+
+
+def main():
+    from multi_sensor import LIFT_LENGTH_MM, LIFT_WIDTH_MM, MultiSensorAggregator, corner_poses
+    from virtual_serial import SimulatedSensor
+
+    parser = argparse.ArgumentParser(description='Safety zone evaluation on simulated modules')
+    parser.add_argument('--simulate', type=int, default=4, metavar='N')
+    parser.add_argument('--grid', type=int, default=8, choices=[4, 8])
+    parser.add_argument('--rate', type=float, default=60.0)
+    parser.add_argument('--stop-margin', type=float, default=BASE_THRESHOLD_MM)
+    parser.add_argument('--warning-margin', type=float, default=600.0)
+    parser.add_argument('--max-age', type=float, default=0.25,
+                        help='Ignore modules whose last frame is older than this (s)')
+    args = parser.parse_args()
+
+    poses = corner_poses()
+    sims = [SimulatedSensor(args.grid, args.rate, seed=i, phase=i * 0.7) for i in range(args.simulate)]
+    aggregator = MultiSensorAggregator(
+        [(sim.port, poses[i % len(poses)]) for i, sim in enumerate(sims)], grid_size=args.grid)
+    engine = SafetyEngine(lift_zones(LIFT_LENGTH_MM, LIFT_WIDTH_MM, args.stop_margin, args.warning_margin))
+
+    if not aggregator.connect():
+        aggregator.disconnect()
+        return
+    for sim in sims:
+        sim.start()
+
+    last_level = CLEAR
+    eval_time = 0.0
+    last_report = time.time()
+    try:
+        while True:
+            if not aggregator.poll(0.01):
+                continue
+            aggregator.merged_cloud()
+            t0 = time.perf_counter()
+            alert = engine.evaluate(aggregator.points, aggregator.live_mask(args.max_age))
+            eval_time += time.perf_counter() - t0
+            if alert.level != last_level:
+                print(f"⚠️ {alert}" if alert.level else f"✓ {alert}")
+                last_level = alert.level
+            if time.time() - last_report >= 1.0:
+                print(f"  {engine.frames} evaluations | {1e6 * eval_time / engine.frames:.0f}us each")
+                last_report = time.time()
+    except KeyboardInterrupt:
+        print("\n✓ Interrupted by user")
+    finally:
+        for sim in sims:
+            sim.stop()
+        aggregator.disconnect()
+
+
+if __name__ == '__main__':
+    main()
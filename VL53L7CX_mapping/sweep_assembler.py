@@ -0,0 +1,304 @@
+"""
+Panoramic sweep assembler for the scanning VL53L7CX corner module
+
+VL53L7CX_ScissorLift_Safety.ino steps a 270° servo and prints one line per
+step:
+
+    angle,zone,dist_mm,x,y,d_eff,status      closest threatening zone
+    angle,-1,0,0,0,0,0                       nothing inside the threshold
+
+SweepAssembler keeps a rolling panorama indexed by (angle bin, zone) in
+preallocated arrays. Each line rewrites only its own angle slice, and
+slice listeners are told which bin changed, so consumers never rebuild the
+whole panorama per line. The firmware reverses at both ends of its sweep;
+a change of direction (or a jump larger than max_step_deg, e.g. a reboot)
+closes the current sweep, which is then published as one array.
+
+Usage:
+    python sweep_assembler.py --port /dev/ttyUSB0
+    python sweep_assembler.py --simulate 6
+"""
+
+import argparse
+import math
+import time
+
+import numpy as np
+
+SWEEP_START_DEG = 0.0
+SWEEP_END_DEG = 270.0
+N_ZONES = 64
+CLEAR_ZONE = -1
+
+
+def parse_sweep_line(line, n_zones=N_ZONES):
+    """
+    'angle,zone,dist,x,y,d_eff,status' -> (angle, zone, dist, d_eff, status),
+    or None for anything malformed: a non-finite angle or distance, or a zone
+    outside [-1, n_zones)
+    """
+    fields = line.split(b',') if isinstance(line, bytes) else line.split(',')
+    if len(fields) != 7:
+        return None
+    try:
+        angle = float(fields[0])
+        zone = int(fields[1])
+        dist = float(fields[2])
+        d_eff = float(fields[5])
+        status = int(fields[6])
+    except ValueError:
+        return None
+    if not (math.isfinite(angle) and math.isfinite(dist)) or not CLEAR_ZONE <= zone < n_zones:
+        return None
+    return angle, zone, dist, d_eff, status
+
+
+class Sweep:
+    """One completed pass of the servo, published as whole arrays"""
+
+    __slots__ = ('index', 'direction', 'start_time', 'end_time',
+                 'distance', 'd_eff', 'covered', 'lines')
+
+    def __init__(self, n_bins, n_zones):
+        self.index = -1
+        self.direction = 0
+        self.start_time = 0.0
+        self.end_time = 0.0
+        self.distance = np.full((n_bins, n_zones), np.nan, dtype=np.float32)
+        self.d_eff = np.full(n_bins, np.nan, dtype=np.float32)
+        self.covered = np.zeros(n_bins, dtype=bool)
+        self.lines = 0
+
+    @property
+    def duration(self):
+        return self.end_time - self.start_time
+
+    def nearest(self, angles):
+        """(angle_deg, zone, dist_mm) of the closest return, or None if clear"""
+        if np.isnan(self.distance).all():
+            return None
+        flat = int(np.nanargmin(self.distance))
+        b, z = divmod(flat, self.distance.shape[1])
+        return float(angles[b]), z, float(self.distance[b, z])
+
+
+class SweepAssembler:
+    """Rolling (angle bin x zone) panorama with sweep boundary detection"""
+
+    def __init__(self, angle_res_deg=1.0, angle_min=SWEEP_START_DEG, angle_max=SWEEP_END_DEG,
+                 n_zones=N_ZONES, max_step_deg=15.0):
+        self.res = angle_res_deg
+        self.angle_min = angle_min
+        self.n_bins = int(round((angle_max - angle_min) / angle_res_deg)) + 1
+        self.n_zones = n_zones
+        self.max_step_deg = max_step_deg
+        self.angles = angle_min + np.arange(self.n_bins) * angle_res_deg
+
+        # Rolling panorama: NaN = no return in that cell at the last visit
+        self.distance = np.full((self.n_bins, n_zones), np.nan, dtype=np.float32)
+        self.d_eff = np.full(self.n_bins, np.nan, dtype=np.float32)
+        self.zone = np.full(self.n_bins, CLEAR_ZONE, dtype=np.int16)
+        self.status = np.zeros(self.n_bins, dtype=np.uint8)
+        self.stamp = np.zeros(self.n_bins, dtype=np.float64)
+        self.visited = np.zeros(self.n_bins, dtype=bool)
+
+        # Sweep being built, and the last completed one (swapped, never reallocated)
+        self._current = Sweep(self.n_bins, n_zones)
+        self.latest = Sweep(self.n_bins, n_zones)
+        self.sweeps_completed = 0
+        self.direction = 0
+        self.reversals = 0
+        self._last_angle = None
+
+        self.lines = 0
+        self.bad_lines = 0
+        self._rx = bytearray()
+
+        self.slice_listeners = []
+        self.sweep_listeners = []
+
+    def bin_of(self, angle_deg):
+        b = int(round((angle_deg - self.angle_min) / self.res))
+        return min(max(b, 0), self.n_bins - 1)
+
+    # ----- sweep boundaries -----
+
+    def _close_sweep(self, now):
+        sweep = self._current
+        if sweep.lines == 0:
+            return
+        sweep.end_time = now
+        sweep.index = self.sweeps_completed
+        self.sweeps_completed += 1
+        self._current, self.latest = self.latest, sweep
+
+        nxt = self._current
+        nxt.distance.fill(np.nan)
+        nxt.d_eff.fill(np.nan)
+        nxt.covered.fill(False)
+        nxt.lines = 0
+        nxt.start_time = now
+
+        for callback in self.sweep_listeners:
+            callback(sweep)
+
+    def _track_direction(self, angle, now):
+        last = self._last_angle
+        self._last_angle = angle
+        if last is None:
+            self._current.start_time = now
+            return
+        step = angle - last
+        if step == 0:
+            return
+        direction = 1 if step > 0 else -1
+        if abs(step) > self.max_step_deg:
+            # Servo jumped (restart / resync): not a real sweep boundary turn
+            self._close_sweep(now)
+            self.direction = 0
+            return
+        if self.direction and direction != self.direction:
+            self.reversals += 1
+            self._close_sweep(now)
+        self.direction = direction
+        self._current.direction = direction
+
+    # ----- ingest -----
+
+    def add(self, angle, zone, dist, d_eff=math.nan, status=0, now=None):
+        """Apply one reading; returns the angle bin whose slice changed"""
+        now = time.monotonic() if now is None else now
+        self._track_direction(angle, now)
+        b = self.bin_of(angle)
+
+        # The line describes this whole angle: every other zone had no threat
+        row = self.distance[b]
+        row.fill(np.nan)
+        if zone >= 0:
+            row[zone] = dist
+        self.d_eff[b] = d_eff if zone >= 0 else np.nan
+        self.zone[b] = zone
+        self.status[b] = status
+        self.stamp[b] = now
+        self.visited[b] = True
+
+        sweep = self._current
+        sweep.distance[b] = row
+        sweep.d_eff[b] = self.d_eff[b]
+        sweep.covered[b] = True
+        sweep.lines += 1
+        self.lines += 1
+
+        for callback in self.slice_listeners:
+            callback(b, self)
+        return b
+
+    def feed_line(self, line, now=None):
+        reading = parse_sweep_line(line.strip(), self.n_zones)
+        if reading is None:
+            self.bad_lines += 1
+            return None
+        return self.add(*reading, now=now)
+
+    def feed(self, data, now=None):
+        """Bulk bytes from the port; returns the bins updated, in order"""
+        self._rx += data
+        end = self._rx.rfind(b'\n')
+        if end < 0:
+            return []
+        lines = bytes(self._rx[:end]).split(b'\n')
+        del self._rx[:end + 1]
+        updated = []
+        for line in lines:
+            b = self.feed_line(line, now)
+            if b is not None:
+                updated.append(b)
+        return updated
+
+    def age(self, now=None):
+        """Seconds since each angle slice was refreshed (inf if never)"""
+        now = time.monotonic() if now is None else now
+        return np.where(self.visited, now - self.stamp, np.inf)
+
+
+def simulated_stream(n_sweeps=4, seed=0, obstacle_deg=100.0, obstacle_mm=180.0):
+    """Firmware-like lines: 3° steps when clear, 1° steps near the obstacle"""
+    rng = np.random.default_rng(seed)
+    lines = []
+    angle, direction = SWEEP_START_DEG, 1
+    hold = 0
+    sweeps = 0
+    while sweeps < n_sweeps:
+        near = abs(angle - obstacle_deg) < 8
+        if near:
+            dist = obstacle_mm + rng.normal(0, 5)
+            zone = int(rng.integers(8, 56))
+            rad = math.radians(angle)
+            lines.append(f"{angle:.1f},{zone},{dist:.0f},{dist * math.cos(rad):.0f},"
+                         f"{dist * math.sin(rad):.0f},{dist:.1f},5")
+            hold = 25
+        else:
+            lines.append(f"{angle:.1f},-1,0,0,0,0,0")
+            hold = max(hold - 1, 0)
+        angle += direction * (1.0 if hold else 3.0)
+        if angle >= SWEEP_END_DEG:
+            angle, direction = SWEEP_END_DEG, -1
+            sweeps += 1
+        if angle <= SWEEP_START_DEG:
+            angle, direction = SWEEP_START_DEG, 1
+            sweeps += 1
+    return ('\n'.join(lines) + '\n').encode()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Assemble servo sweeps into a panorama')
+    parser.add_argument('--port', type=str, help='Serial port of the scanning module')
+    parser.add_argument('--baudrate', type=int, default=115200)
+    parser.add_argument('--res', type=float, default=1.0, help='Angle bin width (deg)')
+    parser.add_argument('--simulate', type=int, default=0, metavar='N',
+                        help='Assemble N simulated sweeps instead of reading a port')
+    args = parser.parse_args()
+
+    assembler = SweepAssembler(args.res)
+
+    def report(sweep):
+        nearest = sweep.nearest(assembler.angles)
+        where = (f"nearest {nearest[2]:.0f}mm @ {nearest[0]:.0f}° zone {nearest[1]}"
+                 if nearest else "clear")
+        arrow = '→' if sweep.direction > 0 else '←'
+        print(f"Sweep {sweep.index:4d} {arrow} | {sweep.lines:3d} lines | "
+              f"{int(sweep.covered.sum()):3d}/{assembler.n_bins} bins | {where}")
+
+    assembler.sweep_listeners.append(report)
+
+    if args.simulate:
+        data = simulated_stream(args.simulate)
+        start = time.perf_counter()
+        for i, line in enumerate(data.splitlines()):
+            assembler.feed_line(line, now=i * 0.02)
+        elapsed = time.perf_counter() - start
+        print(f"\n✓ {assembler.lines} lines in {1e3 * elapsed:.1f}ms "
+              f"({1e6 * elapsed / max(assembler.lines, 1):.1f}us/line), "
+              f"{assembler.reversals} reversals")
+        return
+
+    if not args.port:
+        parser.error('give --port or --simulate N')
+
+    import serial
+    ser = serial.Serial(args.port, args.baudrate, timeout=0.05)
+    print(f"✓ Connected: {args.port} @ {args.baudrate} baud")
+    try:
+        while True:
+            waiting = ser.in_waiting
+            assembler.feed(ser.read(waiting or 1))
+    except KeyboardInterrupt:
+        print("\n✓ Interrupted by user")
+    finally:
+        ser.close()
+        print(f"✓ {assembler.sweeps_completed} sweeps, {assembler.lines} lines, "
+              f"{assembler.bad_lines} other lines")
+
+
+if __name__ == '__main__':
+    main()
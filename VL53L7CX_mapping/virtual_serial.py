@@ -0,0 +1,200 @@
+"""
+Pseudo-terminal stand-in for a sensor serial port (POSIX only)
+
+pyserial can open the slave side like any other port, so the mapper,
+recorder and replay tools can be exercised without an ESP32 attached.
+SyntheticFrameGenerator and BytesSerial cover the same ground without a pty
+or a clock, for benchmarks and headless runs.
+"""
+
+import os
+import select
+import threading
+import time
+import tty
+
+import numpy as np
+
+from frame_protocol import encode_frame, encode_ascii_frame
+
+
+class PtySerialStandIn:
+    """Writable end of a pty; `port` is the device path to hand to serial.Serial"""
+
+    def __init__(self, blocking=False):
+        self.blocking = blocking
+        self.master_fd, self.slave_fd = os.openpty()
+        # Raw mode: no newline translation or echo on the slave side
+        tty.setraw(self.slave_fd)
+        os.set_blocking(self.master_fd, False)
+        self.port = os.ttyname(self.slave_fd)
+        self.bytes_written = 0
+        self.bytes_dropped = 0
+
+    def write(self, data):
+        """
+        Like a real UART, bytes the reader has not drained in time are
+        dropped rather than stalling the sender. With blocking=True (used
+        for replay) the writer waits for the reader instead.
+        """
+        view = memoryview(data)
+        while view:
+            try:
+                n = os.write(self.master_fd, view)
+            except BlockingIOError:
+                if self.blocking:
+                    select.select([], [self.master_fd], [], 0.1)
+                    continue
+                self.bytes_dropped += len(view)
+                return
+            except OSError:
+                # Reader side gone
+                self.bytes_dropped += len(view)
+                return
+            self.bytes_written += n
+            view = view[n:]
+
+    def fileno(self):
+        return self.master_fd
+
+    def close(self):
+        for fd in (self.master_fd, self.slave_fd):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class SyntheticFrameGenerator:
+    """
+    Deterministic frames: frame i depends only on (seed, i), so every run
+    and every machine sees exactly the same byte stream.
+    """
+
+    def __init__(self, grid_size=8, rate=60.0, noise_mm=10.0, invalid_ratio=0.1,
+                 seed=0, phase=0.0):
+        self.grid_size = grid_size
+        self.rate = rate
+        self.noise_mm = noise_mm
+        self.invalid_ratio = invalid_ratio
+        self.seed = seed
+        self.phase = phase
+        self._yy, self._xx = np.mgrid[0:grid_size, 0:grid_size]
+
+    def timestamp_ms(self, index):
+        return int(index * 1000.0 / self.rate)
+
+    def frame(self, index):
+        """Distances (mm) of frame `index`; invalid zones are 0"""
+        rng = np.random.default_rng((self.seed, index))
+        t = index / self.rate + self.phase
+        dist = 600 + 400 * np.sin(t + 0.3 * self._xx) * np.cos(0.5 * t + 0.2 * self._yy)
+        dist += rng.normal(0, self.noise_mm, dist.shape)
+        dist[rng.random(dist.shape) < self.invalid_ratio] = 0
+        return dist.astype(np.int16)
+
+    def encode(self, index, binary=True):
+        dist = self.frame(index)
+        if binary:
+            return encode_frame(index, self.timestamp_ms(index), dist)
+        return encode_ascii_frame(index, self.timestamp_ms(index), dist, dist > 0)
+
+    def stream(self, n_frames, binary=True, start=0):
+        """n_frames consecutive encoded frames as one bytes object"""
+        return b''.join(self.encode(i, binary) for i in range(start, start + n_frames))
+
+
+class BytesSerial:
+    """
+    Serial-like reader over an in-memory byte stream. `chunk` caps
+    in_waiting so bytes appear to arrive a frame or so at a time.
+    """
+
+    def __init__(self, data, chunk=None, port='synthetic'):
+        self._data = bytes(data)
+        self._pos = 0
+        self.chunk = chunk
+        self.port = port
+        self.is_open = True
+
+    @property
+    def in_waiting(self):
+        remaining = len(self._data) - self._pos
+        return remaining if self.chunk is None else min(remaining, self.chunk)
+
+    @property
+    def finished(self):
+        return self._pos >= len(self._data)
+
+    def read(self, size=1):
+        data = bytes(self._data[self._pos:self._pos + size])
+        self._pos += len(data)
+        return data
+
+    def readline(self):
+        end = self._data.find(b'\n', self._pos)
+        return self.read((len(self._data) if end < 0 else end + 1) - self._pos)
+
+    def rewind(self):
+        self._pos = 0
+
+    def reset_input_buffer(self):
+        self._pos = len(self._data)
+
+    def reset_output_buffer(self):
+        pass
+
+    def close(self):
+        self.is_open = False
+
+
+class SimulatedSensor(threading.Thread):
+    """Streams a moving synthetic depth pattern on its own pty at a fixed rate"""
+
+    def __init__(self, grid_size=8, rate=60.0, binary=True, seed=0, phase=0.0):
+        super().__init__(name=f'sim-sensor-{seed}', daemon=True)
+        self.grid_size = grid_size
+        self.rate = rate
+        self.binary = binary
+        self.phase = phase
+        self.pty = PtySerialStandIn()
+        self.port = self.pty.port
+        self.frames_sent = 0
+
+        self._rng = np.random.default_rng(seed)
+        self._yy, self._xx = np.mgrid[0:grid_size, 0:grid_size]
+        self._stop_event = threading.Event()
+
+    def frame(self, t):
+        """Synthetic distances (mm) at time t seconds"""
+        dist = 600 + 400 * np.sin(t + self.phase + 0.3 * self._xx) * np.cos(0.5 * t + 0.2 * self._yy)
+        dist += self._rng.normal(0, 10, dist.shape)
+        return dist.astype(np.int16)
+
+    def run(self):
+        start = time.monotonic()
+        period = 1.0 / self.rate
+        next_time = start
+        while not self._stop_event.is_set():
+            t = time.monotonic() - start
+            dist = self.frame(t)
+            ts = int(t * 1000)
+            if self.binary:
+                self.pty.write(encode_frame(self.frames_sent, ts, dist))
+            else:
+                self.pty.write(encode_ascii_frame(self.frames_sent, ts, dist))
+            self.frames_sent += 1
+            next_time += period
+            self._stop_event.wait(max(0.0, next_time - time.monotonic()))
+
+    def stop(self):
+        self._stop_event.set()
+        if self.is_alive():
+            self.join(1.0)
+        self.pty.close()
@@ -4,30 +4,75 @@ Matches compact Arduino data format for minimal delay
 
 Usage:
     python low_latency_mapper.py --port /dev/cu.usbserial-XXXX --mode heatmap
+    python low_latency_mapper.py --port /dev/cu.usbserial-XXXX --protocol binary
+    python low_latency_mapper.py --port /dev/cu.usbserial-XXXX --mode raster
+
+Without hardware, `python frame_protocol.py --grid 8` streams simulated
+binary frames on a pty and prints the port to pass as --port.
+
+matplotlib is only imported when a window (or offscreen render) is needed,
+so --headless starts without it; --startup-profile prints where startup
+time went.
 """
 
+import time
+_IMPORT_START = time.perf_counter()
+
 import serial
 import numpy as np
-import matplotlib.pyplot as plt
-from matplotlib.animation import FuncAnimation
-from mpl_toolkits.mplot3d import Axes3D
-import time
+import select
 import argparse
 import serial.tools.list_ports
 
+from frame_protocol import FrameDecoder, parse_ascii_frame, PROTOCOLS
+from ingest import FrameRing, IngestThread
+from capture import CaptureWriter, CaptureReader, ReplaySerial
+from point_cloud import PointCloudEngine
+from clock_sync import ClockSync, LatencyTracker
+from zone_filter import ZoneFilterBank, FILTER_MODES
+from link_manager import LinkManager
+from frame_protocol import binary_frame_size
+
+# Firmware lines that mean "configured, frames follow"
+READY_MARKERS = ('ready', 'system active', 'ranging started')
+MAX_BANNER_LINE = 256
+
+# Timed by enable_metrics(): port wait/read, decode, filter, transform and
+# the visualizer's draw (artist updates plus matplotlib's blit or redraw)
+MAPPER_STAGES = ('serial_wait', 'serial_read', 'decode', 'filter', 'point_cloud', 'draw')
+
+# Startup timing breakdown (seconds), filled as each stage completes
+STARTUP = {'imports': time.perf_counter() - _IMPORT_START}
+
+
+def load_pyplot(mode='heatmap'):
+    """Import matplotlib on first use; 3D modes also pull in mplot3d"""
+    t0 = time.perf_counter()
+    import matplotlib.pyplot as plt
+    if mode in ('3d', 'both'):
+        import mpl_toolkits.mplot3d  # noqa: F401 - registers the '3d' projection
+    STARTUP.setdefault('plotting', time.perf_counter() - t0)
+    return plt
+
 
 class LowLatencyMapper:
     """Optimized mapper with minimal processing overhead"""
     
-    def __init__(self, port, baudrate=921600, grid_size=4):
+    def __init__(self, port, baudrate=921600, grid_size=4, protocol='auto'):
         self.port = port
         self.baudrate = baudrate
         self.grid_size = grid_size
         self.serial_conn = None
         
+        # 'ascii' keeps the original readline path; 'binary'/'auto' decode
+        # bulk reads (auto also accepts ASCII frames on the same stream)
+        self.protocol = protocol
+        self.decoder = None if protocol == 'ascii' else FrameDecoder(grid_size, protocol)
+        
         # Use smaller data structures for speed
         self.distance_map = np.zeros((grid_size, grid_size), dtype=np.int16)
         self.valid_mask = np.zeros((grid_size, grid_size), dtype=bool)
+        self.point_cloud = PointCloudEngine(grid_size)
         
         # Statistics
         self.frame_count = 0
@@ -35,10 +80,37 @@ class LowLatencyMapper:
         self.fps = 0
         self.last_frame_time = time.time()
         self.latency_ms = 0
+        self.frame_num = -1
+        self.device_timestamp = 0
+        
+        # Device millis() -> host time; the floor is one binary frame's wire time
+        wire_ms = binary_frame_size(grid_size) * 10 * 1000.0 / baudrate
+        self.clock = ClockSync(transport_ms=wire_ms)
+        self.receive_latency = LatencyTracker()
+        
+        # Optional capture of raw frames (see capture.py)
+        self.recorder = None
         
-    def connect(self):
-        """Connect with optimized settings"""
+        # Optional temporal filter; raw_* keep the unfiltered frame
+        self.zone_filter = None
+        self.raw_distance_map = np.zeros_like(self.distance_map)
+        self.raw_valid_mask = np.zeros_like(self.valid_mask)
+        
+        # Optional link health / auto-reconnect (see link_manager.py)
+        self.link = None
+        
+        # Optional per-stage timing (see instrumentation.py); None = no timing
+        self.metrics = None
+        self.stage = None
+        
+    def connect(self, handshake_timeout=1.0):
+        """
+        Open the port and wait for the firmware: returns as soon as a ready
+        banner line or the first valid frame arrives, or after
+        handshake_timeout seconds of silence (still connected).
+        """
         try:
+            t0 = time.perf_counter()
             self.serial_conn = serial.Serial(
                 self.port,
                 self.baudrate,
@@ -48,155 +120,280 @@ class LowLatencyMapper:
             # Disable buffering for lowest latency
             self.serial_conn.reset_input_buffer()
             self.serial_conn.reset_output_buffer()
+            STARTUP['open'] = time.perf_counter() - t0
             
-            time.sleep(0.5)
             print(f"✓ Connected: {self.port} @ {self.baudrate} baud")
-            print("✓ Low latency mode active")
-            
-            # Read and display Arduino messages
-            start = time.time()
-            while time.time() - start < 2:
-                if self.serial_conn.in_waiting:
-                    line = self.serial_conn.readline().decode('utf-8', errors='ignore').strip()
-                    if line and not line.startswith('F:'):
-                        print(f"  Arduino: {line}")
+            print(f"✓ Low latency mode active (protocol: {self.protocol})")
             
+            t0 = time.perf_counter()
+            reason = self._handshake(handshake_timeout)
+            STARTUP['handshake'] = time.perf_counter() - t0
+            print(f"✓ Handshake: {reason} after {1000 * STARTUP['handshake']:.0f}ms")
             return True
             
         except Exception as e:
             print(f"✗ Connection failed: {e}")
             return False
     
+    def _handshake(self, timeout):
+        """
+        Show banner lines until the firmware is ready. Bytes read here are
+        handed to the frame decoder, so the first frame is not lost.
+        """
+        probe = FrameDecoder(self.grid_size, 'auto')
+        scratch_dist = np.zeros_like(self.distance_map)
+        scratch_valid = np.zeros_like(self.valid_mask)
+        if self.decoder is not None:
+            self.decoder.reset()
+        
+        pending = bytearray()
+        deadline = time.perf_counter() + timeout
+        while True:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                return 'timeout'
+            if not self.wait_for_data(min(remaining, 0.05)):
+                continue
+            data = self.serial_conn.read(self.serial_conn.in_waiting or 1)
+            if self.decoder is not None:
+                self.decoder.feed(data)
+            
+            # Banner: printable lines that are not frames
+            pending += data
+            *lines, rest = pending.split(b'\n')
+            pending = bytearray(rest[-MAX_BANNER_LINE:])
+            for raw in lines:
+                line = raw.decode('utf-8', errors='ignore').strip()
+                if not line or line.startswith('F:') or not (line.isascii() and line.isprintable()):
+                    continue
+                print(f"  Arduino: {line}")
+                if any(marker in line.lower() for marker in READY_MARKERS):
+                    return 'ready banner'
+            
+            probe.feed(data)
+            if probe.decode_next(scratch_dist, scratch_valid) is not None:
+                return 'first frame'
+    
     def read_frame_fast(self):
         """
         Fast frame parser for compact format
-        Format: F:frameNum:timestamp:Z:row:col:dist:Z:row:col:dist:...E
+        ASCII:  F:frameNum:timestamp:Z:row:col:dist:Z:row:col:dist:...E
+        Binary: see frame_protocol.py (sync + header + int16 zones + CRC)
         """
         if not self.serial_conn or not self.serial_conn.is_open:
+            if self.link is not None:
+                self.link.poll()
             return False
         
+        stage = self.stage
         try:
-            # Quick check if data available
-            if not self.serial_conn.in_waiting:
-                return False
-            
-            line = self.serial_conn.readline().decode('utf-8', errors='ignore').strip()
-            
-            # Must start with frame marker
-            if not line.startswith('F:'):
-                return False
-            
-            # Parse frame header
-            try:
-                parts = line.split(':')
-                if len(parts) < 4:
+            if stage is not None:
+                t0 = time.perf_counter()
+            if self.decoder is None:
+                # Quick check if data available
+                if not self.serial_conn.in_waiting:
                     return False
                 
-                frame_num = int(parts[1])
-                timestamp = int(parts[2])
-                
-            except (ValueError, IndexError):
-                return False
+                raw = self.serial_conn.readline()
+                if stage is not None:
+                    t1 = time.perf_counter()
+                    stage['serial_read'].observe(t1 - t0)
+                    self.bytes_read.inc(len(raw))
+                line = raw.decode('utf-8', errors='ignore').strip()
+                result = parse_ascii_frame(line, self.distance_map, self.valid_mask)
+            else:
+                # Drain everything waiting in one read, then decode one frame
+                waiting = self.serial_conn.in_waiting
+                if waiting:
+                    self.decoder.feed(self.serial_conn.read(waiting))
+                if stage is not None:
+                    t1 = time.perf_counter()
+                    if waiting:
+                        stage['serial_read'].observe(t1 - t0)
+                        self.bytes_read.inc(waiting)
+                result = self.decoder.decode_next(self.distance_map, self.valid_mask)
+            
+            if stage is not None:
+                t0 = time.perf_counter()
+                stage['decode'].observe(t0 - t1)
             
-            # Clear previous data
-            self.distance_map.fill(0)
-            self.valid_mask.fill(False)
+            if result is None:
+                if stage is not None:
+                    self.idle_reads.inc()
+                if self.link is not None:
+                    self.link.poll()
+                return False
             
-            # Parse zone data quickly
-            # Format after header: Z:row:col:dist:Z:row:col:dist:...E
-            i = 3
-            zones_parsed = 0
+            self.frame_num, timestamp, zones_parsed = result
             
-            while i < len(parts) - 1:
-                if parts[i] == 'Z':
-                    try:
-                        if i + 3 < len(parts):
-                            row = int(parts[i + 1])
-                            col = int(parts[i + 2])
-                            dist = int(parts[i + 3])
-                            
-                            # Validate and store
-                            if (0 <= row < self.grid_size and 
-                                0 <= col < self.grid_size and
-                                10 <= dist <= 1180):
-                                
-                                self.distance_map[row, col] = dist
-                                self.valid_mask[row, col] = True
-                                zones_parsed += 1
-                            
-                            i += 4
-                        else:
-                            break
-                    except (ValueError, IndexError):
-                        i += 1
-                elif parts[i] == 'E':
-                    break
-                else:
-                    i += 1
+            if self.zone_filter is not None:
+                np.copyto(self.raw_distance_map, self.distance_map)
+                np.copyto(self.raw_valid_mask, self.valid_mask)
+                dt = (timestamp - self.device_timestamp) / 1000.0
+                self.zone_filter.apply(self.distance_map, self.valid_mask,
+                                       dt if 0 < dt < 1.0 else None)
+                zones_parsed = int(np.count_nonzero(self.valid_mask))
+                if stage is not None:
+                    stage['filter'].observe(time.perf_counter() - t0)
+            self.device_timestamp = timestamp
             
             # Update statistics
             self.frame_count += 1
             current_time = time.time()
             
-            # Calculate latency
-            self.latency_ms = (current_time * 1000) - timestamp
+            # Acquisition-to-receive latency on the synced device clock
+            self.clock.add(timestamp, current_time)
+            self.latency_ms = self.clock.latency_ms(timestamp, current_time)
+            self.receive_latency.record(self.latency_ms)
             
             # Calculate FPS
             if self.frame_count > 1:
                 self.fps = 1.0 / (current_time - self.last_frame_time)
             self.last_frame_time = current_time
             
+            if self.link is not None:
+                self.link.on_frame(self.frame_num, current_time, timestamp)
+            
+            if self.recorder is not None:
+                self.recorder.write(current_time,
+                                    raw if self.decoder is None else self.decoder.last_raw)
+            
             return zones_parsed > 0
             
         except Exception as e:
-            print(f"Parse error: {e}")
+            if self.link is None:
+                print(f"Parse error: {e}")
+            else:
+                self.link.on_error(e)
+            return False
+    
+    def wait_for_data(self, timeout):
+        """Block until the port has bytes to read or timeout expires"""
+        if self.stage is not None:
+            t0 = time.perf_counter()
+        try:
+            if self.serial_conn.in_waiting:
+                return True
+            # POSIX ports expose a file descriptor we can sleep on
+            return bool(select.select([self.serial_conn.fileno()], [], [], timeout)[0])
+        except Exception:
+            time.sleep(timeout)
+            return False
+        finally:
+            if self.stage is not None:
+                self.stage['serial_wait'].observe(time.perf_counter() - t0)
+    
+    def source_exhausted(self):
+        """True once a replay or in-memory source has delivered every frame"""
+        conn = self.serial_conn
+        if not getattr(conn, 'finished', False) or conn.in_waiting:
             return False
+        return self.decoder is None or self.decoder.buffered < binary_frame_size(self.grid_size)
+    
+    def get_point_cloud_fast(self, distance_map=None, valid_mask=None):
+        """
+        Fast point cloud generation (precomputed zone directions, one
+        broadcast multiply). The returned array is reused on the next call.
+        """
+        if distance_map is None:
+            distance_map = self.distance_map
+            valid_mask = self.valid_mask
+        if self.stage is None:
+            return self.point_cloud.compute(distance_map, valid_mask)
+        t0 = time.perf_counter()
+        points = self.point_cloud.compute(distance_map, valid_mask)
+        self.stage['point_cloud'].observe(time.perf_counter() - t0)
+        return points
+    
+    def enable_reconnect(self, **options):
+        """Track link health and reopen the port automatically when it drops"""
+        self.link = LinkManager(self, **options)
+        return self.link
     
-    def get_point_cloud_fast(self):
-        """Fast point cloud generation"""
-        points = []
-        
-        # Simplified FOV calculation
-        angle_step = 45.0 / self.grid_size  # 45° FOV
-        start_angle = -22.5  # Center at 0
-        
-        for row in range(self.grid_size):
-            for col in range(self.grid_size):
-                if self.valid_mask[row, col]:
-                    dist = self.distance_map[row, col]
-                    
-                    # Simple spherical to cartesian
-                    angle_h = np.radians(start_angle + (col + 0.5) * angle_step)
-                    angle_v = np.radians(start_angle + (row + 0.5) * angle_step)
-                    
-                    x = dist * np.sin(angle_h)
-                    y = dist * np.sin(angle_v)
-                    z = dist * np.cos(angle_h) * np.cos(angle_v)
-                    
-                    points.append([x, y, z])
-        
-        return np.array(points) if points else np.array([]).reshape(0, 3)
+    def enable_metrics(self, registry=None):
+        """Time every pipeline stage into histograms on a MetricsRegistry"""
+        from instrumentation import MetricsRegistry
+        registry = registry or MetricsRegistry('vl53_')
+        self.stage = registry.stages('stage_seconds', MAPPER_STAGES)
+        self.bytes_read = registry.counter('serial_bytes_total', 'Bytes read from the port')
+        self.idle_reads = registry.counter('idle_reads_total', 'Reads that completed no frame')
+        registry.gauge('frames_total', lambda: self.frame_count, 'Frames decoded')
+        registry.gauge('fps', lambda: self.fps, 'Inter-frame rate of the last frame')
+        registry.gauge('receive_latency_ms', lambda: self.latency_ms,
+                       'Device acquisition to host receive (ms)')
+        if self.decoder is not None:
+            registry.gauge('crc_errors_total', lambda: self.decoder.crc_errors, 'Frames failing CRC')
+            registry.gauge('header_errors_total', lambda: self.decoder.header_errors,
+                           'Binary headers with a wrong version or grid size')
+        self.metrics = registry
+        return registry
+    
+    def set_filter(self, mode, **options):
+        """Enable a per-zone temporal filter ('ema', 'median', 'kalman') or None"""
+        self.zone_filter = None if mode in (None, 'none') else \
+            ZoneFilterBank(self.grid_size, mode, **options)
+    
+    def start_recording(self, path):
+        """Append every received frame to a capture file"""
+        self.recorder = CaptureWriter(path, self.grid_size)
+        if self.decoder is not None:
+            self.decoder.keep_raw = True
+        print(f"✓ Recording to {path}")
+    
+    def open_replay(self, path, speed=1.0):
+        """Feed a capture file through the normal read path instead of a port"""
+        reader = CaptureReader(path)
+        if reader.grid_size != self.grid_size:
+            raise ValueError(f"Capture is {reader.grid_size}x{reader.grid_size}, "
+                             f"mapper is {self.grid_size}x{self.grid_size}")
+        self.serial_conn = ReplaySerial(reader, speed)
+        print(f"✓ Replaying {path} (speed: {speed or 'max'})")
+        return True
     
     def disconnect(self):
+        if self.link is not None:
+            self.link.close()
+        if self.recorder is not None:
+            self.recorder.close()
+            print(f"✓ Recorded {self.recorder.frames_written} frames")
+            self.recorder = None
         if self.serial_conn and self.serial_conn.is_open:
             self.serial_conn.close()
             print("\n✓ Disconnected")
 
 
+RENDERERS = ('blit', 'legacy')
+
+
 class FastVisualizer:
     """Ultra-fast visualizer with minimal overhead"""
     
-    def __init__(self, mapper, mode='heatmap'):
+    def __init__(self, mapper, mode='heatmap', ring=None, renderer='blit'):
         self.mapper = mapper
         self.mode = mode
         
+        # 'blit' creates artists once and only updates their data;
+        # 'legacy' clears and rebuilds the axes on every frame
+        self.renderer = renderer
+        
+        # With an ingest ring the renderer draws from its own copy of the
+        # newest frame; without one it reads the mapper's arrays directly
+        self.ring = ring
+        if ring is None:
+            self.distance_map = mapper.distance_map
+            self.valid_mask = mapper.valid_mask
+        else:
+            self.distance_map = np.zeros_like(mapper.distance_map)
+            self.valid_mask = np.zeros_like(mapper.valid_mask)
+        
+        plt = load_pyplot(mode)
+        
         # Set matplotlib to interactive mode for speed
         plt.ion()
         
         if mode == 'heatmap':
             self.fig, self.ax = plt.subplots(figsize=(8, 8))
             self.im = None
-            self.texts = []
             
         elif mode == '3d':
             self.fig = plt.figure(figsize=(10, 8))
@@ -213,11 +410,157 @@ class FastVisualizer:
         self.last_update = time.time()
         self.update_count = 0
         
+        # Acquisition-to-display latency of rendered frames
+        self.frame_device_ts = 0
+        self.display_latency = LatencyTracker()
+        self.first_render_time = None
+        self.render_fps = 0.0
+        
+        self.artists = []
+        self._backgrounds = {}
+        self._draw_start = None
+        self._timer = None
+        if renderer == 'blit':
+            self._build_artists()
+        
         self.fig.canvas.mpl_connect('close_event', self.on_close)
     
     def on_close(self, event):
+        if self.update_count > 1:
+            print(f"\n✓ Rendered {self.update_count} frames at "
+                  f"{self.render_fps:.1f} FPS (renderer: {self.renderer})")
+            print(f"  Receive latency: {self.mapper.receive_latency.summary()}")
+            print(f"  Display latency: {self.display_latency.summary()}")
+            print(f"  Clock drift:     {self.mapper.clock.drift_ppm:+.0f} ppm")
         self.mapper.disconnect()
     
+    # ----- persistent artists (blit renderer) -----
+    
+    def _build_artists(self):
+        """Create every artist once; per-frame updates only touch their data"""
+        if self.mode == 'heatmap':
+            self._build_heatmap(self.ax)
+            self.ax.set_xlabel('Column')
+            self.ax.set_ylabel('Row')
+        elif self.mode == '3d':
+            self._build_scatter(self.ax, size=60)
+            self.ax.set_xlabel('X (mm)')
+            self.ax.set_ylabel('Y (mm)')
+            self.ax.set_zlabel('Z (mm)')
+        elif self.mode == 'both':
+            self._build_scatter(self.ax1, size=50)
+            self._build_heatmap(self.ax2)
+        
+        # Stats live in their own strip so the blitted region covers them
+        self.fig.tight_layout(rect=(0, 0, 1, 0.94))
+        self.stats_ax = self.fig.add_axes((0.0, 0.95, 1.0, 0.04))
+        self.stats_ax.axis('off')
+        self.stats_text = self.stats_ax.text(0.5, 0.5, '', ha='center', va='center',
+                                             fontsize=10, animated=True)
+        self.artists.append(self.stats_text)
+    
+    def _build_heatmap(self, ax):
+        grid_size = self.mapper.grid_size
+        self._masked = np.ma.masked_array(
+            np.zeros((grid_size, grid_size), dtype=np.int16),
+            mask=np.ones((grid_size, grid_size), dtype=bool)
+        )
+        cmap = load_pyplot().get_cmap('RdYlBu').copy()
+        cmap.set_bad('0.25')   # invalid zones
+        self.im = ax.imshow(self._masked, cmap=cmap, aspect='auto',
+                            interpolation='nearest', vmin=10, vmax=1180,
+                            animated=True)
+        
+        # No per-zone labels here: 64 animated texts cost ~2 ms each per
+        # frame. The colorbar is static, so it lands in the cached background
+        self.fig.colorbar(self.im, ax=ax, label='Distance (mm)')
+        self.artists.append(self.im)
+    
+    def _build_scatter(self, ax, size):
+        ax.set_xlim([-600, 600])
+        ax.set_ylim([-600, 600])
+        ax.set_zlim([10, 1180])
+        ax.view_init(elev=20, azim=45)
+        self.scatter = ax.scatter([], [], [], c=[], cmap='RdYlBu', s=size,
+                                  alpha=0.8, vmin=10, vmax=1180, animated=True)
+        self.artists.append(self.scatter)
+    
+    def _update_image(self):
+        np.copyto(self._masked.data, self.distance_map)
+        np.logical_not(self.valid_mask, out=self._masked.mask)
+        self.im.set_data(self._masked)
+    
+    def _update_scatter(self):
+        points = self.mapper.get_point_cloud_fast(self.distance_map, self.valid_mask)
+        self.scatter._offsets3d = (points[:, 0], points[:, 1], points[:, 2])
+        self.scatter.set_array(points[:, 2])  # Color by distance
+        # Blitting draws the collection without Axes3D.draw, so project here
+        if getattr(self.scatter.axes, 'M', None) is not None:
+            self.scatter.do_3d_projection()
+    
+    def _stats_line(self, prefix):
+        valid_count = np.count_nonzero(self.valid_mask)
+        total = self.mapper.grid_size ** 2
+        return (f'{prefix} | Frame: {self.mapper.frame_count} | '
+                f'FPS: {self.mapper.fps:.1f} | Render: {self.render_fps:.1f} | '
+                f'Valid: {valid_count}/{total} | {self.latency_text()}')
+    
+    def latency_text(self):
+        """Last acquisition-to-display latency and its rolling p95"""
+        _, p95, _ = self.display_latency.percentiles()
+        return f'Latency: {self.display_latency.last:.0f}ms (p95 {p95:.0f}ms)'
+    
+    def update_heatmap_blit(self):
+        """Heatmap update with persistent artists"""
+        self._update_image()
+        self.stats_text.set_text(self._stats_line('VL53L7CX Low Latency'))
+    
+    def update_3d_blit(self):
+        """3D update with a persistent scatter"""
+        self._update_scatter()
+        self.stats_text.set_text(self._stats_line('VL53L7CX 3D'))
+    
+    def update_both_blit(self):
+        """Both views with persistent artists"""
+        self._update_scatter()
+        self._update_image()
+        self.stats_text.set_text(self._stats_line('VL53L7CX'))
+    
+    def cache_background(self):
+        """Snapshot every axes without its animated artists (after a full draw)"""
+        canvas = self.fig.canvas
+        self._backgrounds = {ax: canvas.copy_from_bbox(ax.bbox) for ax in self.fig.axes}
+    
+    def blit_frame(self):
+        """Restore cached backgrounds, draw the animated artists and blit"""
+        if not self._backgrounds:
+            return  # no full draw yet; _on_draw will cache one
+        canvas = self.fig.canvas
+        axes = {a.axes for a in self.artists}
+        for ax in axes:
+            canvas.restore_region(self._backgrounds[ax])
+        for artist in self.artists:
+            artist.axes.draw_artist(artist)
+        for ax in axes:
+            canvas.blit(ax.bbox)
+    
+    def _on_draw(self, event):
+        """A full redraw (first show, resize) invalidates the cached backgrounds"""
+        self.cache_background()
+        for artist in self.artists:
+            artist.axes.draw_artist(artist)
+    
+    def present(self):
+        """Put the rendered frame on the canvas: blit, or a full redraw (legacy)"""
+        if self.renderer == 'blit':
+            self.blit_frame()
+        else:
+            self.fig.canvas.draw()
+        stage = self.mapper.stage
+        if stage is not None and self._draw_start is not None:
+            stage['draw'].observe(time.perf_counter() - self._draw_start)
+            self._draw_start = None
+    
     def update_heatmap_fast(self):
         """Optimized heatmap update"""
         # Clear previous
@@ -225,8 +568,8 @@ class FastVisualizer:
         
         # Masked data for transparency
         masked_data = np.ma.masked_where(
-            ~self.mapper.valid_mask,
-            self.mapper.distance_map
+            ~self.valid_mask,
+            self.distance_map
         )
         
         # Plot with inverted colormap (red=close, blue=far)
@@ -242,8 +585,8 @@ class FastVisualizer:
         # Add text annotations (only for valid zones)
         for i in range(self.mapper.grid_size):
             for j in range(self.mapper.grid_size):
-                if self.mapper.valid_mask[i, j]:
-                    dist = self.mapper.distance_map[i, j]
+                if self.valid_mask[i, j]:
+                    dist = self.distance_map[i, j]
                     color = 'white' if dist > 600 else 'black'
                     self.ax.text(j, i, str(dist), ha='center', va='center',
                                color=color, fontsize=10, fontweight='bold')
@@ -252,11 +595,11 @@ class FastVisualizer:
                                color='gray', fontsize=12, alpha=0.3)
         
         # Title with stats
-        valid_count = np.sum(self.mapper.valid_mask)
+        valid_count = np.sum(self.valid_mask)
         total = self.mapper.grid_size ** 2
         title = (f'VL53L7CX Low Latency | Frame: {self.mapper.frame_count} | '
                 f'FPS: {self.mapper.fps:.1f} | Valid: {valid_count}/{total} | '
-                f'Latency: {self.mapper.latency_ms:.0f}ms')
+                f'{self.latency_text()}')
         self.ax.set_title(title, fontsize=10)
         self.ax.set_xlabel('Column')
         self.ax.set_ylabel('Row')
@@ -265,7 +608,7 @@ class FastVisualizer:
         """Optimized 3D update"""
         self.ax.clear()
         
-        points = self.mapper.get_point_cloud_fast()
+        points = self.mapper.get_point_cloud_fast(self.distance_map, self.valid_mask)
         
         if len(points) > 0:
             colors = points[:, 2]  # Color by distance
@@ -283,17 +626,17 @@ class FastVisualizer:
         self.ax.set_zlim([10, 1180])
         self.ax.view_init(elev=20, azim=45)
         
-        valid_count = np.sum(self.mapper.valid_mask)
+        valid_count = np.sum(self.valid_mask)
         total = self.mapper.grid_size ** 2
         title = (f'VL53L7CX 3D | FPS: {self.mapper.fps:.1f} | '
-                f'Valid: {valid_count}/{total} | Latency: {self.mapper.latency_ms:.0f}ms')
+                f'Valid: {valid_count}/{total} | {self.latency_text()}')
         self.ax.set_title(title, fontsize=10)
     
     def update_both_fast(self):
         """Optimized both views"""
         # 3D
         self.ax1.clear()
-        points = self.mapper.get_point_cloud_fast()
+        points = self.mapper.get_point_cloud_fast(self.distance_map, self.valid_mask)
         if len(points) > 0:
             colors = points[:, 2]
             self.ax1.scatter(points[:, 0], points[:, 1], points[:, 2],
@@ -307,59 +650,190 @@ class FastVisualizer:
         # Heatmap
         self.ax2.clear()
         masked_data = np.ma.masked_where(
-            ~self.mapper.valid_mask,
-            self.mapper.distance_map
+            ~self.valid_mask,
+            self.distance_map
         )
         self.ax2.imshow(masked_data, cmap='RdYlBu', aspect='auto',
                        interpolation='nearest', vmin=10, vmax=1180)
         
         for i in range(self.mapper.grid_size):
             for j in range(self.mapper.grid_size):
-                if self.mapper.valid_mask[i, j]:
-                    dist = self.mapper.distance_map[i, j]
+                if self.valid_mask[i, j]:
+                    dist = self.distance_map[i, j]
                     color = 'white' if dist > 600 else 'black'
                     self.ax2.text(j, i, str(dist), ha='center', va='center',
                                 color=color, fontsize=8, fontweight='bold')
         
-        valid_count = np.sum(self.mapper.valid_mask)
+        valid_count = np.sum(self.valid_mask)
         total = self.mapper.grid_size ** 2
         self.fig.suptitle(
             f'VL53L7CX | FPS: {self.mapper.fps:.1f} | Valid: {valid_count}/{total} | '
-            f'Latency: {self.mapper.latency_ms:.0f}ms',
+            f'{self.latency_text()}',
             fontsize=10
         )
     
     def update(self, frame_num):
         """Main update function"""
         # Read new data
-        if not self.mapper.read_frame_fast():
-            return
+        if self.ring is not None:
+            # Newest complete frame only; anything older is skipped
+            meta = self.ring.take_latest(self.distance_map, self.valid_mask)
+            if meta is None:
+                return self.artists
+            self.frame_device_ts = meta[1]
+        elif not self.mapper.read_frame_fast():
+            return self.artists
+        else:
+            self.frame_device_ts = self.mapper.device_timestamp
         
+        return self.render()
+    
+    def render(self):
+        """Draw the current frame with the selected renderer"""
+        # The 'draw' stage runs from here to the end of present()
+        if self.mapper.stage is not None:
+            self._draw_start = time.perf_counter()
         # Update visualization based on mode
-        if self.mode == 'heatmap':
-            self.update_heatmap_fast()
-        elif self.mode == '3d':
-            self.update_3d_fast()
-        elif self.mode == 'both':
-            self.update_both_fast()
+        if self.renderer == 'blit':
+            if self.mode == 'heatmap':
+                self.update_heatmap_blit()
+            elif self.mode == '3d':
+                self.update_3d_blit()
+            elif self.mode == 'both':
+                self.update_both_blit()
+        else:
+            if self.mode == 'heatmap':
+                self.update_heatmap_fast()
+            elif self.mode == '3d':
+                self.update_3d_fast()
+            elif self.mode == 'both':
+                self.update_both_fast()
         
         self.update_count += 1
+        self.display_latency.record(
+            self.mapper.clock.latency_ms(self.frame_device_ts, time.time()))
+        now = time.perf_counter()
+        if self.first_render_time is None:
+            self.first_render_time = now
+        elif now > self.first_render_time:
+            self.render_fps = (self.update_count - 1) / (now - self.first_render_time)
+        
+        return self.artists
     
     def start(self, interval=10):
         """Start with minimal interval for max speed"""
         print(f"\n✓ Starting visualization (mode: {self.mode})")
         print("  Close window to exit\n")
         
-        anim = FuncAnimation(
-            self.fig,
-            self.update,
-            interval=interval,  # 10ms = up to 100 FPS
-            cache_frame_data=False,
-            blit=False
-        )
+        plt = load_pyplot(self.mode)
+        if self.renderer == 'blit':
+            self.fig.canvas.mpl_connect('draw_event', self._on_draw)
+        else:
+            plt.tight_layout()
         
-        plt.tight_layout()
+        # A plain canvas timer instead of FuncAnimation, so the blit/redraw
+        # happens in present() and is part of the timed 'draw' stage
+        self._timer = self.fig.canvas.new_timer(interval=interval)  # 10ms = up to 100 FPS
+        self._timer.add_callback(self._tick)
+        self._timer.start()
         plt.show(block=True)
+    
+    def _tick(self):
+        rendered = self.update_count
+        self.update(None)
+        if self.update_count != rendered:
+            self.present()
+
+
+def compare_renderers(grid_size=8, mode='heatmap', frames=100):
+    """Render synthetic frames offscreen with each renderer and report FPS"""
+    plt = load_pyplot(mode)
+    plt.switch_backend('Agg')
+    rng = np.random.default_rng(0)
+    shape = (grid_size, grid_size)
+    results = {}
+    
+    for renderer in ('legacy', 'blit'):
+        mapper = LowLatencyMapper('offscreen', grid_size=grid_size)
+        viz = FastVisualizer(mapper, mode, renderer=renderer)
+        viz.fig.canvas.draw()
+        viz.cache_background()
+        
+        start = time.perf_counter()
+        for _ in range(frames):
+            mapper.distance_map[:] = rng.integers(10, 1180, shape)
+            mapper.valid_mask[:] = rng.random(shape) > 0.1
+            viz.render()
+            viz.present()
+        results[renderer] = frames / (time.perf_counter() - start)
+        plt.close(viz.fig)
+    
+    print(f"\nRenderer comparison ({mode}, {grid_size}x{grid_size}, {frames} frames)")
+    for renderer, fps in results.items():
+        print(f"  {renderer:<8} {fps:8.1f} FPS")
+    print(f"  speedup  {results['blit'] / results['legacy']:8.1f}x")
+    return results
+
+
+def run_headless(mapper, ring=None, duration=None, report_interval=1.0):
+    """
+    Ingest -> parse -> (filter) -> point cloud without any GUI, printing
+    throughput and latency once per report_interval. Stops after `duration`
+    seconds, when a replay runs out, or on Ctrl+C.
+    """
+    distance_map = np.zeros_like(mapper.distance_map)
+    valid_mask = np.zeros_like(mapper.valid_mask)
+    transform_time = 0.0
+    clouds = 0
+    start = last_report = time.time()
+    last_frames = 0
+    
+    while duration is None or time.time() - start < duration:
+        if ring is None:
+            if not mapper.read_frame_fast():
+                if mapper.source_exhausted():
+                    break
+                mapper.wait_for_data(0.05)
+                continue
+            np.copyto(distance_map, mapper.distance_map)
+            np.copyto(valid_mask, mapper.valid_mask)
+        else:
+            if ring.take_latest(distance_map, valid_mask) is None:
+                if mapper.source_exhausted():
+                    break
+                time.sleep(0.002)
+                continue
+        
+        t0 = time.perf_counter()
+        points = mapper.get_point_cloud_fast(distance_map, valid_mask)
+        transform_time += time.perf_counter() - t0
+        clouds += 1
+        
+        now = time.time()
+        if now - last_report >= report_interval:
+            fps = (mapper.frame_count - last_frames) / (now - last_report)
+            print(f"Frames: {mapper.frame_count:6d} | {fps:6.1f} FPS | points: {len(points):3d} | "
+                  f"transform: {1e6 * transform_time / clouds:.0f}us | "
+                  f"latency {mapper.receive_latency.summary()}")
+            if mapper.link is not None:
+                print(f"  Link: {mapper.link.summary(now)}")
+            last_frames = mapper.frame_count
+            last_report = now
+    
+    elapsed = time.time() - start
+    print(f"\n✓ Headless run: {mapper.frame_count} frames in {elapsed:.1f}s "
+          f"({mapper.frame_count / max(elapsed, 1e-9):.1f} FPS), {clouds} point clouds")
+    return clouds
+
+
+def print_startup_profile():
+    """Where the time went between interpreter start and live data"""
+    print("\nStartup profile:")
+    for stage in ('imports', 'plotting', 'open', 'handshake'):
+        if stage in STARTUP:
+            print(f"  {stage:<10} {1000 * STARTUP[stage]:8.1f}ms")
+    print(f"  {'total':<10} {1000 * (time.perf_counter() - _IMPORT_START):8.1f}ms "
+          f"(since module import)\n")
 
 
 def list_serial_ports():
@@ -382,10 +856,64 @@ def main():
     parser.add_argument('--baudrate', type=int, default=921600,
                        help='Baud rate (default: 921600)')
     parser.add_argument('--mode', type=str, default='heatmap',
-                       choices=['3d', 'heatmap', 'both'],
-                       help='Visualization mode')
+                       choices=['3d', 'heatmap', 'both', 'raster'],
+                       help='Visualization mode (raster: pygame, no matplotlib)')
     parser.add_argument('--grid', type=int, default=4, choices=[4, 8],
                        help='Grid size (default: 4)')
+    parser.add_argument('--protocol', type=str, default='auto', choices=PROTOCOLS,
+                       help='Frame format: ascii, binary or auto (default: auto)')
+    parser.add_argument('--record', type=str, metavar='FILE',
+                       help='Append received frames to a capture file')
+    parser.add_argument('--replay', type=str, metavar='FILE',
+                       help='Replay a capture file instead of opening a port')
+    parser.add_argument('--speed', type=float, default=1.0,
+                       help='Replay speed (1 = real time, 0 = as fast as possible)')
+    parser.add_argument('--filter', type=str, default='none',
+                       choices=('none',) + FILTER_MODES,
+                       help='Per-zone temporal filter (default: none)')
+    parser.add_argument('--hold', type=int, default=5,
+                       help='Frames an invalid zone keeps its last value (default: 5)')
+    parser.add_argument('--renderer', type=str, default='blit', choices=RENDERERS,
+                       help='blit (persistent artists) or legacy (full redraw)')
+    parser.add_argument('--raster-cell', type=int, default=64,
+                       help='Pixels per zone in --mode raster (default: 64)')
+    parser.add_argument('--no-interpolate', action='store_true',
+                       help='--mode raster: flat cells instead of bilinear upscaling')
+    parser.add_argument('--compare-renderers', action='store_true',
+                       help='Benchmark both renderers offscreen and exit')
+    parser.add_argument('--single-thread', action='store_true',
+                       help='Read the port from the render loop (no ingest thread)')
+    parser.add_argument('--headless', action='store_true',
+                       help='Run the pipeline without a display and print stats')
+    parser.add_argument('--duration', type=float,
+                       help='Stop a --headless run after this many seconds')
+    parser.add_argument('--safety', action='store_true',
+                       help='Evaluate lift safety zones on every frame (ingest thread)')
+    parser.add_argument('--pose', type=str, default='1135,0,0,0',
+                       help='Module pose for --safety: x,y,z,yaw in the lift frame (mm, deg)')
+    parser.add_argument('--track', action='store_true',
+                       help='Segment obstacles and track them on every frame (ingest thread)')
+    parser.add_argument('--history', type=float, metavar='SECONDS',
+                       help='Keep a fixed-memory rolling history of this many seconds (ingest thread)')
+    parser.add_argument('--stream', type=int, metavar='PORT',
+                       help='Stream frames to remote viewers over WebSocket on PORT (ingest thread)')
+    parser.add_argument('--stream-host', type=str, default='127.0.0.1',
+                       help='Address the --stream server binds to (default: 127.0.0.1; '
+                            '0.0.0.0 serves every interface)')
+    parser.add_argument('--stream-quant', type=int, default=8,
+                       help='Distance step of the --stream encoding (mm, default: 8)')
+    parser.add_argument('--no-reconnect', action='store_true',
+                       help='Do not reopen the port automatically when it drops')
+    parser.add_argument('--handshake-timeout', type=float, default=1.0,
+                       help='Max wait for the ready banner / first frame on connect (s)')
+    parser.add_argument('--startup-profile', action='store_true',
+                       help='Print an import/connect timing breakdown before streaming')
+    parser.add_argument('--metrics', action='store_true',
+                       help='Time each pipeline stage and print a summary periodically')
+    parser.add_argument('--metrics-port', type=int,
+                       help='Serve stage metrics in Prometheus format on localhost:PORT (implies --metrics)')
+    parser.add_argument('--metrics-interval', type=float, default=5.0,
+                       help='Console summary interval for --metrics (s, 0 = only at exit)')
     parser.add_argument('--list-ports', action='store_true',
                        help='List ports and exit')
     
@@ -395,6 +923,21 @@ def main():
         list_serial_ports()
         return
     
+    if args.compare_renderers:
+        if args.mode == 'raster':
+            from raster_view import benchmark
+            benchmark(args.grid, args.raster_cell)
+        else:
+            compare_renderers(args.grid, args.mode)
+        return
+    
+    if args.replay:
+        # Grid size comes from the capture header
+        reader = CaptureReader(args.replay)
+        args.grid = reader.grid_size
+        args.port = f"replay:{args.replay}"
+        reader.close()
+    
     # Select port
     if not args.port:
         ports = list_serial_ports()
@@ -414,19 +957,94 @@ def main():
     print(f"Baud:      {args.baudrate}")
     print(f"Mode:      {args.mode}")
     print(f"Grid:      {args.grid}x{args.grid}")
+    print(f"Protocol:  {args.protocol}")
+    print(f"Filter:    {args.filter}")
+    if args.headless:
+        print("Display:   none (headless)")
     print(f"Target:    <50ms latency, >20 FPS")
     print("="*60 + "\n")
     
     # Create mapper
-    mapper = LowLatencyMapper(args.port, args.baudrate, args.grid)
+    mapper = LowLatencyMapper(args.port, args.baudrate, args.grid, args.protocol)
+    mapper.set_filter(args.filter, max_hold=args.hold)
     
-    if not mapper.connect():
+    if args.replay:
+        mapper.open_replay(args.replay, args.speed)
+    elif not mapper.connect(args.handshake_timeout):
         return
+    elif not args.no_reconnect:
+        mapper.enable_reconnect()
+    
+    if args.record:
+        mapper.start_recording(args.record)
+    
+    reporter = server = None
+    if args.metrics or args.metrics_port:
+        from instrumentation import ConsoleReporter, MetricsServer
+        registry = mapper.enable_metrics()
+        if args.metrics_port:
+            try:
+                server = MetricsServer(registry, args.metrics_port).start()
+            except OSError as e:
+                print(f"✗ Metrics endpoint on port {args.metrics_port}: {e}")
+        if args.metrics_interval > 0:
+            reporter = ConsoleReporter(registry, args.metrics_interval)
+            reporter.start()
+    
+    ring = None
+    ingest = None
+    history = None
+    stream = None
+    if not args.single_thread:
+        ring = FrameRing(args.grid)
+        ingest = IngestThread(mapper, ring)
+        if args.safety:
+            from multi_sensor import ModulePose
+            from safety_zones import SafetyEngine, lift_zones
+            safety = SafetyEngine(lift_zones())
+            ingest.add_listener(safety.listener(
+                ModulePose.parse(args.pose),
+                on_alert=lambda alert: print(f"⚠️ {alert}" if alert.level else f"✓ {alert}")))
+        if args.track:
+            from obstacle_tracker import ObstacleSegmenter, ObstacleTracker, tracker_listener
+            ingest.add_listener(tracker_listener(
+                ObstacleSegmenter(args.grid), ObstacleTracker(),
+                on_change=lambda tracker, appeared, lost: print(
+                    f"✓ Tracks: {len(tracker.tracks())} (new {appeared}, lost {lost})")))
+        if args.history:
+            from frame_history import FrameHistory
+            history = FrameHistory(args.grid, args.history)
+            ingest.add_listener(history.listener())
+        if args.stream:
+            from frame_stream import StreamServer
+            try:
+                stream = StreamServer((args.grid, args.grid), args.stream, host=args.stream_host,
+                                      registry=mapper.metrics, quant_mm=args.stream_quant).start()
+                ingest.add_listener(stream.listener())
+            except OSError as e:
+                print(f"✗ Stream server on port {args.stream}: {e}")
+        ingest.start()
+    elif args.safety or args.track or args.history or args.stream:
+        print("✗ --safety/--track/--history/--stream run on the ingest thread; "
+              "ignored with --single-thread")
     
     try:
-        # Create and start visualizer
-        viz = FastVisualizer(mapper, args.mode)
-        viz.start(interval=10)  # 10ms interval
+        if args.headless:
+            if args.startup_profile:
+                print_startup_profile()
+            run_headless(mapper, ring, args.duration)
+        elif args.mode == 'raster':
+            from raster_view import RasterView
+            viz = RasterView(mapper, ring, args.raster_cell, not args.no_interpolate)
+            if args.startup_profile:
+                print_startup_profile()
+            viz.start()
+        else:
+            # Create and start visualizer
+            viz = FastVisualizer(mapper, args.mode, ring, args.renderer)
+            if args.startup_profile:
+                print_startup_profile()
+            viz.start(interval=10)  # 10ms interval
         
     except KeyboardInterrupt:
         print("\n✓ Interrupted by user")
@@ -435,6 +1053,28 @@ def main():
         import traceback
         traceback.print_exc()
     finally:
+        if ingest is not None:
+            ingest.stop()
+            stats = ring.stats()
+            print(f"  Frames ingested: {stats['ingested']} | "
+                  f"rendered: {stats['rendered']} | skipped: {stats['skipped']}")
+        if history is not None:
+            frames = history.frames()
+            nearest = history.nearest(frames)
+            print(f"  History: {len(frames)} frames / {history.nbytes / 1024:.0f} KiB"
+                  + (f" | nearest {nearest[2]}mm at zone ({nearest[0]},{nearest[1]})" if nearest else ""))
+        if stream is not None:
+            print(f"  Stream: {stream.summary()}")
+            stream.stop()
+        if mapper.link is not None:
+            print(f"  Link: {mapper.link.summary()}")
+        if mapper.metrics is not None:
+            if reporter is not None:
+                reporter.stop()
+            if server is not None:
+                server.stop()
+            print("  Stage timings:")
+            print(mapper.metrics.summary())
         mapper.disconnect()
 
 
@@ -0,0 +1,200 @@
+"""
+Per-zone temporal filters for noisy VL53L7CX zones
+
+All filters run as whole-grid array operations on preallocated state, so a
+frame costs the same few microseconds whether 1 or 64 zones changed.
+
+Modes:
+    ema     exponential moving average per zone
+    median  sliding median over the last `window` valid readings
+    kalman  1D constant-velocity Kalman filter per zone
+
+Invalid zones hold their last estimate (the Kalman filter coasts on its
+velocity, clamped to the sensor's valid range) for up to `max_hold` frames,
+after which the zone is reported invalid and its state is dropped.
+"""
+
+import numpy as np
+
+from frame_protocol import MIN_VALID_MM, MAX_VALID_MM
+
+FILTER_MODES = ('ema', 'median', 'kalman')
+
+
+class ZoneFilterBank:
+    """Vectorized filter stage between the parser and its consumers"""
+
+    def __init__(self, grid_size, mode='ema', alpha=0.4, window=5, max_hold=5,
+                 process_noise=2000.0, measurement_noise=15.0, frame_dt=1.0 / 60):
+        if mode not in FILTER_MODES:
+            raise ValueError(f"Unknown filter mode: {mode}")
+        self.grid_size = grid_size
+        self.mode = mode
+        self.alpha = alpha
+        self.window = window
+        self.max_hold = max_hold
+        self.frame_dt = frame_dt
+
+        # Kalman tuning: acceleration noise (mm/s^2)^2 and range noise (mm)^2
+        self.q = process_noise ** 2
+        self.r = measurement_noise ** 2
+
+        shape = (grid_size, grid_size)
+        self.estimate = np.zeros(shape, dtype=np.float32)
+        self.initialized = np.zeros(shape, dtype=bool)
+        self.age = np.zeros(shape, dtype=np.int32)
+        self.output_valid = np.zeros(shape, dtype=bool)
+        self._measurement = np.zeros(shape, dtype=np.float32)
+        self._fresh = np.zeros(shape, dtype=bool)
+        self._scratch = np.zeros(shape, dtype=np.float32)
+
+        if mode == 'median':
+            # Per-zone ring of valid readings; the extra last row takes the
+            # writes of zones that were not measured this frame
+            self._history = np.full((window + 1,) + shape, np.nan, dtype=np.float32)
+            self._ordered = np.empty((window,) + shape, dtype=np.float32)
+            self._next = np.zeros(shape, dtype=np.int64)
+            self._count = np.zeros(shape, dtype=np.int64)
+            self._index = np.zeros(shape, dtype=np.int64)
+            self._zone = np.arange(grid_size * grid_size).reshape(shape)
+            self._rows, self._cols = np.indices(shape)
+        elif mode == 'kalman':
+            self.velocity = np.zeros(shape, dtype=np.float32)
+            self._p00 = np.zeros(shape, dtype=np.float32)
+            self._p01 = np.zeros(shape, dtype=np.float32)
+            self._p11 = np.zeros(shape, dtype=np.float32)
+            self._k0 = np.zeros(shape, dtype=np.float32)
+            self._k1 = np.zeros(shape, dtype=np.float32)
+            self._s = np.zeros(shape, dtype=np.float32)
+            self._y = np.zeros(shape, dtype=np.float32)
+
+    def reset(self):
+        self.initialized.fill(False)
+        self.age.fill(0)
+        self.output_valid.fill(False)
+        if self.mode == 'median':
+            self._history.fill(np.nan)
+            self._next.fill(0)
+            self._count.fill(0)
+
+    def apply(self, distance_map, valid_mask, dt=None):
+        """
+        Filter one frame in place: distance_map gets the rounded estimate,
+        valid_mask marks zones with a live (measured or held) estimate.
+        """
+        if dt is None or dt <= 0:
+            dt = self.frame_dt
+        np.copyto(self._measurement, distance_map)
+
+        # Zones seen for the first time (or after their hold expired) start fresh
+        np.logical_and(valid_mask, ~self.initialized, out=self._fresh)
+
+        if self.mode == 'ema':
+            self._apply_ema(valid_mask)
+        elif self.mode == 'median':
+            self._apply_median(valid_mask)
+        else:
+            self._apply_kalman(valid_mask, dt)
+
+        # Hold-last-valid with an age limit
+        self.age += 1
+        self.age[valid_mask] = 0
+        self.initialized |= valid_mask
+        np.less_equal(self.age, self.max_hold, out=self.output_valid)
+        self.output_valid &= self.initialized
+        self.initialized &= self.output_valid
+        if self.mode == 'kalman':
+            self.velocity[~self.initialized] = 0.0
+
+        np.rint(self.estimate, out=self._scratch)
+        np.multiply(self._scratch, self.output_valid, out=self._scratch)
+        np.copyto(distance_map, self._scratch, casting='unsafe')
+        np.copyto(valid_mask, self.output_valid)
+        return distance_map, valid_mask
+
+    def _apply_ema(self, valid_mask):
+        # estimate += alpha * (z - estimate) on valid zones, z on fresh ones
+        np.subtract(self._measurement, self.estimate, out=self._scratch)
+        self._scratch *= self.alpha
+        np.add(self.estimate, self._scratch, out=self._scratch)
+        np.copyto(self.estimate, self._scratch, where=valid_mask)
+        np.copyto(self.estimate, self._measurement, where=self._fresh)
+
+    def _apply_median(self, valid_mask):
+        window = self.window
+        history = self._history
+        count, index = self._count, self._index
+        expired = ~self.initialized
+        np.copyto(history, np.nan, where=expired)
+        np.copyto(self._next, 0, where=expired)
+        np.copyto(count, 0, where=expired)
+
+        # Measured zones write their next ring slot, the rest the spare row
+        np.copyto(index, self._next)
+        np.copyto(index, window, where=~valid_mask)
+        index *= self._zone.size
+        index += self._zone
+        np.put(history, index, self._measurement)
+        self._next += valid_mask
+        self._next %= window
+        count += valid_mask
+        np.minimum(count, window, out=count)
+
+        # NaNs sort last, so the median of k valid samples sits at (k-1)//2, k//2
+        ordered = self._ordered
+        np.copyto(ordered, history[:window])
+        ordered.sort(axis=0)
+        has = count > 0
+        lo = np.maximum(count - 1, 0) // 2
+        hi = count // 2
+        median = 0.5 * (ordered[lo, self._rows, self._cols] +
+                        ordered[hi % window, self._rows, self._cols])
+        np.copyto(self.estimate, median, where=has)
+
+    def _apply_kalman(self, valid_mask, dt):
+        x, v = self.estimate, self.velocity
+        p00, p01, p11 = self._p00, self._p01, self._p11
+        k0, k1, s, y, tmp = self._k0, self._k1, self._s, self._y, self._scratch
+        q = self.q
+
+        # Predict (constant velocity, white acceleration noise)
+        np.multiply(v, dt, out=tmp)
+        x += tmp
+        # p00 += dt * (2 p01 + dt p11) + q dt^4 / 4
+        np.multiply(p11, dt, out=tmp)
+        tmp += p01
+        tmp += p01
+        tmp *= dt
+        tmp += q * dt ** 4 / 4.0
+        p00 += tmp
+        # p01 += dt p11 + q dt^3 / 2
+        np.multiply(p11, dt, out=tmp)
+        tmp += q * dt ** 3 / 2.0
+        p01 += tmp
+        p11 += q * dt ** 2
+
+        # Update on measured zones
+        np.add(p00, self.r, out=s)
+        np.divide(p00, s, out=k0)
+        np.divide(p01, s, out=k1)
+        np.subtract(self._measurement, x, out=y)
+        np.multiply(k0, y, out=tmp)
+        np.add(x, tmp, out=x, where=valid_mask)
+        np.multiply(k1, y, out=tmp)
+        np.add(v, tmp, out=v, where=valid_mask)
+        np.multiply(k1, p01, out=tmp)
+        np.subtract(p11, tmp, out=p11, where=valid_mask)
+        np.subtract(1.0, k0, out=s)
+        np.multiply(s, p01, out=p01, where=valid_mask)
+        np.multiply(s, p00, out=p00, where=valid_mask)
+
+        # Coasting zones must not drift outside what the sensor can report
+        np.clip(x, MIN_VALID_MM, MAX_VALID_MM, out=x)
+
+        # Fresh zones: position = measurement, unknown velocity
+        fresh = self._fresh
+        np.copyto(x, self._measurement, where=fresh)
+        np.copyto(v, 0.0, where=fresh)
+        np.copyto(p00, self.r, where=fresh)
+        np.copyto(p01, 0.0, where=fresh)
+        np.copyto(p11, 500.0 ** 2, where=fresh)